@@ -1,24 +1,39 @@
-from optimized_scraper import scrape_amazon_selenium, flipkart_scraper, merge_products_for_display, amazon_ratings, flipkart_rating, save_to_csv
-from flask import Flask, request, jsonify
+from optimized_scraper import merge_products_for_display, SCRAPE_MODE
+from product_store import ProductStore, import_csv, CATALOG_DB_PATH
+from catalog import Catalog
+from ratings_store import RatingsStore, import_json_ratings, RATINGS_DB_PATH, RATING_COLUMNS
+from user_item_matrix import UserItemMatrix
+from factor_model import FactorTrainer, FACTOR_SERVE
+from price_history import PriceHistory, PRICE_HISTORY_DB_PATH
+from catalog_snapshot import SnapshotWriter, CATALOG_SNAPSHOT_DIR, available as snapshots_available
+from content_index import ContentIndexer
+from content_ann import CONTENT_ANN_PATH
+from driver_pool import get_driver_pool, close_driver_pool
+from site_scheduler import get_scheduler
+from scrape_service import get_scrape_service, shutdown_scrape_service, SCRAPE_EXECUTOR
+from search_cache import SearchCache, SEARCH_CACHE_SWR
+from rating_cache import RatingCache
+from save_queue import SaveQueue
+from flask import Flask, request, jsonify, Response, stream_with_context
 import multiprocessing
 from flask_cors import CORS
 import pandas as pd
 from test2 import collaborative_filtering_recommendations, content_based_recommendations, hybrid_recommendations
-import ast
 import os
 import json
 import random
 from datetime import datetime
 import traceback
+import atexit
+import threading
+from concurrent.futures import as_completed
 
 # Configuration
+# Legacy CSV catalog, imported once into the SQLite catalog at startup
 CSV_FILE_PATH = r'C:\sem6-mini-project\amazon_flipkart_products.csv'
+# Legacy rating files, imported once into the ratings store at startup
 USER_RATINGS_FILE = "user_ratings.json"
 FAKE_RATINGS_FILE = "fake_ratings.json"
-REQUIRED_PRODUCT_COLUMNS = [
-    'id', 'name', 'brand', 'price_display', 'best_price',
-    'avg_rating', 'thumbnail', 'available_on', 'variants'
-]
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -30,66 +45,6 @@ CORS(app, resources={
 })
 
 # Helper Functions
-def load_json_data(filename):
-    """Load data from JSON file or return empty dict/list"""
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_json_data(data, filename):
-    """Save data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def init_user_data():
-    """Initialize all data storage files with proper structure"""
-    # Initialize user ratings with empty dict if not exists
-    if not os.path.exists(USER_RATINGS_FILE):
-        save_json_data({}, USER_RATINGS_FILE)
-    
-    # Initialize fake ratings with empty list if not exists
-    if not os.path.exists(FAKE_RATINGS_FILE):
-        save_json_data([], FAKE_RATINGS_FILE)
-
-def load_or_create_dataframe(filepath):
-    """Load CSV or create empty DataFrame with validation"""
-    try:
-        # Check if file exists and has content
-        if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
-            return pd.DataFrame(columns=REQUIRED_PRODUCT_COLUMNS)
-            
-        # Read CSV with error handling
-        df = pd.read_csv(filepath)
-        
-        # Skip empty DataFrames
-        if df.empty:
-            return pd.DataFrame(columns=REQUIRED_PRODUCT_COLUMNS)
-            
-        # Safe header duplicate removal
-        def is_header_duplicate(row):
-            try:
-                return all(str(row[col]) == str(col) for col in df.columns if col in row)
-            except:
-                return False
-                
-        df = df[~df.apply(is_header_duplicate, axis=1)]
-        
-        # Remove completely empty rows
-        df = df.dropna(how='all')
-        
-        # Ensure required columns exist
-        for col in REQUIRED_PRODUCT_COLUMNS:
-            if col not in df.columns:
-                df[col] = None
-                
-        return df
-        
-    except Exception as e:
-        print(f"Error loading CSV: {str(e)}")
-        traceback.print_exc()
-        return pd.DataFrame(columns=REQUIRED_PRODUCT_COLUMNS)
-
 def generate_proper_fake_ratings(product_ids, num_users=20):
     """Generate fake ratings with safe sampling"""
     if not product_ids:
@@ -110,25 +65,123 @@ def generate_proper_fake_ratings(product_ids, num_users=20):
     return pd.DataFrame(fake_data)
 
 # Initialize Data
+product_store = ProductStore(CATALOG_DB_PATH)
+# Log every saved price change per product and site (legacy import included)
+price_history = PriceHistory(PRICE_HISTORY_DB_PATH)
+product_store.add_listener(price_history.record_rows)
+ratings_store = RatingsStore(RATINGS_DB_PATH)
 try:
-    df = load_or_create_dataframe(CSV_FILE_PATH)
-    product_ids = df['id'].dropna().unique().tolist()
-    init_user_data()
-    
-    # Load or generate ratings
-    fake_ratings = load_json_data(FAKE_RATINGS_FILE)
-    ratings_df = pd.DataFrame(fake_ratings) if fake_ratings else generate_proper_fake_ratings(product_ids)
-    save_json_data(ratings_df.to_dict('records'), FAKE_RATINGS_FILE)
-    
-    # Ensure ratings have required columns
-    if ratings_df.empty:
-        ratings_df = pd.DataFrame(columns=['user_id', 'product_id', 'rating'])
+    import_csv(product_store, CSV_FILE_PATH)
+    catalog = Catalog(product_store, snapshot_dir=CATALOG_SNAPSHOT_DIR)
+    product_ids = catalog.snapshot().df['id'].dropna().unique().tolist()
+    import_json_ratings(ratings_store, USER_RATINGS_FILE, FAKE_RATINGS_FILE)
+    # Ratings and price history recorded under the ids from before the
+    # catalog was keyed on product_id()
+    renames = product_store.id_renames()
+    ratings_store.rename_products(renames)
+    price_history.rename_products(renames)
+
+    # Seed generated ratings the first time only
+    if not ratings_store.count("fake"):
+        fake_ratings = generate_proper_fake_ratings(product_ids)
+        if not fake_ratings.empty:
+            ratings_store.add_ratings(fake_ratings[RATING_COLUMNS].itertuples(index=False, name=None), "fake")
 except Exception as e:
     print(f"Initialization error: {str(e)}")
-    df = pd.DataFrame(columns=REQUIRED_PRODUCT_COLUMNS)
-    ratings_df = pd.DataFrame(columns=['user_id', 'product_id', 'rating'])
+    catalog = Catalog(product_store)
+
+# Keep a typed, memory-mappable copy of the catalog next to the database
+snapshot_writer = None
+if snapshots_available():
+    snapshot_writer = SnapshotWriter(catalog, CATALOG_SNAPSHOT_DIR)
+    atexit.register(snapshot_writer.close)
+
+# TF-IDF index over the catalog, updated in the background as it changes,
+# with an IVF index for catalog-wide lookups once the catalog is large
+content_indexer = ContentIndexer(catalog, ann_path=CONTENT_ANN_PATH)
+atexit.register(content_indexer.close)
+
+# Sparse user x item ratings, kept in step with every rating write
+user_items = UserItemMatrix(ratings_store)
+# Latent-factor model of the same ratings, retrained in the background and
+# reported in /api/status; only ranks recommendations with BB_FACTOR_SERVE=1
+# as it doesn't yet rank as well as neighbours
+factor_trainer = FactorTrainer(ratings_store)
+atexit.register(factor_trainer.close)
+
+def serving_factor_model():
+    return factor_trainer.current() if FACTOR_SERVE else None
+
+# Saves happen behind the response; registered after the snapshot writer so
+# it drains first at exit (atexit runs handlers in reverse order). The
+# display merge already leaves one product per key, so results are saved as
+# they are; save_products only reads them.
+save_queue = SaveQueue(product_store)
+atexit.register(save_queue.close)
 
 current_search_results = []
+search_cache = SearchCache()
+rating_cache = RatingCache()
+
+# Start the scraping workers once with the app; on exit drain them, then
+# quit pooled browsers (atexit runs handlers in reverse order)
+atexit.register(close_driver_pool)
+get_scrape_service()
+atexit.register(shutdown_scrape_service)
+
+def prewarm_drivers():
+    try:
+        get_driver_pool().prewarm()
+    except Exception:
+        traceback.print_exc()
+
+# Every search goes through a browser in "browser" mode, so start the
+# pooled browsers now instead of on the first searches. In "http" mode they
+# are only a fallback, and process workers keep pools of their own.
+if SCRAPE_MODE == "browser" and SCRAPE_EXECUTOR == "thread":
+    threading.Thread(target=prewarm_drivers, name="driver-prewarm", daemon=True).start()
+
+# Search helpers
+# Sites are always merged in this order: a group's id comes from its first
+# product, so the same results must give the same ids however they arrive
+SEARCH_SITES = ("amazon", "flipkart")
+
+def merge_site_results(by_site):
+    """Merge for display whichever sites have results so far, in SEARCH_SITES order"""
+    return merge_products_for_display([product for site in SEARCH_SITES for product in by_site.get(site, [])])
+
+def scrape_and_merge(query):
+    """Scrape both sites, merge for display, persist and cache the result"""
+    service = get_scrape_service()
+    futures = {site: service.submit_search(site, query) for site in SEARCH_SITES}
+
+    merged = merge_site_results({site: future.result() for site, future in futures.items()})
+    store_search_results(query, merged)
+    return merged
+
+def store_search_results(query, merged):
+    """Queue merged products for saving and remember them in the search cache"""
+    save_queue.submit(merged)
+
+    # Don't pin a failed scrape in the cache
+    if merged:
+        search_cache.set(query, merged)
+
+def refresh_search_in_background(query):
+    """Re-scrape a stale query on a daemon thread; False if a refresh is already running"""
+    if not search_cache.begin_refresh(query):
+        return False
+
+    def refresh():
+        try:
+            scrape_and_merge(query)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            search_cache.end_refresh(query)
+
+    threading.Thread(target=refresh, name="search-refresh", daemon=True).start()
+    return True
 
 # API Endpoints
 @app.route('/api/search', methods=['POST'])
@@ -140,25 +193,106 @@ def search():
         if not query:
             return jsonify({"error": "Please enter a search term"}), 400
 
-        with multiprocessing.Pool(processes=2) as pool:
-            results = pool.starmap(run_scraper, [("amazon", query), ("flipkart", query)])
+        merged, cache_meta = search_cache.get(query)
+        if cache_meta['status'] == 'stale':
+            if SEARCH_CACHE_SWR:
+                # Serve the cached products now, refresh behind the response
+                cache_meta['revalidating'] = refresh_search_in_background(query)
+            else:
+                merged = None
+        if merged is None:
+            merged = scrape_and_merge(query)
 
-        merged = merge_products_for_display(results[0] + results[1])
         global current_search_results
         current_search_results = merged.copy()
-        
-        # Save with error handling
-        try:
-            save_to_csv(merged, CSV_FILE_PATH)
-        except Exception as e:
-            print(f"Error saving CSV: {str(e)}")
 
-        return jsonify({"products": merged})
+        return jsonify({"products": merged, "meta": {"cache": cache_meta}})
         
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Search failed"}), 500
 
+@app.route('/api/search/stream', methods=['POST'])
+def search_stream():
+    """
+    Streaming variant of /api/search (NDJSON, one event per line)
+
+    Events:
+        {"event": "products", "site": ..., "products": [...]}  first site's groups
+        {"event": "remove", "site": ..., "ids": [...]}         groups sent earlier that the
+                                                                next site's results superseded
+        {"event": "update", "site": ..., "products": [...]}    groups added or changed
+                                                                by the next site (replace by id)
+        {"event": "done", "total": n, "meta": {...}}            final summary
+
+    The final set of groups and their ids are the same as /api/search
+    returns for the same scrape.
+    """
+    data = request.get_json() or {}
+    query = data.get('query', '').strip()
+
+    if not query:
+        return jsonify({"error": "Please enter a search term"}), 400
+
+    cached, cache_meta = search_cache.get(query)
+    if cache_meta['status'] == 'stale':
+        if SEARCH_CACHE_SWR:
+            cache_meta['revalidating'] = refresh_search_in_background(query)
+        else:
+            cached = None
+
+    def event(payload):
+        return json.dumps(payload) + "\n"
+
+    def generate():
+        global current_search_results
+
+        if cached is not None:
+            current_search_results = cached.copy()
+            yield event({"event": "products", "site": "cache", "products": cached})
+            yield event({"event": "done", "total": len(cached), "meta": {"cache": cache_meta}})
+            return
+
+        service = get_scrape_service()
+        futures = {service.submit_search(site, query): site for site in SEARCH_SITES}
+        by_site = {}
+        merged = []
+        sent_ids = None
+
+        try:
+            for future in as_completed(futures):
+                site = futures[future]
+                by_site[site] = future.result()
+                merged = merge_site_results(by_site)
+                ids = {group['id'] for group in merged}
+
+                if sent_ids is None:
+                    yield event({"event": "products", "site": site, "products": merged})
+                else:
+                    # Groups whose id changed or that were merged into another
+                    removed = sorted(sent_ids - ids)
+                    if removed:
+                        yield event({"event": "remove", "site": site, "ids": removed})
+                    # Only groups that are new or picked up this site's variants
+                    website = site.capitalize()
+                    changed = [
+                        group for group in merged
+                        if group['id'] not in sent_ids
+                        or any(v['website'] == website for v in group['variants'])
+                    ]
+                    yield event({"event": "update", "site": site, "products": changed})
+                sent_ids = ids
+        except Exception as e:
+            traceback.print_exc()
+            yield event({"event": "error", "error": "Search failed"})
+            return
+
+        current_search_results = merged.copy()
+        store_search_results(query, merged)
+        yield event({"event": "done", "total": len(merged), "meta": {"cache": cache_meta}})
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/product_details', methods=['POST'])
 def fetch_variant_details():
     data = request.get_json()
@@ -168,9 +302,11 @@ def fetch_variant_details():
         return jsonify({'error': 'No links provided'}), 400
     
     try:
-        # Create a pool of workers (one per CPU core)
-        with multiprocessing.Pool(processes=min(4, len(links))) as pool:
-            results = pool.map(scrape_single_link, links)
+        # Concurrency is bounded by the shared scrape service; repeated and
+        # concurrent requests for one product share a single scrape
+        service = get_scrape_service()
+        futures = [rating_cache.fetch(link, service.submit_details) for link in links]
+        results = [future.result() for future in futures]
         
         return jsonify({
             'status': 'success',
@@ -183,6 +319,81 @@ def fetch_variant_details():
             'message': str(e)
         }), 500
 
+@app.route('/api/scraper/status', methods=['GET'])
+def scraper_status():
+    """Current per-site limits and queue depths plus pool/cache counters"""
+    return jsonify({
+        'sites': get_scheduler().status(),
+        'service': get_scrape_service().status(),
+        'drivers': get_driver_pool().status(),
+        'search_cache': search_cache.status(),
+        'rating_cache': rating_cache.status(),
+        'catalog': catalog.status(),
+        'save_queue': save_queue.status(),
+        'price_history': price_history.status(),
+        'catalog_snapshot': snapshot_writer.status() if snapshot_writer else None,
+        'content_index': content_indexer.status(),
+        'user_items': user_items.status(),
+        'factor_model': dict(factor_trainer.status(), serving=FACTOR_SERVE),
+    })
+
+@app.route('/api/price_history', methods=['POST'])
+def product_price_history():
+    """Per-site price/rating changes for one product, oldest first"""
+    data = request.get_json() or {}
+    product_id = data.get('product_id')
+    if not product_id:
+        return jsonify({'error': 'Product ID is required'}), 400
+
+    try:
+        days = data.get('days')
+        since = datetime.now().timestamp() - float(days) * 86400 if days else None
+        return jsonify({'product_id': product_id, 'history': price_history.history(product_id, since)})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/price_drops', methods=['POST'])
+def price_drops():
+    """Products whose best price fell by at least `min_drop` (fraction) in the last `days`"""
+    data = request.get_json() or {}
+    try:
+        drops = price_history.price_drops(
+            days=float(data.get('days', 7)),
+            min_drop=float(data.get('min_drop', 0.1)),
+            limit=min(int(data.get('limit', 50)), 500)
+        )
+        # Attach display fields from the catalog
+        df = catalog.snapshot().df
+        details = df[df['id'].isin([drop['product_id'] for drop in drops])].set_index('id')
+        for drop in drops:
+            if drop['product_id'] in details.index:
+                product = details.loc[drop['product_id']]
+                drop.update(name=product['name'], brand=product['brand'], thumbnail=product['thumbnail'])
+        return jsonify(drops)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ratings', methods=['POST'])
+def add_rating():
+    """Record a user's rating (0-5) for a product"""
+    data = request.get_json() or {}
+    user_id = data.get('user_id')
+    product_id = data.get('product_id')
+
+    if not user_id or not product_id:
+        return jsonify({'error': 'User ID and product ID are required'}), 400
+    try:
+        rating = float(data.get('rating'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Rating must be a number'}), 400
+    if not 0 <= rating <= 5:
+        return jsonify({'error': 'Rating must be between 0 and 5'}), 400
+
+    ratings_store.add_rating(user_id, product_id, rating)
+    return jsonify({'status': 'success', 'ratings': ratings_store.user_ratings(user_id)})
+
 @app.route('/api/recommendations/content', methods=['POST'])
 def content_recommendations():
     data = request.get_json()
@@ -199,7 +410,13 @@ def content_recommendations():
         if 'id' not in df.columns or 'name' not in df.columns:
             return jsonify({'error': 'Missing required columns in search results'}), 400
 
-        recommendations = content_based_recommendations(df, product_id, top_n)
+        # The catalog index answers without refitting once it has caught up
+        # with these results; until then fit on the results themselves
+        index = content_indexer.current()
+        if product_id in index and index.covers(df['id']):
+            recommendations = index.recommend(product_id, top_n, candidates=df['id'])
+        else:
+            recommendations = content_based_recommendations(df, product_id, top_n)
         if recommendations.empty:
             return jsonify({'error': 'No recommendations found'}), 404
         return jsonify(recommendations.to_dict(orient='records'))
@@ -208,38 +425,50 @@ def content_recommendations():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/recommendations/similar', methods=['POST'])
+def similar_products():
+    """Products most like one catalog product, searched across the whole catalog"""
+    data = request.get_json()
+    product_id = data.get('product_id')
+    top_n = min(int(data.get('top_n', 10)), 50)
+
+    if not product_id:
+        return jsonify({'error': 'Product ID is required'}), 400
+
+    index = content_indexer.current()
+    if product_id not in index:
+        return jsonify({'error': 'Product not found'}), 404
+    try:
+        recommendations = index.recommend(product_id, top_n)
+        return jsonify(recommendations.to_dict(orient='records'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/recommendations/collaborative', methods=['POST'])
 def collaborative_recommendations():
     data = request.get_json()
     user_id = data.get('user_id', "demo_user")  # Default user for demo
     top_n = data.get('top_n', 10)
 
-    df = load_or_create_dataframe(CSV_FILE_PATH)
+    df = catalog.snapshot().df
 
     try:
-        # Ensure we have the required columns
-        if not all(col in ratings_df.columns for col in ['user_id', 'product_id', 'rating']):
-            raise ValueError("Invalid ratings data structure")
-        
-        user_ratings = load_json_data(USER_RATINGS_FILE)
-        print('user_ratings',user_ratings)
-        if user_id not in user_ratings:
-            user_ratings[user_id] = {}
-            save_json_data(user_ratings, USER_RATINGS_FILE)
+        if ratings_store.ensure_user(user_id):
             return jsonify([])  # Return empty for new users
-        print('ratings_df',ratings_df.to_dict('records'))
             
-        # Get recommendations using fake data
+        # Get recommendations using fake and user ratings
         recommendations = collaborative_filtering_recommendations(
-            ratings_df,
+            None,
             df,
             user_id,
-            top_n
+            top_n,
+            user_items=user_items,
+            factor_model=serving_factor_model()
         )
         
         # Fallback if empty - return popular products
         if recommendations.empty:
-            popular = df.sort_values(by='avg_rating', ascending=False).head(top_n)
+            popular = product_store.top_rated(top_n)
             print('popular',popular.to_dict('records'))
             return jsonify(popular.to_dict('records'))
         print('recommendations',recommendations.to_dict('records'))
@@ -260,17 +489,20 @@ def hybrid_recommendations_api():
         top_n = min(int(data.get('top_n', 10)), 20)
         
         # Use current search results or fallback to full dataset
-        product_df = pd.DataFrame(current_search_results if current_search_results else df.to_dict('records'))
+        product_df = pd.DataFrame(current_search_results if current_search_results else catalog.snapshot().df.to_dict('records'))
         
         if product_df.empty:
             return jsonify({'error': 'No products available'}), 404
             
         recommendations = hybrid_recommendations(
             product_df,
-            ratings_df,
+            None,
             product_id,
             user_id,
-            top_n
+            top_n,
+            content_index=content_indexer.current(),
+            user_items=user_items,
+            factor_model=serving_factor_model()
         )
         
         if recommendations.empty:
@@ -282,28 +514,6 @@ def hybrid_recommendations_api():
         traceback.print_exc()
         return jsonify({'error': 'Recommendation failed'}), 500
 
-# Helper functions for scraping
-def run_scraper(scraper_func_name, query):
-    try:
-        if scraper_func_name == "amazon":
-            return scrape_amazon_selenium(query)
-        elif scraper_func_name == "flipkart":
-            return flipkart_scraper(query)
-        return []
-    except Exception as e:
-        print(f"Scraper {scraper_func_name} failed: {str(e)}")
-        return []
-
-def scrape_single_link(link):
-    try:
-        if 'amazon' in link:
-            return amazon_ratings(link)
-        elif 'flipkart' in link:
-            return flipkart_rating(link)
-        return {'error': 'Unsupported website', 'url': link}
-    except Exception as e:
-        return {'error': str(e), 'url': link}
-
 if __name__ == '__main__':
     multiprocessing.set_start_method("spawn", force=True)
     try:
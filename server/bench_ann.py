@@ -0,0 +1,90 @@
+"""
+Evaluate the IVF index behind catalog-wide content lookups
+
+    python bench_ann.py --sizes 100000,300000 --queries 200 --k 10 --probes 1,2,4,8,16,32
+
+For each catalog size, builds a LiveContentIndex over a synthetic catalog,
+trains the IVF index (content_ann) and saves and reloads it. Every query
+is then answered by a full scan (probes=0) and with each --probes setting;
+recall@k is the share of the full scan's top k an approximate lookup
+returns, next to the mean number of products it scored and its p50/p99
+latency.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from bench_content import catalog, percentile
+from content_ann import IVFIndex, sketch
+from content_index import LiveContentIndex
+
+
+def timed(lookup, queries):
+    results, timings = [], []
+    for product_id in queries:
+        start = time.perf_counter()
+        results.append(lookup(product_id))
+        timings.append(time.perf_counter() - start)
+    return results, timings
+
+
+def query_sketch(index, product_id):
+    segment, row = index._locate(index.rows[product_id])
+    return sketch(segment.counts[row], index.idf, index.ann.dim, index.ann.seed)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,300000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probes", default="1,2,4,8,16,32")
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (0: sqrt of the catalog)")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        df = catalog(size)
+        start = time.perf_counter()
+        index = LiveContentIndex(df, 0)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        index.build_ann(lists=args.lists)
+        train = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "content_ann.npz")
+            start = time.perf_counter()
+            index.save_ann(path, seq=size)
+            save = time.perf_counter() - start
+            file_mb = os.path.getsize(path) / 2 ** 20
+            start = time.perf_counter()
+            loaded, _, placements = IVFIndex.load(path)
+            index.build_ann(saved=loaded, placements=placements)
+            load = time.perf_counter() - start
+
+        ann = index.ann.status()
+        print(f"{size:,} products: index {build:.1f}s, IVF {ann['lists']} lists x {ann['dim']} dims "
+              f"(largest {ann['largest_list']:,}) trained in {train:.1f}s, "
+              f"saved in {save:.2f}s ({file_mb:.1f} MB), loaded in {load:.2f}s")
+
+        rng = random.Random(size)
+        queries = [f"product-{rng.randrange(size)}" for _ in range(args.queries)]
+        exact, timings = timed(lambda q: index.similar(q, args.k, probes=0)[0], queries)
+        print(f"{'probes':>8}{'recall@' + str(args.k):>11}{'scored':>10}{'p50 ms':>9}{'p99 ms':>9}")
+        print(f"{'scan':>8}{1:>11.3f}{size:>10,}{percentile(timings, 0.5) * 1000:>9.2f}"
+              f"{percentile(timings, 0.99) * 1000:>9.2f}")
+        for probes in (int(p) for p in args.probes.split(",")):
+            found, timings = timed(lambda q: index.similar(q, args.k, probes=probes)[0], queries)
+            recall = statistics.mean(
+                len(set(got) & set(want)) / len(want) for got, want in zip(found, exact) if want
+            )
+            scored = statistics.mean(len(index.ann.probe(query_sketch(index, q), probes)) for q in queries)
+            print(f"{probes:>8}{recall:>11.3f}{scored:>10,.0f}{percentile(timings, 0.5) * 1000:>9.2f}"
+                  f"{percentile(timings, 0.99) * 1000:>9.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark catalog save latency as the catalog grows
+
+    python bench_catalog.py --sizes 10000,100000,1000000 --batch 60
+
+For each size a fresh SQLite catalog is filled with synthetic products,
+then a search-sized batch (half already stored and unchanged, half new or
+changed) is saved repeatedly. With the content-hash index the save cost
+should stay flat; the legacy column shows what re-reading the old CSV on
+every save (remove_duplicates) cost at the same size.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from product_store import ProductStore, product_row
+
+
+def synthetic_product(i, price=None):
+    price = price if price is not None else 100 + (i % 5000)
+    return {
+        'id': f"product-{i}",
+        'name': f"Product {i} {('Black', 'Blue', 'Red')[i % 3]}",
+        'brand': f"brand-{i % 300}",
+        'price_display': f"₹{price:,.0f}",
+        'best_price': float(price),
+        'avg_rating': round(3 + (i % 20) / 10, 1),
+        'thumbnail': f"https://img.example/{i}.jpg",
+        'available_on': ['Amazon', 'Flipkart'] if i % 2 else ['Amazon'],
+        'variants': [
+            {'price': f"₹{price:,.0f}", 'website': 'Amazon', 'rating': '4.1',
+             'ratings_count': '120', 'link': f"https://www.amazon.in/dp/B{i:09d}", 'thumbnail': None},
+        ],
+    }
+
+
+def fill(store, size, chunk=20000):
+    for start in range(0, size, chunk):
+        rows = [product_row(synthetic_product(i), '2024-01-01 00:00:00')
+                for i in range(start, min(size, start + chunk))]
+        store.upsert_rows(rows)
+
+
+def legacy_csv_read(path, size):
+    """Write `size` rows in the old CSV layout and time one full re-read"""
+    fieldnames = ['id', 'name', 'brand', 'price_display', 'best_price',
+                  'avg_rating', 'thumbnail', 'available_on', 'variants', 'last_updated']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for i in range(size):
+            product = synthetic_product(i)
+            product['available_on'] = '|'.join(product['available_on'])
+            product['variants'] = str(product['variants'])
+            product['last_updated'] = '2024-01-01 00:00:00'
+            writer.writerow(product)
+
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        seen = {tuple(row.values()) for row in csv.DictReader(f)}
+    elapsed = time.perf_counter() - start
+    del seen
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--batch", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true", help="Also time the old full-CSV re-read")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'fill s':>9}{'index load ms':>15}{'save p50 ms':>13}{'save p95 ms':>13}{'legacy ms':>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        workdir = tempfile.mkdtemp(prefix="bb-bench-")
+        try:
+            store = ProductStore(os.path.join(workdir, "catalog.db"))
+            start = time.perf_counter()
+            fill(store, size)
+            fill_seconds = time.perf_counter() - start
+
+            # First save pays the one-time index load
+            store = ProductStore(store.path)
+            start = time.perf_counter()
+            store._hash_index()
+            index_ms = (time.perf_counter() - start) * 1000
+
+            timings = []
+            next_id = size
+            for _ in range(args.repeat):
+                half = args.batch // 2
+                unchanged = [synthetic_product(random.randrange(size)) for _ in range(half)]
+                fresh = [synthetic_product(next_id + i) for i in range(args.batch - half)]
+                next_id += len(fresh)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    store.save_products(unchanged + fresh)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            legacy = ""
+            if args.legacy:
+                legacy = f"{legacy_csv_read(os.path.join(workdir, 'legacy.csv'), size) * 1000:.0f}"
+
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{size:>10}{fill_seconds:>9.1f}{index_ms:>15.0f}"
+                  f"{statistics.median(timings):>13.2f}{p95:>13.2f}{legacy:>11}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark collaborative recommendations: dense pivot per call vs UserItemMatrix
+
+    python bench_collaborative.py --users 1000,10000,100000 --items 20000 --queries 50
+
+For each user count, builds synthetic ratings (5-15 per user, as the
+generated seed ratings are) and times the old collaborative filtering
+(kept below as it was apart from the zero Series, which pandas 3 will no
+longer add float scores to: a dense pivot_table, the full users x users
+cosine_similarity, then a loop over the 10 most similar users) per query,
+against UserItemMatrix's one-off build and per-query latency. The old code
+needs dense users x items and users x users matrices, so it is skipped
+above --legacy-limit cells. On the queries that are run, both must give
+the same scores.
+
+Then --updates single ratings are applied through the store listener
+(apply_rows), a mix of changed and new ones, with the time per rating and
+for the compactions they trigger.
+"""
+import time
+import random
+import argparse
+import statistics
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+from bench_content import percentile
+from user_item_matrix import UserItemMatrix
+
+
+def ratings(users, items, seed=7):
+    rng = np.random.default_rng(seed)
+    per_user = rng.integers(5, 16, size=users)
+    user_ids = np.repeat([f"user_{u}" for u in range(users)], per_user)
+    # Popular items get more ratings, like real catalogs
+    product_ids = (items * rng.power(4, size=per_user.sum())).astype(np.int64)
+    df = pd.DataFrame({
+        'user_id': user_ids,
+        'product_id': [f"product-{i}" for i in product_ids],
+        'rating': np.round(rng.uniform(3.0, 5.0, size=len(user_ids)), 1),
+    })
+    return df.drop_duplicates(subset=['user_id', 'product_id'], ignore_index=True)
+
+
+def legacy_scores(ratings_df, target_user_id):
+    """Weighted scores of collaborative_filtering_recommendations before UserItemMatrix"""
+    user_item_matrix = ratings_df.pivot_table(
+        index='user_id',
+        columns='product_id',
+        values='rating'
+    ).fillna(0)
+    if target_user_id not in user_item_matrix.index:
+        return pd.Series(dtype=float)
+    similarity_matrix = cosine_similarity(user_item_matrix)
+    sim_df = pd.DataFrame(
+        similarity_matrix,
+        index=user_item_matrix.index,
+        columns=user_item_matrix.index
+    )
+    similar_users = sim_df[target_user_id].sort_values(ascending=False)[1:11]
+    target_ratings = user_item_matrix.loc[target_user_id]
+    recommendations = pd.Series(0.0, index=user_item_matrix.columns)
+    for other_user, similarity in similar_users.items():
+        other_ratings = user_item_matrix.loc[other_user]
+        new_items = (target_ratings == 0) & (other_ratings > 0)
+        recommendations[new_items] += other_ratings[new_items] * similarity
+    return recommendations[recommendations > 0]
+
+
+def same_scores(expected, got):
+    got = dict(got)
+    if set(expected.index) != set(got):
+        return False
+    return np.allclose(expected.to_numpy(), [got[product_id] for product_id in expected.index])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,10000,100000")
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--legacy-limit", type=int, default=50_000_000, help="users x items cells")
+    args = parser.parse_args()
+
+    print(f"{'users':>8}{'ratings':>10}{'legacy ms/query':>17}{'build ms':>10}{'p50 ms':>8}{'p99 ms':>8}"
+          f"{'speedup':>9}{'agree':>7}{'update us':>11}{'compact ms':>12}")
+    for users in (int(u) for u in args.users.split(",")):
+        df = ratings(users, args.items)
+        rng = random.Random(users)
+        queries = [f"user_{rng.randrange(users)}" for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        matrix = UserItemMatrix(ratings_df=df)
+        build = time.perf_counter() - start
+        timings = []
+        for user_id in queries:
+            start = time.perf_counter()
+            matrix.recommend(user_id)
+            timings.append(time.perf_counter() - start)
+
+        legacy, speedup, agree = "-", "-", "-"
+        if users * df['product_id'].nunique() <= args.legacy_limit:
+            legacy_timings, matches = [], 0
+            # A few calls are enough; each one pivots and builds users x users
+            for user_id in queries[:3]:
+                start = time.perf_counter()
+                expected = legacy_scores(df, user_id)
+                legacy_timings.append(time.perf_counter() - start)
+                matches += same_scores(expected, matrix.recommend(user_id))
+            per_query = statistics.median(legacy_timings)
+            legacy = f"{per_query * 1000:,.0f}"
+            speedup = f"{per_query / statistics.median(timings):,.0f}x"
+            agree = f"{matches}/{len(legacy_timings)}"
+
+        compactions = matrix.compactions
+        compact_time, update_time = 0.0, 0.0
+        for i in range(args.updates):
+            user_id = f"user_{rng.randrange(users)}"
+            product_id = f"product-{rng.randrange(args.items)}"
+            row = [(user_id, product_id, "user", round(rng.uniform(1, 5), 1), "")]
+            start = time.perf_counter()
+            matrix.apply_rows(row)
+            elapsed = time.perf_counter() - start
+            if matrix.compactions != compactions:
+                compactions = matrix.compactions
+                compact_time += elapsed
+            else:
+                update_time += elapsed
+        folds = matrix.compactions
+        updates = args.updates - folds
+        print(f"{users:>8}{len(df):>10,}{legacy:>17}{build * 1000:>10,.0f}{percentile(timings, 0.5) * 1000:>8.2f}"
+              f"{percentile(timings, 0.99) * 1000:>8.2f}{speedup:>9}{agree:>7}"
+              f"{update_time / max(1, updates) * 1e6:>11.1f}{compact_time / max(1, folds) * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark content recommendations: refit per call vs a prebuilt ContentIndex
+
+    python bench_content.py --sizes 1000,10000,100000 --queries 50
+
+For each catalog size, times the old content_based_recommendations (kept
+below as it was: TfidfVectorizer refit, full n x n cosine_similarity,
+Python sort of every score) per query, and ContentIndex's one-off build
+plus per-query latency. The old function needs an n x n float64 matrix, so
+it is skipped above --legacy-limit products (100k would need ~80 GB).
+Results of both are checked to agree on the queries that are run.
+
+A second table times LiveContentIndex updates: batches of --batches
+products, half of them re-scraped with a new price and half new, applied
+to an index of each size, next to what a full ContentIndex refit costs,
+and the index's query latency after each update.
+"""
+import argparse
+import random
+import statistics
+import time
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from content_index import ContentIndex, LiveContentIndex
+
+NOUNS = ["Smartphone", "Headphones", "Laptop", "Running Shoes", "Backpack", "Smart Watch",
+         "Bluetooth Speaker", "Trimmer", "Mixer Grinder", "Monitor", "Power Bank", "Earbuds"]
+COLORS = ["Black", "Blue", "Silver", "Red", "Green", "White", "Grey", "Gold"]
+SYLLABLES = ["zor", "ka", "vi", "lum", "tra", "nex", "po", "qui", "ren", "sol", "ta", "mi", "dro", "vex"]
+
+
+def catalog(n, seed=5):
+    rng = random.Random(seed)
+    word = lambda parts: "".join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+    brands = [word(3) for _ in range(max(20, n // 200))]
+    rows = []
+    for i in range(n):
+        brand = rng.choice(brands)
+        price = rng.randint(200, 90000)
+        rows.append({
+            'id': f"product-{i}",
+            'name': f"{brand} {word(2)} {rng.choice(NOUNS)} {word(2)} {rng.randint(10, 999)}",
+            'brand': brand,
+            'price_display': f"₹{price:,}",
+            'avg_rating': round(rng.uniform(3, 5), 1) if i % 7 else "Not Rated",
+            'thumbnail': None,
+            'variants': [{'website': rng.choice(['Amazon', 'Flipkart']), 'color': rng.choice(COLORS)}],
+        })
+    return pd.DataFrame(rows)
+
+
+def legacy_content_based_recommendations(product_df, product_id, n=5):
+    """content_based_recommendations before ContentIndex"""
+    if product_id not in product_df['id'].values:
+        return pd.DataFrame()
+    product_df['features'] = (
+        product_df['name'] + " " +
+        product_df['brand'] + " " +
+        product_df['price_display'].astype(str) + " " +
+        product_df['avg_rating'].astype(str) + " " +
+        product_df['variants'].apply(lambda x: " ".join([v['color'] for v in x if v.get('color')]) if x else "")
+    )
+    tfidf = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = tfidf.fit_transform(product_df['features'])
+    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    idx = product_df[product_df['id'] == product_id].index[0]
+    sim_scores = list(enumerate(cosine_sim[idx]))
+    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:n+1]
+    recommendations = product_df.iloc[[i[0] for i in sim_scores]].copy()
+    recommendations['similarity_score'] = [i[1] for i in sim_scores]
+    return recommendations
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--legacy-limit", type=int, default=10000)
+    parser.add_argument("--batches", default="10,100,1000")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'products':>9}{'legacy ms/query':>17}{'build ms':>10}{'p50 ms':>8}{'p99 ms':>8}{'speedup':>9}")
+    for size in sizes:
+        df = catalog(size)
+        rng = random.Random(size)
+        queries = [f"product-{rng.randrange(size)}" for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        index = ContentIndex(df)
+        build = time.perf_counter() - start
+        timings = []
+        for product_id in queries:
+            start = time.perf_counter()
+            index.recommend(product_id, args.top_n)
+            timings.append(time.perf_counter() - start)
+
+        legacy, speedup = "-", "-"
+        if size <= args.legacy_limit:
+            legacy_timings = []
+            # A few calls are enough; each one refits and builds n x n
+            for product_id in queries[:3]:
+                start = time.perf_counter()
+                expected = legacy_content_based_recommendations(df.copy(), product_id, args.top_n)
+                legacy_timings.append(time.perf_counter() - start)
+                got = index.recommend(product_id, args.top_n)
+                if not np.allclose(expected['similarity_score'].to_numpy(), got['similarity_score'].to_numpy()):
+                    print(f"  ❌ scores differ for {product_id}")
+            per_query = statistics.median(legacy_timings)
+            legacy = f"{per_query * 1000:,.0f}"
+            speedup = f"{per_query / statistics.median(timings):,.0f}x"
+
+        print(f"{size:>9}{legacy:>17}{build * 1000:>10,.0f}{percentile(timings, 0.5) * 1000:>8.2f}"
+              f"{percentile(timings, 0.99) * 1000:>8.2f}{speedup:>9}")
+
+    print()
+    print(f"{'products':>9}{'batch':>7}{'update ms':>11}{'refit ms':>10}{'query p50 ms':>14}")
+    for size in sizes:
+        batches = [int(b) for b in args.batches.split(",")]
+        df = catalog(size + sum(batches))
+        live = LiveContentIndex(df.iloc[:size], 0)
+        start = time.perf_counter()
+        ContentIndex(df.iloc[:size])
+        refit = time.perf_counter() - start
+        rng = random.Random(size)
+        added = size
+        for batch in batches:
+            changed = df.iloc[rng.sample(range(added), batch // 2)].copy()
+            changed['price_display'] = [f"₹{rng.randint(200, 90000):,}" for _ in range(len(changed))]
+            fresh = df.iloc[added:added + batch - len(changed)]
+            added += len(fresh)
+            changes = pd.concat([changed, fresh], ignore_index=True)
+            start = time.perf_counter()
+            live.update(changes)
+            update = time.perf_counter() - start
+            timings = []
+            for _ in range(args.queries):
+                product_id = f"product-{rng.randrange(added)}"
+                start = time.perf_counter()
+                live.recommend(product_id, args.top_n)
+                timings.append(time.perf_counter() - start)
+            print(f"{size:>9}{batch:>7}{update * 1000:>11,.1f}{refit * 1000:>10,.0f}"
+                  f"{percentile(timings, 0.5) * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark and evaluate the latent-factor recommender
+
+    python bench_factors.py --users 10000,100000 --items 20000 --ranks 0,16,32
+    python bench_factors.py --db ratings.db --ranks 0,16,32
+
+Ratings are synthetic (--users, --items: users rate popular items they
+like, and ratings follow hidden tastes plus noise) or read from a
+RatingsStore database (--db). --holdout of each user's ratings is held
+back, and a FactorModel of each --ranks is trained on the rest (rank 0 is
+the mean plus user and item biases alone).
+
+For each model the table gives training time, RMSE of the held-out ratings
+and precision@k: the share of a user's top k recommendations, among items
+they have not rated, that are held-out ratings of --relevant or more
+(averaged over --eval-users users). The mean rating, most-rated items and
+the neighbourhood recommender (UserItemMatrix) are listed for comparison,
+and the serving time per recommendation of the model and of UserItemMatrix.
+The app trains the model in the background but only serves from it with
+BB_FACTOR_SERVE=1; turn that on once the model's P@k beats both the
+neighbourhood recommender and most-rated here.
+"""
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from bench_content import percentile
+from factor_model import FactorModel, FACTOR_ITERATIONS, FACTOR_REGULARIZATION
+from ratings_store import RatingsStore
+from user_item_matrix import UserItemMatrix
+
+
+def ratings(users, items, seed=11, rank=8):
+    """
+    Synthetic ratings from hidden tastes
+
+    Each user looks at 20-60 items, popular ones more often, and rates the
+    half they like best, so what gets rated depends on taste as well as
+    popularity; values are taste plus biases and noise, in half stars.
+    """
+    rng = np.random.default_rng(seed)
+    tastes = rng.normal(scale=0.5, size=(users, rank))
+    traits = rng.normal(scale=0.5, size=(items, rank))
+    user_bias = rng.normal(scale=0.3, size=users)
+    item_bias = rng.normal(scale=0.3, size=items)
+    seen = rng.integers(40, 121, size=users)
+    rows = np.repeat(np.arange(users), seen)
+    cols = (items * rng.power(4, size=len(rows))).astype(np.int64)
+    affinity = np.einsum('ij,ij->i', tastes[rows], traits[cols]) + item_bias[cols]
+    df = pd.DataFrame({'row': rows, 'col': cols, 'affinity': affinity}).drop_duplicates(subset=['row', 'col'])
+    df = df[df.groupby('row')['affinity'].rank(ascending=False, method='first') <= seen[df['row']] // 2]
+    rows, cols = df['row'].to_numpy(), df['col'].to_numpy()
+    value = 3.5 + user_bias[rows] + df['affinity'].to_numpy() + rng.normal(scale=0.3, size=len(df))
+    return pd.DataFrame({
+        'user_id': [f"user_{row}" for row in rows],
+        'product_id': [f"product-{col}" for col in cols],
+        'rating': np.clip(np.round(value * 2) / 2, 1, 5),
+    })
+
+
+def split(df, holdout, seed=3):
+    """(train, test): `holdout` of each user's ratings held back, keeping at least one for training"""
+    rng = np.random.default_rng(seed)
+    shuffled = df.iloc[rng.permutation(len(df))]
+    position = shuffled.groupby('user_id').cumcount()
+    size = shuffled.groupby('user_id')['user_id'].transform('size')
+    held = position < np.floor(size * holdout).clip(upper=size - 1)
+    return shuffled[~held].reset_index(drop=True), shuffled[held].reset_index(drop=True)
+
+
+def matrix_of(df):
+    users, user_ids = pd.factorize(df['user_id'])
+    items, item_ids = pd.factorize(df['product_id'])
+    matrix = csr_matrix((df['rating'].to_numpy(dtype='float64'), (users, items)),
+                        shape=(len(user_ids), len(item_ids)))
+    return matrix, list(user_ids), list(item_ids)
+
+
+def rmse(predicted, actual):
+    return float(np.sqrt(np.mean((np.asarray(predicted) - np.asarray(actual)) ** 2)))
+
+
+def precision(recommend, relevant, k):
+    """Mean share of the top k that are relevant, over users with a relevant held-out rating"""
+    shares = []
+    for user_id, items in relevant.items():
+        picked = [product_id for product_id, _ in (recommend(user_id) or [])][:k]
+        shares.append(len(items.intersection(picked)) / k)
+    return float(np.mean(shares)) if shares else 0.0
+
+
+def timed(recommend, user_ids):
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recommend(user_id)
+        timings.append(time.perf_counter() - start)
+    return f"{percentile(timings, 0.5) * 1000:.2f}/{percentile(timings, 0.99) * 1000:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="10000,100000")
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--db", help="RatingsStore database to evaluate instead of synthetic ratings")
+    parser.add_argument("--ranks", default="0,16,32")
+    parser.add_argument("--iterations", type=int, default=FACTOR_ITERATIONS)
+    parser.add_argument("--regularization", type=float, default=FACTOR_REGULARIZATION)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--relevant", type=float, default=4.0)
+    parser.add_argument("--eval-users", type=int, default=2000)
+    args = parser.parse_args()
+
+    datasets = [(args.db, RatingsStore(args.db).ratings_frame())] if args.db else [
+        (f"{users:,} users", ratings(users, args.items)) for users in (int(u) for u in args.users.split(","))
+    ]
+    for name, df in datasets:
+        train, test = split(df, args.holdout)
+        print(f"{name}: {len(train):,} training and {len(test):,} held-out ratings, "
+              f"{train['product_id'].nunique():,} items")
+        rng = random.Random(len(df))
+        relevant = test[test['rating'] >= args.relevant].groupby('user_id')['product_id'].agg(set).to_dict()
+        relevant = dict(rng.sample(sorted(relevant.items()), min(args.eval_users, len(relevant))))
+        queries = list(relevant)[:200]
+        k = args.k
+
+        print(f"{'model':>22}{'train s':>9}{'RMSE':>8}{'P@' + str(k):>8}{'p50/p99 ms':>13}")
+        mean = train['rating'].mean()
+        print(f"{'mean rating':>22}{'-':>9}{rmse(np.full(len(test), mean), test['rating']):>8.4f}{'-':>8}{'-':>13}")
+        popular = [(product_id, 0.0) for product_id in train['product_id'].value_counts().index]
+        rated = train.groupby('user_id')['product_id'].agg(set).to_dict()
+        most_rated = lambda user_id: [item for item in popular[:k + len(rated[user_id])] if item[0] not in rated[user_id]]
+        print(f"{'most rated':>22}{'-':>9}{'-':>8}{precision(most_rated, relevant, k):>8.4f}{'-':>13}")
+        neighbours = UserItemMatrix(ratings_df=train)
+        print(f"{'neighbours':>22}{'-':>9}{'-':>8}{precision(neighbours.recommend, relevant, k):>8.4f}"
+              f"{timed(neighbours.recommend, queries):>13}")
+
+        matrix, user_ids, item_ids = matrix_of(train)
+        for rank in (int(r) for r in args.ranks.split(",")):
+            model = FactorModel.train(matrix, user_ids, item_ids, rank=rank, regularization=args.regularization,
+                                      iterations=args.iterations)
+            error = rmse(model.predict(test['user_id'], test['product_id']), test['rating'])
+            recommend = lambda user_id: model.recommend(user_id, k)
+            print(f"{'factors rank ' + str(rank):>22}{model.training_seconds:>9.1f}{error:>8.4f}"
+                  f"{precision(recommend, relevant, k):>8.4f}{timed(recommend, queries):>13}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
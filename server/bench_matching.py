@@ -0,0 +1,120 @@
+"""
+Benchmark cross-site matching at catalog scale
+
+    python bench_matching.py --sizes 10000,100000,1000000
+
+Generates synthetic listings where each underlying product appears on
+Amazon and/or Flipkart with differently written titles (word order, case,
+"128GB" vs "128 GB", marketing words), alongside sibling products of the
+same brand and series that differ only in model number or capacity, or
+only in the number after the series name ("iPhone 14" / "iPhone 15"). Reports
+matching time, candidates and verified comparisons per listing (the work
+an all-pairs matcher would do is n^2/2), and pair precision/recall against
+the known truth, next to the recall of exact name/brand grouping.
+"""
+import argparse
+import random
+import time
+from product_matcher import match_products
+from product_record import group_key
+
+NOUNS = ["Smartphone", "Headphones", "Laptop", "Running Shoes", "Backpack", "Smart Watch",
+         "Bluetooth Speaker", "Trimmer", "Mixer Grinder", "Monitor", "Power Bank", "Earbuds"]
+COLORS = ["Black", "Blue", "Silver", "Red", "Green", "White", "Grey", "Gold"]
+CAPACITIES = ["64GB", "128GB", "256GB", "512GB", "1TB", "", "", ""]
+SYLLABLES = ["zor", "ka", "vi", "lum", "tra", "nex", "po", "qui", "ren", "sol", "ta", "mi", "dro", "vex"]
+
+
+def word(rng, parts=2):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def listings(n, seed=11):
+    """
+    n listings of ~n/1.6 products
+
+    Returns:
+        (products as (name, brand, websites) tuples, product id per listing)
+    """
+    rng = random.Random(seed)
+    brands = [word(rng, 3) for _ in range(max(50, n // 400))]
+    marketing = [word(rng, 2) for _ in range(3000)]
+    products, truth = [], []
+    base = 0
+    while len(products) < n:
+        brand = rng.choice(brands)
+        series = word(rng)
+        noun = rng.choice(NOUNS)
+        # Siblings share brand, series and noun; model/capacity tell them apart.
+        # In numbered series (iPhone 14/15, Rockerz 450/550) only a bare
+        # number after the series name differs; the rest of the title is shared.
+        numbered = rng.random() < 0.3
+        siblings = rng.randint(1, 3) if not numbered else rng.randint(2, 3)
+        numbers = rng.sample(range(2, 1000), siblings)
+        capacity, color = rng.choice(CAPACITIES), rng.choice(COLORS)
+        extras = rng.sample(marketing, 3)
+        for number in numbers:
+            if numbered:
+                model = str(number)
+            else:
+                model = f"{rng.choice('ABCDEFGHJKLMNPRSTWXZ')}{rng.randint(10, 999)}{rng.choice(['', 'X', 'S', 'Pro'])}"
+                capacity = rng.choice(CAPACITIES)
+                color = rng.choice(COLORS)
+                extras = rng.sample(marketing, 3)
+            on_amazon, on_flipkart = rng.random() < 0.8, rng.random() < 0.8
+            if on_amazon or not on_flipkart:
+                title = f"{brand} {series} {model} {noun} ({color}, {capacity}) {extras[0]} {extras[1]}"
+                products.append((title, brand, {"Amazon"}))
+                truth.append(base)
+            if on_flipkart:
+                spaced = capacity.replace("GB", " GB").replace("TB", " TB")
+                title = f"{brand.upper()} {series} {model} ({spaced}, {color}) {noun} {extras[1]} {extras[2]}"
+                products.append((title, brand.upper(), {"Flipkart"}))
+                truth.append(base)
+            base += 1
+    return products[:n], truth[:n]
+
+
+def pair_scores(clusters, truth):
+    """Pair precision/recall of clusters against truth labels"""
+    predicted = correct = 0
+    for members in clusters:
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                predicted += 1
+                correct += truth[members[a]] == truth[members[b]]
+    sizes = {}
+    for label in truth:
+        sizes[label] = sizes.get(label, 0) + 1
+    actual = sum(size * (size - 1) // 2 for size in sizes.values())
+    return (correct / predicted if predicted else 1.0), (correct / actual if actual else 1.0)
+
+
+def exact_clusters(products):
+    groups = {}
+    for i, (name, brand, _) in enumerate(products):
+        groups.setdefault(group_key(name, brand), []).append(i)
+    return list(groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    print(f"{'listings':>10}{'seconds':>9}{'items/s':>10}{'cand/item':>11}{'verif/item':>12}"
+          f"{'precision':>11}{'recall':>8}{'exact recall':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        products, truth = listings(size)
+        stats = {}
+        start = time.perf_counter()
+        clusters = match_products(products, stats=stats)
+        elapsed = time.perf_counter() - start
+        precision, recall = pair_scores(clusters, truth)
+        _, exact_recall = pair_scores(exact_clusters(products), truth)
+        print(f"{size:>10}{elapsed:>9.1f}{size / elapsed:>10,.0f}{stats['candidates'] / size:>11.1f}"
+              f"{stats['verified'] / size:>12.1f}{precision:>11.3f}{recall:>8.3f}{exact_recall:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Benchmark the HTML parsers over a corpus of saved pages
+
+Record a corpus (needs network):
+    python bench_parsers.py record "iphone 15" --pages 2 --details 5
+
+Or generate a synthetic one (offline; markup built from the selectors in
+html_parsers, padded with scripts and nested layout like the live pages):
+    python bench_parsers.py generate --pages 4 --items 24 --details 8
+
+Run the benchmark (offline):
+    python bench_parsers.py run --backends bs4,lxml,selectolax --repeat 5
+
+Corpus files are named <kind>_<anything>.html where kind is one of
+amazon_search, flipkart_search, amazon_product, flipkart_product.
+"""
+import argparse
+import html as htmllib
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from html_parsers import PARSERS, available_backends, selector_hit_rates
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+
+def load_corpus(directory):
+    """{kind: [(filename, html bytes), ...]}"""
+    corpus = {kind: [] for kind in PARSERS}
+    if not os.path.isdir(directory):
+        return corpus
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".html"):
+            continue
+        for kind in PARSERS:
+            if filename.startswith(kind + "_"):
+                with open(os.path.join(directory, filename), "rb") as f:
+                    corpus[kind].append((filename, f.read()))
+                break
+    return corpus
+
+
+def count_items(result):
+    if result is None:
+        return 0
+    return len(result) if isinstance(result, list) else 1
+
+
+def bench_backend(backend, corpus, repeat):
+    """Time, memory and selector stats for one backend over the whole corpus"""
+    rows = []
+    stats = Counter()
+    item_counts = {}
+
+    for kind, pages in corpus.items():
+        if not pages:
+            continue
+        parse = PARSERS[kind]
+
+        # Warm-up pass also collects selector stats and item counts
+        items = 0
+        for filename, html in pages:
+            found = count_items(parse(html, backend=backend, stats=stats))
+            item_counts[filename] = found
+            items += found
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, html in pages:
+                parse(html, backend=backend)
+        elapsed = time.perf_counter() - start
+
+        # Python-heap profile of a single pass: peak usage and the number of
+        # blocks still held by the parsed results (native lxml/selectolax
+        # trees are not traced)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        results = [parse(html, backend=backend) for _, html in pages]
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        del results
+
+        rows.append({
+            "kind": kind,
+            "pages": len(pages),
+            "items": items,
+            "items_per_sec": items * repeat / elapsed if elapsed else 0.0,
+            "ms_per_page": elapsed * 1000 / (repeat * len(pages)),
+            "peak_kib": peak / 1024,
+            "blocks": blocks,
+        })
+
+    return rows, stats, item_counts
+
+
+def run(args):
+    corpus = load_corpus(args.dir)
+    total_pages = sum(len(pages) for pages in corpus.values())
+    if not total_pages:
+        print(f"❌ No corpus pages found in {args.dir} - record or generate some first.")
+        return 1
+
+    installed = available_backends()
+    backends = [b for b in args.backends.split(",") if b]
+    missing = [b for b in backends if b not in installed]
+    if missing:
+        print(f"Skipping unavailable backends: {', '.join(missing)}")
+    backends = [b for b in backends if b in installed]
+
+    print(f"Corpus: {total_pages} pages from {args.dir}, repeat={args.repeat}\n")
+    print(f"{'backend':<11}{'kind':<18}{'pages':>6}{'items':>7}{'items/s':>11}{'ms/page':>9}{'py peak KiB':>12}{'blocks':>9}")
+
+    status = 0
+    reference = None
+    for backend in backends:
+        rows, stats, item_counts = bench_backend(backend, corpus, args.repeat)
+        for row in rows:
+            print(f"{backend:<11}{row['kind']:<18}{row['pages']:>6}{row['items']:>7}"
+                  f"{row['items_per_sec']:>11.0f}{row['ms_per_page']:>9.2f}"
+                  f"{row['peak_kib']:>12.0f}{row['blocks']:>9}")
+
+        print(f"\n  selector hit rates ({backend}):")
+        for key, rate in sorted(selector_hit_rates(stats).items()):
+            flag = "  ⚠️" if rate < args.min_hit_rate else ""
+            print(f"    {key:<28}{rate:>7.1%}{flag}")
+            # A name/container selector that stops matching means the site markup changed
+            if flag and re.search(r"\.(name|container)$", key):
+                status = 1
+        print()
+
+        # All backends must extract the same number of items per page
+        if reference is None:
+            reference = item_counts
+        else:
+            for filename, count in item_counts.items():
+                if count != reference.get(filename):
+                    print(f"  ⚠️ {backend} found {count} items in {filename}, "
+                          f"{backends[0]} found {reference.get(filename)}")
+
+    return status
+
+
+def record(args):
+    from http_client import fetch_html
+    from optimized_scraper import amazon_search_url, flipkart_search_url
+    from html_parsers import parse_amazon_search, parse_flipkart_search
+
+    os.makedirs(args.dir, exist_ok=True)
+    slug = re.sub(r"[^a-z0-9]+", "-", args.query.lower()).strip("-")
+    stamp = time.strftime("%Y%m%d")
+    links = {"amazon": [], "flipkart": []}
+
+    def save(name, html):
+        with open(os.path.join(args.dir, name), "wb") as f:
+            f.write(html)
+        print(f"✅ Saved {name}")
+
+    for page in range(1, args.pages + 1):
+        for site, url, parse in (
+            ("amazon", amazon_search_url(args.query, page), parse_amazon_search),
+            ("flipkart", flipkart_search_url(args.query, page), parse_flipkart_search),
+        ):
+            html = fetch_html(url)
+            if not html:
+                print(f"❌ Could not fetch {url}")
+                continue
+            save(f"{site}_search_{slug}_p{page}_{stamp}.html", html)
+            for product in parse(html) or []:
+                if product.link.startswith("http"):
+                    links[site].append(product.link)
+
+    for site, site_links in links.items():
+        for i, link in enumerate(site_links[:args.details], start=1):
+            html = fetch_html(link)
+            if html:
+                save(f"{site}_product_{slug}_{i}_{stamp}.html", html)
+    return 0
+
+
+NOUNS = ["Smartphone", "Headphones", "Laptop", "Running Shoes", "Backpack", "Smart Watch",
+         "Bluetooth Speaker", "Trimmer", "Mixer Grinder", "Monitor", "Power Bank", "Earbuds"]
+BRANDS = ["Apple", "Samsung", "boAt", "Noise", "Philips", "Lenovo", "Puma", "Skybags", "Mi", "OnePlus"]
+
+
+def _filler(rng, kib):
+    """Inline script and nested layout, as the live pages carry around the results"""
+    words = " ".join(rng.choice(NOUNS + BRANDS).lower() for _ in range(kib * 64))
+    blocks = "".join(
+        f'<div class="a-section a-spacing-none"><div class="s-widget"><span class="a-size-small">{word}</span></div></div>'
+        for word in words.split()[:kib * 8]
+    )
+    return f'<script type="text/javascript">var state = {{"w": "{words}"}};</script><div id="nav">{blocks}</div>'
+
+
+def _product(rng):
+    brand = rng.choice(BRANDS)
+    name = f"{brand} {rng.choice(NOUNS)} {rng.randint(10, 999)} ({rng.choice(['Black', 'Blue', 'Silver'])}, {rng.choice([64, 128, 256])} GB)"
+    return {
+        "brand": brand,
+        "name": htmllib.escape(name),
+        "price": f"{rng.randint(299, 99999):,}",
+        "rating": f"{rng.uniform(3, 5):.1f}",
+        "ratings": f"{rng.randint(0, 90000):,}",
+        "slug": re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-"),
+        "image": f"https://images.example.com/{rng.getrandbits(40):x}.jpg",
+    }
+
+
+def amazon_search_page(rng, items, filler_kib):
+    results = []
+    for i in range(items):
+        p = _product(rng)
+        # Some results lack a rating or ratings count, as sponsored ones do
+        rating = (f'<i class="a-icon a-icon-star-small"><span class="a-icon-alt">{p["rating"]} out of 5 stars</span></i>'
+                  f'<span class="a-size-base s-underline-text">{p["ratings"]}</span>') if i % 5 else ""
+        results.append(
+            f'<div data-component-type="s-search-result" data-asin="B0{i:08d}"><div class="s-card-container">'
+            f'<img class="s-image" src="{p["image"]}">'
+            f'<span class="a-size-base-plus a-color-base">{p["brand"]}</span>'
+            f'<a class="a-link-normal s-line-clamp-2 s-link-style a-text-normal" href="/{p["slug"]}/dp/B0{i:08d}">'
+            f'<h2 class="a-size-base-plus a-spacing-none a-color-base a-text-normal"><span>{p["name"]}</span></h2></a>'
+            f'{rating}<span class="a-price"><span class="a-price-whole">{p["price"]}.</span></span>'
+            f'</div></div>'
+        )
+    return f'<html><head><meta charset="utf-8"></head><body>{_filler(rng, filler_kib)}{"".join(results)}</body></html>'
+
+
+def flipkart_search_page(rng, items, filler_kib):
+    results = []
+    for i in range(items):
+        p = _product(rng)
+        rating = (f'<div class="XQDdHH">{p["rating"]}</div>'
+                  f'<span class="Wphh3N">{p["ratings"]} Ratings &amp; {rng.randint(0, 900)} Reviews</span>') if i % 5 else ""
+        results.append(
+            f'<div data-id="ITM{i:012d}"><div class="tUxRFH">'
+            f'<img class="DByuf4" src="{p["image"]}"><div class="syl9yP">{p["brand"]}</div>'
+            f'<a class="WKTcLC BwBZTg" title="{p["name"]}" href="/{p["slug"]}/p/itm{i:012d}">{p["name"]}</a>'
+            f'{rating}<div class="Nx9bqj _4b5DiR">₹{p["price"]}</div>'
+            f'</div></div>'
+        )
+    return f'<html><head><meta charset="utf-8"></head><body>{_filler(rng, filler_kib)}{"".join(results)}</body></html>'
+
+
+def amazon_product_page(rng, filler_kib):
+    p = _product(rng)
+    return (f'<html><head><meta charset="utf-8"></head><body>{_filler(rng, filler_kib)}'
+            f'<div id="centerCol"><h1>{p["name"]}</h1>'
+            f'<i class="a-icon a-icon-star"><span>{p["rating"]} out of 5 stars</span></i>'
+            f'<span id="acrCustomerReviewText">{p["ratings"]} ratings</span></div></body></html>')
+
+
+def flipkart_product_page(rng, filler_kib):
+    p = _product(rng)
+    return (f'<html><head><meta charset="utf-8"></head><body>{_filler(rng, filler_kib)}'
+            f'<h1>{p["name"]}</h1><div class="C7fEHH"><div class="XQDdHH">{p["rating"]}</div>'
+            f'<span class="Wphh3N"><span>{p["ratings"]} Ratings &amp; {rng.randint(0, 900)} Reviews</span></span>'
+            f'</div></body></html>')
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    os.makedirs(args.dir, exist_ok=True)
+    pages = {}
+    for page in range(1, args.pages + 1):
+        pages[f"amazon_search_synthetic_p{page}.html"] = amazon_search_page(rng, args.items, args.filler_kib)
+        pages[f"flipkart_search_synthetic_p{page}.html"] = flipkart_search_page(rng, args.items, args.filler_kib)
+    for i in range(1, args.details + 1):
+        pages[f"amazon_product_synthetic_{i}.html"] = amazon_product_page(rng, args.filler_kib)
+        pages[f"flipkart_product_synthetic_{i}.html"] = flipkart_product_page(rng, args.filler_kib)
+    for name, html in pages.items():
+        with open(os.path.join(args.dir, name), "w", encoding="utf-8") as f:
+            f.write(html)
+    print(f"✅ Wrote {len(pages)} synthetic pages to {args.dir}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Benchmark parsers over the saved corpus")
+    run_parser.add_argument("--dir", default=DEFAULT_CORPUS_DIR)
+    run_parser.add_argument("--backends", default="bs4,lxml,selectolax")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-hit-rate", type=float, default=0.5)
+
+    record_parser = sub.add_parser("record", help="Save live pages into the corpus")
+    record_parser.add_argument("query")
+    record_parser.add_argument("--dir", default=DEFAULT_CORPUS_DIR)
+    record_parser.add_argument("--pages", type=int, default=1)
+    record_parser.add_argument("--details", type=int, default=3)
+
+    generate_parser = sub.add_parser("generate", help="Write a synthetic corpus (offline)")
+    generate_parser.add_argument("--dir", default=DEFAULT_CORPUS_DIR)
+    generate_parser.add_argument("--pages", type=int, default=4)
+    generate_parser.add_argument("--items", type=int, default=24)
+    generate_parser.add_argument("--details", type=int, default=8)
+    generate_parser.add_argument("--filler-kib", type=int, default=64, help="Approximate padding per page")
+    generate_parser.add_argument("--seed", type=int, default=9)
+
+    args = parser.parse_args()
+    commands = {"run": run, "record": record, "generate": generate}
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
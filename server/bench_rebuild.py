@@ -0,0 +1,107 @@
+"""
+Benchmark rebuilding the catalog from historical rows
+
+    python bench_rebuild.py --sizes 100000,1000000,3000000 --legacy-limit 1000000
+
+Writes a synthetic legacy CSV where each product was saved by several
+searches (prices and ratings drifting between saves, header rows repeated
+mid-file) and times catalog_rebuild's load + vectorized regroup against
+the per-item path the app had for this: csv.DictReader, literal_eval of
+every variants cell and merge_products over the resulting dicts. The
+legacy path is skipped above --legacy-limit rows.
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from catalog_rebuild import load_rows, rebuild
+from bench_records import merge_products
+from product_record import parse_price
+from product_store import _parse_legacy_list
+
+FIELDNAMES = ['id', 'name', 'brand', 'price_display', 'best_price',
+              'avg_rating', 'thumbnail', 'available_on', 'variants', 'last_updated']
+
+
+def write_history(path, rows, saves=5, seed=3):
+    """`rows` CSV rows covering rows/saves products"""
+    rng = random.Random(seed)
+    products = max(1, rows // saves)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(rows):
+            p = rng.randrange(products)
+            if i and i % 50000 == 0:
+                writer.writeheader()
+            name, brand = f"Brand{p % 500} Product {p} {('Black', 'Blue', 'Red')[p % 3]}", f"Brand{p % 500}"
+            variants = []
+            for website in (('Amazon', 'Flipkart') if p % 3 else ('Amazon',)):
+                price = 100 + (p % 5000) + rng.randint(0, 40) * 10
+                variants.append({'price': f"₹{price:,}", 'website': website,
+                                 'rating': f"{rng.randint(30, 50) / 10}", 'ratings_count': str(rng.randint(0, 5000)),
+                                 'link': f"https://www.{website.lower()}.example/p/{p}", 'thumbnail': None})
+            prices = [float(v['price'][1:].replace(',', '')) for v in variants]
+            writer.writerow({
+                'id': f"{name[:10]}-{brand}-{p}".lower().replace(' ', '-'),
+                'name': name, 'brand': brand,
+                'price_display': f"₹{min(prices):,.0f}", 'best_price': min(prices),
+                'avg_rating': variants[0]['rating'], 'thumbnail': f"https://img.example/{p}.jpg",
+                'available_on': '|'.join(v['website'] for v in variants), 'variants': str(variants),
+                'last_updated': f"2024-{1 + i * 12 // rows:02d}-01 00:00:00",
+            })
+
+
+def legacy_rebuild(path):
+    """The per-item path: parse every row into a dict, then merge_products"""
+    products = []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('id') in (None, '', 'id'):
+                continue
+            row['variants'] = _parse_legacy_list(row['variants'])
+            row['available_on'] = row['available_on'].split('|') if row['available_on'] else []
+            # merge_products compares best_price numerically
+            price = parse_price(row['best_price'])
+            row['best_price'] = price if price is not None else float('inf')
+            products.append(row)
+    return merge_products(products)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000,3000000")
+    parser.add_argument("--legacy-limit", type=int, default=1000000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'products':>10}{'load s':>8}{'regroup s':>11}{'rows/s':>12}{'legacy s':>10}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            path = os.path.join(tmp, f"history-{size}.csv")
+            write_history(path, size)
+
+            began = time.perf_counter()
+            df = load_rows([path])
+            loaded = time.perf_counter()
+            products, stats = rebuild(df)
+            total = time.perf_counter() - began
+
+            legacy = "-"
+            speedup = "-"
+            if size <= args.legacy_limit:
+                start = time.perf_counter()
+                legacy_products = legacy_rebuild(path)
+                elapsed = time.perf_counter() - start
+                legacy, speedup = f"{elapsed:.1f}", f"{elapsed / total:.1f}x"
+                if len(legacy_products) != len(products):
+                    print(f"  ❌ {len(legacy_products)} legacy products vs {len(products)} rebuilt")
+
+            print(f"{size:>10}{stats['products']:>10}{loaded - began:>8.1f}"
+                  f"{began + total - loaded:>11.1f}{size / total:>12,.0f}{legacy:>10}{speedup:>9}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
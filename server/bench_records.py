@@ -0,0 +1,323 @@
+"""
+Benchmark the scrape -> merge -> save pipeline: product dicts vs ScrapedProduct
+
+    python bench_records.py --sizes 1000,10000,100000 --repeat 5
+
+Synthetic search results (two sites, a third of the names listed on both)
+are pushed through the old dict-based builders and merge functions, kept
+below as they were, and through ScrapedProduct with the current
+merge_products_for_display and the last merge_products (also kept below;
+the app now regroups saved rows with catalog_rebuild). Reports items/s
+for the whole pipeline and the memory held by the scraped items before
+merging; the two pipelines' outputs are checked to be identical.
+"""
+import argparse
+import copy
+import random
+import time
+import tracemalloc
+from optimized_scraper import merge_products_for_display
+from product_record import ScrapedProduct, parse_price, parse_rating, group_key, product_id, display_id
+
+
+def raw_items(n, seed=7):
+    """Field tuples as the parsers see them: name, price, rating, ratings, brand, website, link, thumbnail"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        model = i // 3 if i % 3 else i
+        website = "Amazon" if i % 2 else "Flipkart"
+        price = f"₹{rng.randint(200, 90000):,}" if i % 17 else "Not Available"
+        rating = f"{rng.randint(30, 50) / 10}" if i % 11 else "Not Rated"
+        items.append((
+            f"Brand{model % 97} Model {model} Wireless Edition", price, rating, str(rng.randint(0, 5000)),
+            f"Brand{model % 97}", website, f"https://www.{website.lower()}.example/p/{i}",
+            f"https://img.example/{i}.jpg",
+        ))
+    return items
+
+
+def legacy_product(name, price, rating, ratings, brand, website, link, thumbnail):
+    return {"name": name, "price": price, "rating": rating, "website": website,
+            "brand": brand, "ratings": ratings, "link": link, "thumbnail": thumbnail}
+
+
+def legacy_merge_for_display(products):
+    """merge_products_for_display before ScrapedProduct"""
+    product_groups = {}
+    for product in products:
+        group_key = f"{product['name'].lower().strip()}-{product['brand'].lower().strip()}"
+        if group_key not in product_groups:
+            product_groups[group_key] = {'name': product['name'], 'brand': product['brand'], 'variants': [],
+                                         'best_price': None, 'all_prices': [], 'websites': set(),
+                                         'ratings': [], 'thumbnails': []}
+        group = product_groups[group_key]
+        group['variants'].append({'price': product['price'], 'website': product['website'],
+                                  'rating': product['rating'], 'ratings_count': product['ratings'],
+                                  'link': product['link'], 'thumbnail': product['thumbnail']})
+        if product['price'] != "Not Available":
+            try:
+                price_num = float(product['price'].replace('₹', '').replace(',', ''))
+                group['all_prices'].append(price_num)
+                if group['best_price'] is None or price_num < group['best_price']:
+                    group['best_price'] = price_num
+            except ValueError:
+                pass
+        group['websites'].add(product['website'])
+        if product['rating'] != "Not Rated":
+            try:
+                group['ratings'].append(float(product['rating']))
+            except ValueError:
+                pass
+        if product['thumbnail']:
+            group['thumbnails'].append(product['thumbnail'])
+
+    final_products = []
+    for group in product_groups.values():
+        avg_rating = "Not Rated"
+        if group['ratings']:
+            avg_rating = round(sum(group['ratings']) / len(group['ratings']), 1)
+        price_display = f"₹{group['best_price']:,.0f}" if group['best_price'] else "Not Available"
+        if len(group['all_prices']) > 1:
+            min_price, max_price = min(group['all_prices']), max(group['all_prices'])
+            if min_price != max_price:
+                price_display = f"₹{min_price:,.0f} - ₹{max_price:,.0f}"
+        final_products.append({
+            'id': product_id(group['name'], group['brand']),
+            'display_id': display_id(group['name'], group['brand']),
+            'name': group['name'], 'brand': group['brand'], 'price_display': price_display,
+            'best_price': group['best_price'], 'avg_rating': avg_rating,
+            'thumbnail': group['thumbnails'][0] if group['thumbnails'] else None,
+            'available_on': list(group['websites']), 'variants': group['variants'],
+        })
+    return final_products
+
+
+def legacy_merge_products(products):
+    """merge_products before ScrapedProduct"""
+    merged = {}
+    for product in products:
+        key = (product['name'].lower().strip(), product['brand'].lower().strip())
+        if key in merged:
+            existing = merged[key]
+            if product['price_display'] != "Not Available" and existing['price_display'] != "Not Available":
+                try:
+                    current_price = float(product['price_display'].replace('₹', '').replace(',', ''))
+                    existing_price = float(existing['price_display'].replace('₹', '').replace(',', ''))
+                    if current_price < existing_price:
+                        existing['price_display'] = product['price_display']
+                        existing['best_price'] = min(existing.get('best_price', float('inf')), current_price)
+                except ValueError:
+                    pass
+            if 'best_price' in product and isinstance(product['best_price'], (int, float)):
+                if product['best_price'] < existing.get('best_price', float('inf')):
+                    existing['best_price'] = product['best_price']
+            if product['avg_rating'] != "Not Rated":
+                if existing['avg_rating'] == "Not Rated" or float(product['avg_rating']) > float(existing['avg_rating']):
+                    existing['avg_rating'] = product['avg_rating']
+            if not existing['thumbnail'] and product['thumbnail']:
+                existing['thumbnail'] = product['thumbnail']
+            if isinstance(product.get('available_on'), list):
+                existing['available_on'] = list(set(existing.get('available_on', []) + product['available_on']))
+            if isinstance(product.get('variants'), list):
+                existing_keys = {(v.get('website'), v.get('price_display')) for v in existing.get('variants', [])}
+                existing['variants'].extend(
+                    v for v in product['variants'] if (v.get('website'), v.get('price_display')) not in existing_keys
+                )
+        else:
+            merged[key] = product.copy()
+            if not isinstance(merged[key].get('variants'), list):
+                merged[key]['variants'] = []
+            if not isinstance(merged[key].get('available_on'), list):
+                merged[key]['available_on'] = [merged[key]['website']] if 'website' in merged[key] else []
+
+    final_products = list(merged.values())
+    for product in final_products:
+        if 'best_price' not in product or not isinstance(product['best_price'], (int, float)):
+            try:
+                if product['price_display'] != "Not Available":
+                    product['best_price'] = float(product['price_display'].replace('₹', '').replace(',', ''))
+                else:
+                    product['best_price'] = float('inf')
+            except ValueError:
+                product['best_price'] = float('inf')
+        for variant in product.get('variants', []):
+            variant.setdefault('website', product.get('website', 'Unknown'))
+            variant.setdefault('price_display', product.get('price_display', 'Not Available'))
+    return final_products
+
+
+def merge_products(products):
+    """
+    Merge duplicate products from different sources while preserving all variants
+
+    The per-item merge the app used before catalog_rebuild (kept here as the
+    baseline for this benchmark and bench_rebuild.py), with the parsed
+    price/rating cache it had by then.
+    
+    Args:
+        products: List of product dictionaries with fields:
+            - id
+            - name
+            - brand
+            - price_display
+            - best_price
+            - avg_rating
+            - thumbnail
+            - available_on
+            - variants
+    
+    Returns:
+        List of merged product dictionaries
+    """
+    merged = {}
+    # Parsed (price_display, avg_rating) of entries that have had duplicates,
+    # so later duplicates compare against numbers instead of re-parsing the
+    # kept strings; entries without duplicates are never parsed
+    parsed = {}
+    
+    for product in products:
+        # Create a unique key based on name and brand
+        key = group_key(product['name'], product['brand'])
+        
+        if key in merged:
+            # Existing product found - merge the variants
+            existing = merged[key]
+            if key in parsed:
+                existing_price, existing_rating = parsed[key]
+            else:
+                existing_price = parse_price(existing['price_display'])
+                existing_rating = parse_rating(existing['avg_rating'])
+            
+            # Update price_display to show the best price
+            current_price = parse_price(product['price_display'])
+            if current_price is not None and existing_price is not None and current_price < existing_price:
+                existing['price_display'] = product['price_display']
+                existing['best_price'] = min(existing.get('best_price', float('inf')), current_price)
+                existing_price = current_price
+            
+            # Update best_price if current product has a better price
+            if 'best_price' in product and isinstance(product['best_price'], (int, float)):
+                existing_best = existing.get('best_price', float('inf'))
+                if product['best_price'] < existing_best:
+                    existing['best_price'] = product['best_price']
+            
+            # Keep the higher rating if available
+            current_rating = parse_rating(product['avg_rating'])
+            if current_rating is not None and (existing_rating is None or current_rating > existing_rating):
+                existing['avg_rating'] = product['avg_rating']
+                existing_rating = current_rating
+            parsed[key] = (existing_price, existing_rating)
+            
+            # Keep the thumbnail if current doesn't have one
+            if not existing['thumbnail'] and product['thumbnail']:
+                existing['thumbnail'] = product['thumbnail']
+            
+            # Merge available_on lists
+            if isinstance(product.get('available_on'), list):
+                existing['available_on'] = list(set(existing.get('available_on', []) + product['available_on']))
+            
+            # Merge variants while avoiding duplicates
+            if isinstance(product.get('variants'), list):
+                existing_variants = existing.get('variants', [])
+                new_variants = []
+                
+                # Create a set of existing variant keys (website+price)
+                existing_keys = {(v.get('website'), v.get('price_display')) for v in existing_variants}
+                
+                for variant in product['variants']:
+                    variant_key = (variant.get('website'), variant.get('price_display'))
+                    if variant_key not in existing_keys:
+                        new_variants.append(variant)
+                
+                existing['variants'].extend(new_variants)
+        else:
+            # New product, add to dictionary
+            merged[key] = product.copy()
+            
+            # Ensure variants is a list
+            if not isinstance(merged[key].get('variants'), list):
+                merged[key]['variants'] = []
+            
+            # Ensure available_on is a list
+            if not isinstance(merged[key].get('available_on'), list):
+                if 'website' in merged[key]:
+                    merged[key]['available_on'] = [merged[key]['website']]
+                else:
+                    merged[key]['available_on'] = []
+    
+    # Convert the merged dictionary back to a list
+    final_products = list(merged.values())
+    
+    # Post-processing to ensure consistent fields
+    for product in final_products:
+        # Set default best_price if not set
+        if 'best_price' not in product or not isinstance(product['best_price'], (int, float)):
+            price = parse_price(product['price_display'])
+            product['best_price'] = price if price is not None else float('inf')
+        
+        # Ensure variants have all required fields
+        for variant in product.get('variants', []):
+            if 'website' not in variant:
+                variant['website'] = product.get('website', 'Unknown')
+            if 'price_display' not in variant:
+                variant['price_display'] = product.get('price_display', 'Not Available')
+    
+    return final_products
+
+
+PIPELINES = {
+    "dicts": (legacy_product, legacy_merge_for_display, legacy_merge_products),
+    # Exact-key grouping only, to compare like with like
+    "records": (ScrapedProduct, lambda products: merge_products_for_display(products, match=False), merge_products),
+}
+
+
+def run_pipeline(items, build, merge_display, merge_save):
+    scraped = [build(*item) for item in items]
+    return merge_save(merge_display(scraped))
+
+
+def held_bytes(items, build):
+    """Bytes allocated to keep the built (not yet merged) items alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scraped = [build(*item) for item in items]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del scraped
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8}{'pipeline':>10}{'items/s':>12}{'best ms':>10}{'held KiB':>11}{'B/item':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        items = raw_items(size)
+        outputs = {}
+        for name, (build, merge_display, merge_save) in PIPELINES.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                output = run_pipeline(items, build, merge_display, merge_save)
+                timings.append(time.perf_counter() - start)
+            outputs[name] = copy.deepcopy(output)
+            held = held_bytes(items, build)
+            best = min(timings)
+            print(f"{size:>8}{name:>10}{size / best:>12,.0f}{best * 1000:>10.1f}"
+                  f"{held / 1024:>11,.0f}{held / size:>8.0f}")
+
+        def canonical(products):
+            return sorted((p['id'], p['price_display'], p['best_price'], str(p['avg_rating']),
+                           sorted(p['available_on']), len(p['variants'])) for p in products)
+
+        if canonical(outputs["dicts"]) != canonical(outputs["records"]):
+            print("  ❌ pipelines disagree")
+
+
+if __name__ == "__main__":
+    main()
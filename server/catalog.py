@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import threading
+import pandas as pd
+from product_store import rows_to_frame
+import catalog_snapshot
+
+CATALOG_CHECK_INTERVAL = float(os.environ.get("BB_CATALOG_CHECK_INTERVAL", "2"))
+# Saved rows are folded into the full frame once they reach this share of it
+CATALOG_COMPACT_RATIO = float(os.environ.get("BB_CATALOG_COMPACT_RATIO", "0.1"))
+
+
+def _fold(base, deltas):
+    """base with the rows of each delta frame replacing or adding to it, by id"""
+    updates = pd.concat(deltas, ignore_index=True) if len(deltas) > 1 else deltas[0]
+    updates = updates.drop_duplicates(subset='id', keep='last')
+    if base.empty:
+        return updates.reset_index(drop=True)
+    kept = base[~base['id'].isin(updates['id'])]
+    return pd.concat([kept, updates], ignore_index=True)
+
+
+class CatalogSnapshot:
+    """
+    An immutable view of the catalog; `df` must be treated as read-only
+
+    seq is the store write_seq the data reflects. changes holds the rows
+    this version replaced or added over the previous one, or None when the
+    whole catalog was (re)loaded.
+
+    A save only appends its rows to the previous version's list of deltas;
+    the full frame is built the first time someone reads `df`, outside the
+    store's write lock, and shared by every reader of that version. The
+    deltas are also folded in once they reach `CATALOG_COMPACT_RATIO` of
+    the frame, so unread versions don't pile up.
+    """
+
+    __slots__ = ('version', 'seq', 'changes', '_base', '_deltas', '_df')
+
+    def __init__(self, version, df, seq, changes, deltas=()):
+        self.version = version
+        self.seq = seq
+        self.changes = changes
+        self._base = df
+        self._deltas = tuple(deltas)
+        self._df = None if self._deltas else df
+
+    @property
+    def df(self):
+        if self._df is None:
+            # Readers racing here build equal frames; either one is kept
+            self._df = _fold(self._base, self._deltas)
+        return self._df
+
+    def updated(self, version, seq, updates, compact_ratio=CATALOG_COMPACT_RATIO):
+        """The next version: this one with the `updates` frame applied"""
+        if self._df is not None:
+            base, deltas = self._df, (updates,)
+        else:
+            base, deltas = self._base, self._deltas + (updates,)
+        if sum(len(delta) for delta in deltas) >= compact_ratio * len(base):
+            base, deltas = _fold(base, deltas), ()
+        return CatalogSnapshot(version, base, seq, updates, deltas)
+
+
+class Catalog:
+    """
+    Shared in-memory product catalog
+
+    Loads the store once, then applies each committed save as an
+    incremental update (replace rows by id, append new ones) and bumps the
+    version. Writes made by other processes are picked up by watching
+    SQLite's data_version, at most every `check_interval` seconds, with a
+    full reload. Endpoints take one snapshot per request so everything
+    they compute comes from the same version.
+
+    At startup a typed Arrow snapshot (see catalog_snapshot) is used
+    instead of reading and decoding SQLite when it is up to date.
+
+    Args:
+        store: ProductStore to mirror
+        check_interval: Seconds between checks for outside writes
+        snapshot_dir: Typed snapshot directory to load from, or None
+    """
+
+    def __init__(self, store, check_interval=CATALOG_CHECK_INTERVAL, snapshot_dir=None):
+        self.store = store
+        self.check_interval = check_interval
+        self.loaded_from_snapshot = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watch = sqlite3.connect(store.path, check_same_thread=False)
+        self._last_check = time.monotonic()
+        self._snapshot = self._initial_snapshot(snapshot_dir)
+        self._data_version = self._read_data_version()
+        store.add_listener(self._apply_rows)
+
+    def _initial_snapshot(self, snapshot_dir):
+        seq = self.store.write_seq()
+        if snapshot_dir:
+            typed = catalog_snapshot.read_snapshot(snapshot_dir)
+            if typed is not None and typed.seq == seq:
+                self.loaded_from_snapshot = seq
+                return CatalogSnapshot(0, catalog_snapshot.products_frame(typed.products), seq, None)
+        return CatalogSnapshot(0, self.store.load_dataframe(), seq, None)
+
+    def _read_data_version(self):
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _apply_rows(self, rows):
+        """Store listener: fold freshly committed rows into a new snapshot"""
+        updates = rows_to_frame(rows).drop_duplicates(subset='id', keep='last')
+        with self._lock:
+            # Runs under the store's write lock, right after the commit; costs
+            # the saved rows, not the catalog (see CatalogSnapshot)
+            seq = self.store.write_seq()
+            self._snapshot = self._snapshot.updated(self._snapshot.version + 1, seq, updates)
+            # Our own commit; only later changes count as outside writes
+            self._data_version = self._read_data_version()
+        self._notify()
+
+    def reload(self):
+        # Read the seq first: if a write lands in between, the snapshot is
+        # labelled older than its data, which only costs a rewrite later
+        seq = self.store.write_seq()
+        df = self.store.load_dataframe()
+        with self._lock:
+            self._snapshot = CatalogSnapshot(self._snapshot.version + 1, df, seq, None)
+            self._data_version = self._read_data_version()
+        self._notify()
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) whenever a new catalog version is published"""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        snapshot = self._snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in catalog listener: {str(e)}")
+
+    def refresh_if_changed(self):
+        """Reload if another process wrote to the database since we last looked"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        with self._lock:
+            changed = self._read_data_version() != self._data_version
+        if changed:
+            print("Catalog changed on disk, reloading")
+            self.reload()
+        return changed
+
+    def snapshot(self):
+        self.refresh_if_changed()
+        return self._snapshot
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "seq": snapshot.seq,
+            "products": len(snapshot.df),
+            "loaded_from_snapshot": self.loaded_from_snapshot is not None,
+        }
@@ -0,0 +1,420 @@
+"""
+Rebuild a clean, deduplicated catalog from every historical row
+
+    python catalog_rebuild.py --csv amazon_flipkart_products.csv --db catalog.db --out catalog.rebuilt.db
+
+Loads the legacy append-only CSV(s) and/or an existing catalog database,
+regroups every row on the normalized name/brand key that
+merge_products_for_display uses and recomputes each product from its
+offers, as Arrow/pandas/NumPy column operations rather than per-item loops:
+
+- rows are ordered by last_updated (source order breaks ties) so the
+  latest observation wins, and keys are factorized once so every grouping
+  runs on integer codes
+- each row's variants are exploded into one row per offer: legacy str()
+  cells by an Arrow regex split, stored JSON (and anything irregular) by
+  parsing each distinct string once, however many searches repeated it
+- an offer is one listing (key, website, link); only its latest
+  observation is kept
+- best_price, the price range shown in price_display and avg_rating (mean
+  of the offer ratings, as merge_products_for_display computes it) come
+  from groupby min/max/mean over the kept offers; products without offers
+  keep their latest row-level values
+
+bench_rebuild.py measures about 60k rows/s end to end (load + regroup,
+~16 s per 1M legacy rows on one core), most of it in the Arrow regex
+split of the variants cells.
+
+The result is written to a fresh ProductStore database; point
+BB_CATALOG_DB at it once it looks right.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+from product_store import ProductStore, PRODUCT_COLUMNS, product_row, _parse_legacy_list
+from product_record import key_id, display_id
+
+# Variant fields carried into the rebuilt catalog, in output order; optional
+# ones are left out of a variant that never had them
+OFFER_FIELDS = ['price', 'website', 'rating', 'ratings_count', 'link', 'thumbnail', 'color']
+OPTIONAL_FIELDS = {'color'}
+SOURCE_COLUMNS = PRODUCT_COLUMNS + ['last_updated']
+# Rows exploded into offers at a time; bounds the raw offers held in memory
+OFFER_CHUNK_ROWS = 250000
+
+
+def _skip_invalid_row(row):
+    return 'skip'
+
+
+def _string_table(table, legacy):
+    """All source columns as non-null strings, plus the variants format flag"""
+    columns = {}
+    for name in SOURCE_COLUMNS:
+        column = table[name] if name in table.column_names else pa.nulls(len(table), pa.string())
+        columns[name] = pc.fill_null(pc.cast(column, pa.string()), '')
+    columns['legacy'] = pa.array(np.full(len(table), legacy))
+    return pa.table(columns)
+
+
+def read_csv_rows(path):
+    """Legacy CSV rows as strings, without the header rows repeated mid-file or ragged rows"""
+    table = pcsv.read_csv(
+        path,
+        parse_options=pcsv.ParseOptions(newlines_in_values=True, invalid_row_handler=_skip_invalid_row),
+        convert_options=pcsv.ConvertOptions(
+            column_types={name: pa.string() for name in SOURCE_COLUMNS},
+            strings_can_be_null=False, quoted_strings_can_be_null=False,
+        ),
+    )
+    table = _string_table(table, legacy=True)
+    return table.filter(pc.and_(pc.not_equal(table['id'], ''), pc.not_equal(table['id'], 'id')))
+
+
+def read_db_rows(path):
+    """Stored rows with their raw (JSON) variants"""
+    with sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True) as conn:
+        # SELECT *: catalogs from before display_id lack that column
+        df = pd.read_sql_query("SELECT * FROM products", conn)
+    return _string_table(pa.Table.from_pandas(df.astype(object), preserve_index=False), legacy=False)
+
+
+def load_rows(csv_paths=(), db_paths=()):
+    """All source rows, oldest observation first (source order breaks ties)"""
+    tables = [read_csv_rows(path) for path in csv_paths] + [read_db_rows(path) for path in db_paths]
+    if not tables:
+        return pd.DataFrame(columns=SOURCE_COLUMNS + ['legacy'])
+    table = pa.concat_tables(tables)
+    del tables
+    # sort_indices is stable
+    table = table.take(pc.sort_indices(table, [('last_updated', 'ascending')]))
+    # Arrow's allocator keeps freed buffers around; a multi-million row
+    # history is read once, so hand them back before the regroup
+    pa.default_memory_pool().release_unused()
+    return table.to_pandas()
+
+
+def parse_number(texts):
+    """
+    Vectorized parse_price/parse_rating: "₹1,299" -> 1299.0, NaN for "Not Available" and friends
+
+    Prices and ratings repeat across millions of rows, so only the distinct
+    strings are parsed.
+    """
+    codes, uniques = pd.factorize(texts)
+    cleaned = pd.Series(uniques, dtype=object).astype(str).str.replace(r'[₹,\s]', '', regex=True)
+    numbers = pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=float, copy=True)
+    numbers[~np.isfinite(numbers)] = np.nan
+    return np.where(codes >= 0, numbers[codes], np.nan) if len(numbers) else np.full(len(codes), np.nan)
+
+
+def normalized_keys(df):
+    """Vectorized product_record.group_key"""
+    return df['name'].str.lower().str.strip() + '-' + df['brand'].str.lower().str.strip()
+
+
+# One dict of a legacy variants cell, as str() wrote it: the scraper's keys in
+# its order, then whatever merge_products appended (price_display). Values
+# with escapes or in another layout don't match and go to literal_eval.
+_PY_VALUE = r"""(?:'[^'\\]*'|"[^"\\]*"|None|True|False|-?\d+(?:\.\d+)?)"""
+LEGACY_VARIANT_RE = (
+    rf"^'price': (?P<price>{_PY_VALUE}), 'website': (?P<website>{_PY_VALUE}), "
+    rf"'rating': (?P<rating>{_PY_VALUE}), 'ratings_count': (?P<ratings_count>{_PY_VALUE}), "
+    rf"'link': (?P<link>{_PY_VALUE}), 'thumbnail': (?P<thumbnail>{_PY_VALUE})"
+    rf"(?:, 'color': (?P<color>{_PY_VALUE}))?(?:, '\w+': {_PY_VALUE})*$"
+)
+
+
+def _parse_variants(text, legacy):
+    if legacy:
+        variants = _parse_legacy_list(text)
+    else:
+        try:
+            variants = json.loads(text) if text else []
+        except ValueError:
+            variants = []
+    if not isinstance(variants, list):
+        return []
+    return [tuple(v.get(field) for field in OFFER_FIELDS) for v in variants if isinstance(v, dict)]
+
+
+def _parsed_offers(texts, legacy):
+    """
+    Offers of each cell via json.loads/literal_eval
+
+    Identical cells (the same product saved by many searches) are parsed
+    once; the per-row explosion is index arithmetic.
+    """
+    codes, uniques = pd.factorize(texts)
+    parsed = [_parse_variants(unique, legacy) for unique in uniques]
+    lengths = np.fromiter((len(offers) for offers in parsed), dtype=np.int64, count=len(parsed))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    unique_offers = pd.DataFrame.from_records(
+        [offer for offers in parsed for offer in offers], columns=OFFER_FIELDS
+    )
+
+    counts = lengths[codes]
+    # Position of each offer within its cell, then within the parsed uniques
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    offers = unique_offers.iloc[np.repeat(starts[codes], counts) + within].reset_index(drop=True)
+    offers['row'] = np.repeat(texts.index.to_numpy(), counts)
+    return offers
+
+
+def _legacy_values(texts):
+    """Escape-free Python literals -> strings with the quotes stripped, None for None"""
+    values = pc.utf8_slice_codeunits(texts, 1, -1)
+    # An optional group that did not take part in the match comes back as ""
+    missing = pc.or_(pc.equal(texts, 'None'), pc.equal(texts, ''))
+    return pc.if_else(missing, pa.scalar(None, pa.string()), values)
+
+
+def _extracted_offers(texts):
+    """
+    Offers of legacy cells without literal_eval, plus the cells that need it
+
+    literal_eval costs ~100us a cell. The cells were written by str() of
+    flat dicts with the scraper's keys, so each is split into its dicts and
+    the fields are pulled out by one anchored RE2 match per dict, all in
+    Arrow. A dict that does not match in full ("}, {" inside a value,
+    escapes, another key order) sends its whole cell to literal_eval.
+
+    Returns:
+        (offers DataFrame, cells left for _parsed_offers)
+    """
+    cells = pa.array(texts)
+    listed = pc.and_(pc.starts_with(cells, '[{'), pc.ends_with(cells, '}]'))
+    dicts = pc.split_pattern(pc.utf8_slice_codeunits(cells, 2, -2), '}, {')
+    pieces = pc.list_flatten(dicts)
+    parents = pc.list_parent_indices(dicts).to_numpy()
+    fields = pc.extract_regex(pieces, LEGACY_VARIANT_RE)
+
+    # A cell is extracted only if it is a dict list and every dict matched
+    matched = pc.is_valid(fields).to_numpy(zero_copy_only=False)
+    usable = listed.to_numpy(zero_copy_only=False).copy()
+    usable[parents[~matched]] = False
+    take = usable[parents]
+
+    columns = {field: _legacy_values(pc.struct_field(fields, field).filter(take)) for field in OFFER_FIELDS}
+    offers = pa.table(columns).to_pandas()
+    offers['row'] = texts.index.to_numpy()[parents[take]]
+    rest = texts[~usable & (texts != '[]').to_numpy()]
+    return offers, rest
+
+
+def explode_offers(df):
+    """One row per variant, in row order, with the index of the row it came from"""
+    legacy = df['legacy'].to_numpy(dtype=bool)
+    extracted, rest = _extracted_offers(df['variants'][legacy])
+    frames = [
+        extracted,
+        _parsed_offers(rest, legacy=True),
+        _parsed_offers(df['variants'][~legacy], legacy=False),
+    ]
+    offers = pd.concat([frame for frame in frames if not frame.empty], ignore_index=True)
+    if offers.empty:
+        return pd.DataFrame(columns=OFFER_FIELDS + ['row']).astype({'row': np.int64})
+    offers['row'] = offers['row'].astype(np.int64)
+    return offers.sort_values('row', kind='stable', ignore_index=True)
+
+
+def latest_offers(df, codes, chunk_size=OFFER_CHUNK_ROWS):
+    """
+    The latest observation of every listing, with its key code
+
+    A listing is one (key, website, link) -- the price stands in for a
+    missing link. Rows are exploded chunk by chunk and each chunk is
+    deduplicated before the next, so only one chunk of raw offers is held
+    at a time. Rows are oldest-first, so the last duplicate wins.
+
+    Returns:
+        (offers DataFrame with a 'key' code column, number of offers seen)
+    """
+    kept, seen = [], 0
+    for start in range(0, len(df), chunk_size):
+        offers = explode_offers(df.iloc[start:start + chunk_size])
+        seen += len(offers)
+        offers['key'] = codes[offers['row'].to_numpy()]
+        offers['listing'] = offers['link'].where(offers['link'].notna() & (offers['link'] != ''), offers['price'])
+        kept.append(offers.drop_duplicates(['key', 'website', 'listing'], keep='last'))
+    if not kept:
+        return pd.DataFrame(columns=OFFER_FIELDS + ['row', 'key']).astype({'row': np.int64, 'key': np.int64}), 0
+    offers = pd.concat(kept, ignore_index=True).drop_duplicates(['key', 'website', 'listing'], keep='last')
+    return offers.drop(columns='listing').reset_index(drop=True), seen
+
+
+def _price_display(low, high):
+    """"₹1,299", "₹1,199 - ₹1,299" or "Not Available", as merge_products_for_display shows it"""
+    display = pd.Series("Not Available", index=low.index, dtype=object)
+    priced = low.notna()
+    display[priced] = '₹' + low[priced].map('{:,.0f}'.format)
+    ranged = priced & (high > low)
+    display[ranged] = display[ranged] + ' - ₹' + high[ranged].map('{:,.0f}'.format)
+    return display
+
+
+def _row_per_key(codes, n_keys, mask=None, last=True):
+    """Index of each key's last (or first) row among `mask`; -1 for keys without one"""
+    rows = np.arange(len(codes))
+    if mask is not None:
+        rows, codes = rows[mask], codes[mask]
+    grouped = pd.Series(rows).groupby(codes)
+    chosen = grouped.max() if last else grouped.min()
+    picked = np.full(n_keys, -1)
+    picked[chosen.index.to_numpy()] = chosen.to_numpy()
+    return picked
+
+
+def _lists_by_key(codes, values, n_keys):
+    """List of values for every key code 0..n_keys-1, split off one stable sort"""
+    order = np.argsort(codes, kind='stable')
+    values = [values[i] for i in order]
+    ends = np.cumsum(np.bincount(codes, minlength=n_keys))
+    starts = ends - np.bincount(codes, minlength=n_keys)
+    return [values[start:end] for start, end in zip(starts, ends)]
+
+
+def _sites(df, codes, offers, offer_codes, n_keys):
+    """available_on per key: the rows' own site lists plus the sites of the offers"""
+    lists = pc.split_pattern(pa.array(df['available_on']), '|')
+    names = np.concatenate([
+        pc.list_flatten(lists).to_numpy(zero_copy_only=False),
+        offers['website'].to_numpy(dtype=object),
+    ])
+    owners = np.concatenate([codes[pc.list_parent_indices(lists).to_numpy()], offer_codes])
+    site_codes, site_names = pd.factorize(names)
+    # -1: missing website
+    valid = site_codes >= 0
+    valid[valid] = site_names[site_codes[valid]] != ''
+    pairs = np.unique(owners[valid] * len(site_names) + site_codes[valid])
+    return _lists_by_key(pairs // len(site_names), list(site_names[pairs % len(site_names)]), n_keys)
+
+
+def rebuild(df):
+    """
+    Regroup historical rows into one product per name/brand key
+
+    Every grouping step runs on integer key codes from one factorize of the
+    normalized keys.
+
+    Returns:
+        (product DataFrame in ProductStore row shape, stats dict)
+    """
+    df = df.reset_index(drop=True)
+    codes, keys = pd.factorize(normalized_keys(df))
+    n_keys = len(keys)
+
+    # Latest name/brand per key, and the latest known row-level price and
+    # rating and the earliest thumbnail as fallbacks for keys without offers
+    products = df[['name', 'brand', 'last_updated']].iloc[_row_per_key(codes, n_keys)].reset_index(drop=True)
+    row_price = parse_number(df['best_price'])
+    row_price = np.where(np.isnan(row_price), parse_number(df['price_display']), row_price)
+    row_rating = parse_number(df['avg_rating'])
+    picked = _row_per_key(codes, n_keys, ~np.isnan(row_price))
+    fallback_price = np.where(picked >= 0, row_price[picked], np.nan)
+    picked = _row_per_key(codes, n_keys, ~np.isnan(row_rating))
+    fallback_rating = np.where(picked >= 0, row_rating[picked], np.nan)
+    thumbnails = df['thumbnail'].to_numpy(dtype=object)
+    picked = _row_per_key(codes, n_keys, df['thumbnail'].to_numpy(dtype=object) != '', last=False)
+    products['thumbnail'] = np.where(picked >= 0, thumbnails[picked], None)
+
+    offers, seen = latest_offers(df, codes)
+    offer_codes = offers['key'].to_numpy(dtype=np.int64)
+
+    by_key = pd.DataFrame({
+        'key': offer_codes,
+        'price': parse_number(offers['price']),
+        'rating': parse_number(offers['rating']),
+    }).groupby('key').agg(low=('price', 'min'), high=('price', 'max'), rating=('rating', 'mean'))
+    by_key = by_key.reindex(range(n_keys))
+
+    products['best_price'] = by_key['low'].fillna(pd.Series(fallback_price))
+    products['price_display'] = _price_display(products['best_price'], by_key['high'].fillna(products['best_price']))
+    products['avg_rating'] = by_key['rating'].round(1).fillna(pd.Series(fallback_rating))
+    products['available_on'] = _sites(df, codes, offers, offer_codes, n_keys)
+    products['variants'] = _lists_by_key(offer_codes, _variant_dicts(offers), n_keys)
+
+    # One id per key, so keys that share a legacy (display) id stay apart;
+    # each product's name/brand is a row of its key, so its product_id is
+    # the hash of that key
+    products.insert(0, 'id', [key_id(key) for key in keys])
+    products.insert(1, 'display_id', [display_id(name, brand) for name, brand
+                                      in zip(products['name'].tolist(), products['brand'].tolist())])
+    stats = {
+        "rows": len(df),
+        "offers": seen,
+        "listings": len(offers),
+        "products": len(products),
+    }
+    return products.reset_index(drop=True), stats
+
+
+def _variant_dicts(offers):
+    required = [field for field in OFFER_FIELDS if field not in OPTIONAL_FIELDS]
+    records = offers[OFFER_FIELDS].astype(object)
+    records = records.where(records.notna(), None)
+    variants = [dict(zip(required, values)) for values in records[required].itertuples(index=False, name=None)]
+    # Optional fields come last in OFFER_FIELDS, so adding them keeps the order
+    for field in (field for field in OFFER_FIELDS if field in OPTIONAL_FIELDS):
+        values = records[field].to_numpy()
+        for i in np.flatnonzero(records[field].notna().to_numpy()):
+            variants[i][field] = values[i]
+    return variants
+
+
+def write_catalog(products, path, chunk_size=20000):
+    """Write rebuilt products into a fresh ProductStore database"""
+    store = ProductStore(path)
+    written = 0
+    columns = products[PRODUCT_COLUMNS + ['last_updated']].astype(object)
+    records = columns.where(columns.notna(), None).to_dict('records')
+    for start in range(0, len(records), chunk_size):
+        rows = []
+        for product in records[start:start + chunk_size]:
+            rows.append(product_row(product, product['last_updated']))
+        written += store.upsert_rows(rows)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", action="append", default=[], help="Legacy CSV file (repeatable)")
+    parser.add_argument("--db", action="append", default=[], help="Existing catalog database (repeatable)")
+    parser.add_argument("--out", default="catalog.rebuilt.db", help="Database to write")
+    parser.add_argument("--force", action="store_true", help="Overwrite --out if it exists")
+    args = parser.parse_args()
+
+    if not args.csv and not args.db:
+        parser.error("give at least one --csv or --db source")
+    if os.path.abspath(args.out) in {os.path.abspath(path) for path in args.db}:
+        parser.error("--out must not be one of the --db sources")
+    if os.path.exists(args.out):
+        if not args.force:
+            parser.error(f"'{args.out}' exists; use --force to overwrite it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.out + suffix):
+                os.remove(args.out + suffix)
+
+    start = time.perf_counter()
+    df = load_rows(args.csv, args.db)
+    loaded = time.perf_counter()
+    products, stats = rebuild(df)
+    rebuilt = time.perf_counter()
+    written = write_catalog(products, args.out)
+    done = time.perf_counter()
+
+    print(f"Loaded {stats['rows']:,} rows in {loaded - start:.1f}s, regrouped into {stats['products']:,} products "
+          f"({stats['offers']:,} offers, {stats['listings']:,} distinct listings) in {rebuilt - loaded:.1f}s")
+    print(f"✅ Wrote {written:,} products to '{args.out}' in {done - rebuilt:.1f}s.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
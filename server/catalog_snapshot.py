@@ -0,0 +1,271 @@
+"""
+Typed columnar snapshots of the product catalog
+
+The catalog is written as Arrow IPC files next to the SQLite database:
+
+    products-<seq>.arrow   one row per product; best_price / avg_rating are
+                           float64 with nulls, available_on is list<string>
+                           and variants a nested list<struct>
+    manifest.json          which file is current and the store write_seq
+                           it was taken at
+
+Arrow IPC is used rather than Parquet because it can be memory-mapped and
+read without decoding, so startup gets the scalar columns straight from the
+page cache and the list columns without any JSON or ast parsing (the
+variant dicts the API serves are still built as Python objects). A snapshot
+is only trusted when its write_seq matches the database; otherwise the
+catalog falls back to SQLite and a fresh snapshot is written.
+"""
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CATALOG_SNAPSHOT_DIR = os.environ.get("BB_CATALOG_SNAPSHOT_DIR", "catalog_snapshot")
+CATALOG_SNAPSHOT_DELAY = float(os.environ.get("BB_CATALOG_SNAPSHOT_DELAY", "5"))
+
+MANIFEST = "manifest.json"
+
+# Keys kept from each variant dict; missing keys are stored as null
+VARIANT_FIELDS = ['price', 'price_display', 'website', 'rating', 'ratings_count', 'link', 'thumbnail', 'color']
+# Bit i set: the variant dict had VARIANT_FIELDS[i] as a key (even if None),
+# so it reads back with exactly the keys it was written with
+PRESENT_FIELD = 'present'
+
+# seq: store write_seq the snapshot reflects; the table is memory-mapped
+TypedSnapshot = namedtuple("TypedSnapshot", ["seq", "products"])
+
+
+def available():
+    return pa is not None
+
+
+def _schemas():
+    variant = pa.struct([(field, pa.string()) for field in VARIANT_FIELDS] + [(PRESENT_FIELD, pa.int32())])
+    products = pa.schema([
+        ('id', pa.string()),
+        ('display_id', pa.string()),
+        ('name', pa.string()),
+        ('brand', pa.string()),
+        ('price_display', pa.string()),
+        ('best_price', pa.float64()),
+        ('avg_rating', pa.float64()),
+        ('thumbnail', pa.string()),
+        ('available_on', pa.list_(pa.string())),
+        ('variants', pa.list_(variant)),
+        ('last_updated', pa.string()),
+    ])
+    return products, variant
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _variant_struct(variant):
+    struct = {field: _text(variant.get(field)) for field in VARIANT_FIELDS}
+    struct[PRESENT_FIELD] = sum(1 << i for i, field in enumerate(VARIANT_FIELDS) if field in variant)
+    return struct
+
+
+def _variant_dict(struct):
+    """Inverse of _variant_struct; snapshots without PRESENT_FIELD drop null fields"""
+    present = struct.get(PRESENT_FIELD)
+    if present is None:
+        return {field: value for field, value in struct.items() if value is not None}
+    return {field: struct[field] for i, field in enumerate(VARIANT_FIELDS) if present >> i & 1}
+
+
+def products_table(df):
+    """Catalog DataFrame (as served by Catalog) -> typed products table"""
+    import pandas as pd
+
+    schema, _ = _schemas()
+    best_price = pd.to_numeric(df['best_price'], errors='coerce').astype('float64')
+    best_price = best_price.where(best_price.abs() != float('inf'))
+    avg_rating = pd.to_numeric(df['avg_rating'], errors='coerce').astype('float64')
+    variants = [
+        [_variant_struct(v) for v in value if isinstance(v, dict)]
+        if isinstance(value, list) else []
+        for value in df['variants']
+    ]
+    available_on = [value if isinstance(value, list) else [] for value in df['available_on']]
+    columns = {
+        'id': df['id'].astype(str).tolist(),
+        'display_id': df['display_id'].map(_text).tolist(),
+        'name': df['name'].map(_text).tolist(),
+        'brand': df['brand'].map(_text).tolist(),
+        'price_display': df['price_display'].map(_text).tolist(),
+        'best_price': pa.array(best_price, type=pa.float64(), from_pandas=True),
+        'avg_rating': pa.array(avg_rating, type=pa.float64(), from_pandas=True),
+        'thumbnail': df['thumbnail'].map(_text).tolist(),
+        'available_on': available_on,
+        'variants': variants,
+        'last_updated': df['last_updated'].map(_text).tolist(),
+    }
+    return pa.table(columns, schema=schema)
+
+
+def _write_table(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def write_snapshot(df, seq, directory=CATALOG_SNAPSHOT_DIR):
+    """
+    Write a snapshot of `df` taken at store write_seq `seq`
+
+    The data file is versioned and the manifest is swapped in last with
+    os.replace, so readers see either the old snapshot or the new one.
+    Files of older snapshots are removed on a best-effort basis (a reader
+    that still has one mapped keeps it alive on POSIX; on Windows the
+    delete fails and is retried after the next write).
+    """
+    os.makedirs(directory, exist_ok=True)
+    products = products_table(df)
+    names = {"products": f"products-{seq}.arrow"}
+    _write_table(products, os.path.join(directory, names["products"]))
+
+    manifest = {"seq": seq, "rows": products.num_rows, **names}
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    for name in os.listdir(directory):
+        if name.endswith(".arrow") and name not in names.values():
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return manifest
+
+
+def _map_table(path):
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_snapshot(directory=CATALOG_SNAPSHOT_DIR):
+    """Memory-map the current snapshot; None if there is none or pyarrow is missing"""
+    if not available():
+        return None
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        return TypedSnapshot(
+            manifest["seq"],
+            _map_table(os.path.join(directory, manifest["products"])),
+        )
+    except (OSError, ValueError, KeyError, pa.ArrowInvalid) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Ignoring unreadable catalog snapshot: {str(e)}")
+        return None
+
+
+def products_frame(table):
+    """
+    Typed products table -> DataFrame in the shape Catalog serves
+
+    Scalar columns convert straight from the mapped buffers; the list
+    columns are materialised as Python lists and dicts by Arrow, with no
+    JSON or ast parsing.
+    """
+    df = table.drop_columns(['available_on', 'variants']).to_pandas()
+    df['available_on'] = table['available_on'].to_pylist()
+    df['variants'] = [[_variant_dict(variant) for variant in variants] for variants in table['variants'].to_pylist()]
+    df['avg_rating'] = df['avg_rating'].astype(object).where(df['avg_rating'].notna(), "Not Rated")
+    df['best_price'] = df['best_price'].astype(object).where(df['best_price'].notna(), None)
+    return df[[field.name for field in table.schema]]
+
+
+class SnapshotWriter:
+    """
+    Keeps the on-disk snapshot in step with a Catalog
+
+    Each catalog change schedules a write, made once `delay` seconds pass
+    without another change, so a burst of saves costs one snapshot. A
+    steady stream of changes still gets written every `max_delay` seconds.
+    Writes happen on a daemon thread, off the request path.
+
+    Args:
+        catalog: Catalog to follow
+        directory: Snapshot directory
+        delay: Seconds to wait for further changes before writing
+        max_delay: Longest a change waits for a write (default 10 x delay)
+    """
+
+    def __init__(self, catalog, directory=CATALOG_SNAPSHOT_DIR, delay=CATALOG_SNAPSHOT_DELAY, max_delay=None):
+        self.directory = directory
+        self.delay = delay
+        self.max_delay = max_delay if max_delay is not None else 10 * delay
+        self.written_seq = None
+        self.writes = 0
+        self._pending = None
+        self._first_at = self._last_at = 0.0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="catalog-snapshot", daemon=True)
+        self._thread.start()
+        catalog.add_listener(self.schedule)
+        current = catalog.snapshot()
+        if current.seq != catalog.loaded_from_snapshot:
+            self.schedule(current)
+
+    def schedule(self, snapshot):
+        with self._cond:
+            now = time.monotonic()
+            if self._pending is None:
+                self._first_at = now
+            self._pending = snapshot
+            self._last_at = now
+            self._cond.notify()
+
+    def _take(self):
+        with self._cond:
+            snapshot, self._pending = self._pending, None
+            return snapshot
+
+    def _write(self, snapshot):
+        if snapshot is None or snapshot.seq == self.written_seq:
+            return
+        try:
+            write_snapshot(snapshot.df, snapshot.seq, self.directory)
+            self.written_seq = snapshot.seq
+            self.writes += 1
+        except Exception as e:
+            print(f"Error writing catalog snapshot: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                # Let a burst of saves settle: every change restarts the delay
+                while not self._closed:
+                    deadline = min(self._last_at + self.delay, self._first_at + self.max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self._write(self._take())
+
+    def close(self):
+        """Stop the thread and write any pending change synchronously"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=self.delay + 30)
+        self._write(self._take())
+
+    def status(self):
+        return {"directory": self.directory, "written_seq": self.written_seq, "writes": self.writes}
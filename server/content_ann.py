@@ -0,0 +1,221 @@
+"""
+Approximate nearest neighbours for catalog-wide content lookups
+
+Products are bucketed with an IVF (inverted file) index: spherical k-means
+splits the catalog into `lists` clusters, and a query only looks at the
+products of its `probes` closest clusters. The clustering runs on dense
+sketches of the hashed TF-IDF vectors: each hashed column is spread over
+SKETCH_SPREAD of `dim` coordinates with random signs, derived from the
+column number, so no projection matrix is stored. LiveContentIndex scores
+the probed products exactly, so only recall is approximate.
+
+More probes raise recall and cost; more lists make each probe cheaper but
+need more probes for the same recall. bench_ann.py reports both.
+
+The index is saved as one .npz file (centroids and each product's list),
+written to a temporary name and swapped in with os.replace.
+"""
+import os
+import json
+import numpy as np
+
+CONTENT_ANN_PATH = os.environ.get("BB_CONTENT_ANN_PATH", "content_ann.npz")
+# Below this many products the exact scan is as fast as probing 8 lists
+# (bench_ann, 1 CPU: scan p50 1.2 ms vs 1.9 ms at 100k, 3.9 vs 3.0 at 200k)
+CONTENT_ANN_MIN_PRODUCTS = int(os.environ.get("BB_CONTENT_ANN_MIN_PRODUCTS", "200000"))
+CONTENT_ANN_DIM = int(os.environ.get("BB_CONTENT_ANN_DIM", "128"))
+# 0 picks sqrt(products) at training time
+CONTENT_ANN_LISTS = int(os.environ.get("BB_CONTENT_ANN_LISTS", "0"))
+CONTENT_ANN_PROBES = int(os.environ.get("BB_CONTENT_ANN_PROBES", "8"))
+
+SKETCH_SPREAD = 4
+SKETCH_SEED = 0x5EED
+TRAIN_ITERATIONS = 10
+TRAIN_SAMPLES_PER_LIST = 256
+CHUNK_ROWS = 8192
+
+
+def _mix(values, salt):
+    """splitmix64 of uint64 values; numpy wraps on overflow"""
+    x = values.astype(np.uint64) + np.uint64(salt * 0x9E3779B97F4A7C15 % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def sketch(counts, weights, dim=CONTENT_ANN_DIM, seed=SKETCH_SEED):
+    """
+    Dense unit-length sketches of sparse rows
+
+    Args:
+        counts: CSR matrix of raw term counts
+        weights: Per-column weight (IDF) applied before sketching
+        dim: Sketch length
+        seed: Fixes which coordinates and signs each column gets
+
+    Returns:
+        float32 array of shape (rows, dim)
+    """
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    values = (counts.data * weights[counts.indices]).astype(np.float32)
+    out = np.zeros((counts.shape[0], dim), dtype=np.float32)
+    for spread in range(SKETCH_SPREAD):
+        hashed = _mix(counts.indices, seed + spread)
+        coords = (hashed % np.uint64(dim)).astype(np.int64)
+        signs = np.where(hashed >> np.uint64(63), np.float32(-1), np.float32(1))
+        np.add.at(out, (rows, coords), values * signs)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+def _nearest_lists(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        labels[start:start + CHUNK_ROWS] = np.argmax(vectors[start:start + CHUNK_ROWS] @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """
+    Product slots (see LiveContentIndex) bucketed by their closest centroid
+
+    Args:
+        centroids: (lists, dim) float32 unit vectors
+        seed: Sketch seed the centroids were trained with
+        trained_on: Number of products the centroids were trained on
+    """
+
+    def __init__(self, centroids, seed=SKETCH_SEED, trained_on=0):
+        self.centroids = centroids
+        self.seed = seed
+        self.trained_on = trained_on
+        self.labels = np.full(0, -1, dtype=np.int32)
+        self.members = [set() for _ in range(len(centroids))]
+        self._arrays = {}
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.labels >= 0))
+
+    @classmethod
+    def train(cls, vectors, lists=None, iterations=TRAIN_ITERATIONS, seed=SKETCH_SEED):
+        """
+        Spherical k-means on (a sample of) sketches
+
+        Args:
+            vectors: Unit sketches to cluster
+            lists: Number of clusters (default sqrt of the rows)
+            iterations: k-means rounds
+            seed: Sketch seed, kept with the index
+        """
+        rng = np.random.default_rng(seed)
+        lists = max(1, min(len(vectors), lists or int(np.sqrt(len(vectors)))))
+        sample_size = min(len(vectors), lists * TRAIN_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _nearest_lists(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # An empty cluster keeps its old centroid
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        return cls(centroids, seed, len(vectors))
+
+    def has(self, slots):
+        inside = slots < len(self.labels)
+        return inside & (self.labels[np.where(inside, slots, 0)] >= 0)
+
+    def assign(self, slots, vectors):
+        """Put each product in the list of its closest centroid"""
+        self.place(slots, _nearest_lists(vectors, self.centroids))
+
+    def place(self, slots, labels):
+        """Put products in the given lists, moving any that were elsewhere"""
+        if len(slots) and slots.max() >= len(self.labels):
+            grown = np.full(max(slots.max() + 1, 2 * len(self.labels)), -1, dtype=np.int32)
+            grown[:len(self.labels)] = self.labels
+            self.labels = grown
+        old = self.labels[slots]
+        moved = old != labels
+        slots, labels, old = slots[moved], labels[moved], old[moved]
+        for slot, label in zip(slots[old >= 0].tolist(), old[old >= 0].tolist()):
+            self.members[label].discard(slot)
+        self.labels[slots] = labels
+        order = np.argsort(labels, kind='stable')
+        touched, starts = np.unique(labels[order], return_index=True)
+        for label, group in zip(touched.tolist(), np.split(slots[order], starts[1:])):
+            self.members[label].update(group.tolist())
+        for label in set(touched.tolist()) | set(old[old >= 0].tolist()):
+            self._arrays.pop(label, None)
+
+    def _list(self, label):
+        array = self._arrays.get(label)
+        if array is None:
+            array = self._arrays[label] = np.fromiter(self.members[label], dtype=np.int64)
+        return array
+
+    def probe(self, vector, probes=CONTENT_ANN_PROBES):
+        """Slots in the `probes` lists whose centroids are closest to vector"""
+        scores = self.centroids @ vector
+        probes = min(probes, len(scores))
+        closest = np.argpartition(-scores, probes - 1)[:probes]
+        return np.concatenate([self._list(label) for label in closest.tolist()])
+
+    def save(self, slot_ids, path=CONTENT_ANN_PATH, seq=None):
+        """
+        Write centroids and list assignments
+
+        Args:
+            slot_ids: Product id of each slot, as saved ids outlive slots
+            path: File to write
+            seq: Catalog write_seq the assignments reflect
+        """
+        slots = np.flatnonzero(self.labels >= 0)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                # Newline-joined UTF-8: fixed-width unicode arrays pad every id
+                ids=np.frombuffer("\n".join(slot_ids[slot] for slot in slots).encode('utf-8'), dtype=np.uint8),
+                labels=self.labels[slots],
+                meta=np.array(json.dumps({"seq": seq, "seed": self.seed, "trained_on": self.trained_on})),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CONTENT_ANN_PATH):
+        """
+        Read a saved index
+
+        Returns:
+            (empty IVFIndex with the saved centroids, seq, (ids, lists)),
+            or None if there is no readable file
+        """
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                index = cls(data["centroids"], meta["seed"], meta["trained_on"])
+                ids = data["ids"].tobytes().decode('utf-8').split("\n") if data["ids"].size else []
+                labels = data["labels"]
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Ignoring unreadable content ANN index: {str(e)}")
+            return None
+        return index, meta["seq"], (ids, labels)
+
+    def status(self):
+        sizes = [len(members) for members in self.members]
+        return {
+            "lists": len(sizes),
+            "dim": self.dim,
+            "products": sum(sizes),
+            "trained_on": self.trained_on,
+            "largest_list": max(sizes) if sizes else 0,
+        }
@@ -0,0 +1,623 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from content_ann import (
+    CONTENT_ANN_LISTS, CONTENT_ANN_MIN_PRODUCTS, CONTENT_ANN_PATH, CONTENT_ANN_PROBES, IVFIndex, sketch,
+)
+
+CONTENT_INDEX_DELAY = float(os.environ.get("BB_CONTENT_INDEX_DELAY", "0.5"))
+CONTENT_HASH_FEATURES = int(os.environ.get("BB_CONTENT_HASH_FEATURES", str(2 ** 20)))
+# Re-derive IDF weights once this fraction of the catalog has changed
+CONTENT_IDF_DRIFT = float(os.environ.get("BB_CONTENT_IDF_DRIFT", "0.1"))
+
+RESULT_COLUMNS = ['id', 'name', 'brand', 'price_display', 'avg_rating', 'similarity_score', 'thumbnail', 'website']
+# What LiveContentIndex keeps of each product to build results from
+INFO_COLUMNS = [column for column in RESULT_COLUMNS if column != 'similarity_score']
+
+
+def content_features(product_df):
+    """Text the content recommender compares: name, brand, price, rating and variant colours"""
+    colors = product_df['variants'].apply(
+        lambda x: " ".join([v['color'] for v in x if v.get('color')]) if isinstance(x, list) and x else ""
+    ).astype(str)
+    return (
+        product_df['name'].fillna('').astype(str) + " " +
+        product_df['brand'].fillna('').astype(str) + " " +
+        product_df['price_display'].astype(str) + " " +
+        product_df['avg_rating'].astype(str) + " " +
+        colors
+    )
+
+
+def top_k(scores, k):
+    """
+    Indexes of the k highest scores, best first
+
+    argpartition finds the k-th best score in O(n); ties are broken by the
+    lower index, as a stable sort of all scores would.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def website_of(variants):
+    return variants[0]['website'] if isinstance(variants, list) and variants else None
+
+
+def _row_scores(segment, rows, terms, weights):
+    """Dot products of some rows of a segment with a query over sorted `terms`"""
+    if not len(terms):
+        return np.zeros(len(rows))
+    counts = segment.counts[rows]
+    at = np.minimum(np.searchsorted(terms, counts.indices), len(terms) - 1)
+    matched = np.where(terms[at] == counts.indices, counts.data * weights[at], 0.0)
+    owner = np.repeat(np.arange(len(rows)), np.diff(counts.indptr))
+    return np.bincount(owner, weights=matched, minlength=len(rows)) * segment.scale[rows]
+
+
+class ContentIndex:
+    """
+    TF-IDF vectors of one catalog version
+
+    The vectorizer is fitted once and its rows are L2-normalised, so the
+    cosine similarity of one product to every other is a single sparse
+    row-times-matrix product. A column-major copy makes that product touch
+    only the columns of the query's own terms, and top_k picks the best
+    without sorting every score.
+
+    Args:
+        product_df: Products to index (not modified)
+        version: Catalog version the products come from
+    """
+
+    def __init__(self, product_df, version=None):
+        start = time.perf_counter()
+        self.version = version
+        self.df = product_df.reset_index(drop=True)
+        self.vectorizer = TfidfVectorizer(stop_words='english')
+        try:
+            self.matrix = self.vectorizer.fit_transform(content_features(self.df)).tocsr()
+        except ValueError:
+            # No products, or nothing but stop words
+            self.matrix = sparse.csr_matrix((len(self.df), 0))
+        self.columns = self.matrix.tocsc()
+        self.rows = {}
+        for row, product_id in enumerate(self.df['id'].tolist()):
+            self.rows.setdefault(product_id, row)
+        self.build_seconds = time.perf_counter() - start
+
+    def __contains__(self, product_id):
+        return product_id in self.rows
+
+    def __len__(self):
+        return len(self.df)
+
+    def covers(self, product_ids):
+        return all(product_id in self.rows for product_id in product_ids)
+
+    def similar(self, product_id, n=5, candidates=None):
+        """
+        Most similar products to one product
+
+        Args:
+            product_id: Indexed product to compare against
+            n: Number of products to return
+            candidates: Optional ids to choose from; others are ignored
+
+        Returns:
+            (row positions in self.df, cosine similarities), best first
+        """
+        row = self.rows[product_id]
+        query = self.matrix[row]
+        scores = self.columns[:, query.indices] @ query.data
+        if candidates is None:
+            pool = np.arange(len(scores))
+        else:
+            pool = np.unique([self.rows[c] for c in candidates if c in self.rows])
+        pool = pool[pool != row]
+        best = pool[top_k(scores[pool], n)]
+        return best, scores[best]
+
+    def recommend(self, product_id, n=5, candidates=None):
+        """similar() as the DataFrame content_based_recommendations returns"""
+        rows, scores = self.similar(product_id, n, candidates)
+        recommendations = self.df.iloc[rows].copy()
+        recommendations['similarity_score'] = scores
+        recommendations['website'] = recommendations['variants'].apply(website_of)
+        return recommendations[RESULT_COLUMNS]
+
+
+class _Segment:
+    """Products indexed together: raw term counts and the fields results show"""
+
+    def __init__(self, slots, counts, info):
+        self.slots = slots
+        self.counts = counts
+        self.columns = counts.tocsc()
+        self.info = info
+        self.live = np.ones(len(slots), dtype=bool)
+        self.scale = np.zeros(len(slots))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def rescale(self, idf_squared):
+        """1 / TF-IDF norm of each row under these weights (0 for empty rows)"""
+        norms = np.sqrt(self.counts.multiply(self.counts) @ idf_squared)
+        self.scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+
+class LiveContentIndex:
+    """
+    TF-IDF index updated in place as products are saved
+
+    Terms are hashed into a fixed number of columns, so there is no
+    vocabulary to refit, and per-column document frequencies are kept
+    exact as products come and go. Each update becomes a new segment and
+    replaced products are only marked dead; small segments are merged
+    into larger ones (each at least twice the next) so a product is
+    rewritten O(log n) times, and an update costs time proportional to
+    its batch.
+
+    Scores are the cosine similarities TfidfVectorizer would give, up to
+    hash collisions, using IDF weights (smooth_idf) re-derived from the
+    document frequencies whenever `idf_drift` of the catalog has changed
+    since the last time.
+
+    Every product keeps an integer slot for as long as the index lives;
+    arrays map slots to their current segment and row, so sets of
+    products are handled as slot arrays. Lookups restricted to candidates
+    score only those products. Catalog-wide lookups scan every product,
+    or, once build_ann() has run, only the products an IVF index (see
+    content_ann) puts near the query.
+
+    Args:
+        product_df: Products to start with (optional)
+        version: Catalog version the products come from
+        n_features: Hashed term columns
+        idf_drift: Fraction of changed products that triggers new IDF weights
+    """
+
+    def __init__(self, product_df=None, version=None, n_features=CONTENT_HASH_FEATURES,
+                 idf_drift=CONTENT_IDF_DRIFT):
+        self.version = version
+        self.idf_drift = idf_drift
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, stop_words='english', alternate_sign=False, norm=None
+        )
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.idf = np.ones(n_features)
+        self.idf_squared = np.ones(n_features)
+        self.segments = []
+        self.rows = {}
+        self.slot_ids = []
+        self._slot_segment = np.zeros(0, dtype=np.int64)
+        self._slot_row = np.zeros(0, dtype=np.int64)
+        self._by_serial = {}
+        self._serials = 0
+        self.ann = None
+        self._ann_changed = None
+        self.changed_since_idf = 0
+        self.idf_refreshes = 0
+        self.updates = 0
+        self.update_seconds = 0.0
+        self._lock = threading.RLock()
+        if product_df is not None:
+            self.update(product_df, version)
+
+    def __contains__(self, product_id):
+        return product_id in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def covers(self, product_ids):
+        rows = self.rows
+        return all(product_id in rows for product_id in product_ids)
+
+    def update(self, changes, version=None):
+        """
+        Add or replace products
+
+        Args:
+            changes: Products (catalog rows) that are new or changed
+            version: Catalog version that includes them
+        """
+        start = time.perf_counter()
+        changes = changes.drop_duplicates(subset='id', keep='last').reset_index(drop=True)
+        if changes.empty:
+            if version is not None:
+                self.version = version
+            return
+        counts = self.vectorizer.transform(content_features(changes)).tocsr()
+        counts.sum_duplicates()
+        info = changes.reindex(columns=INFO_COLUMNS)
+        info['website'] = changes['variants'].apply(website_of)
+
+        with self._lock:
+            slots = np.empty(len(changes), dtype=np.int64)
+            for i, product_id in enumerate(changes['id'].tolist()):
+                slot = self.rows.get(product_id)
+                if slot is None:
+                    slot = self.rows[product_id] = len(self.slot_ids)
+                    self.slot_ids.append(product_id)
+                else:
+                    self._drop(slot)
+                slots[i] = slot
+            if len(self.slot_ids) > len(self._slot_row):
+                grown = max(len(self.slot_ids), 2 * len(self._slot_row))
+                self._slot_segment = np.resize(self._slot_segment, grown)
+                self._slot_row = np.resize(self._slot_row, grown)
+            segment = _Segment(slots, counts, info)
+            self._place(segment)
+            np.add.at(self.doc_freq, counts.indices, 1)
+            self.segments.append(segment)
+            self.changed_since_idf += len(segment)
+            if self.changed_since_idf > self.idf_drift * len(self.rows):
+                self._refresh_idf()
+            else:
+                segment.rescale(self.idf_squared)
+            if self.ann is not None:
+                self.ann.assign(slots, sketch(counts, self.idf, self.ann.dim, self.ann.seed))
+            if self._ann_changed is not None:
+                self._ann_changed.append(slots)
+            self._compact()
+            if version is not None:
+                self.version = version
+            self.updates += 1
+            self.update_seconds = time.perf_counter() - start
+
+    def _place(self, segment):
+        """Point the segment's slots at its rows"""
+        self._serials += 1
+        segment.serial = self._serials
+        self._by_serial[segment.serial] = segment
+        self._slot_segment[segment.slots] = segment.serial
+        self._slot_row[segment.slots] = np.arange(len(segment))
+
+    def _locate(self, slot):
+        return self._by_serial[self._slot_segment[slot]], self._slot_row[slot]
+
+    def _drop(self, slot):
+        segment, row = self._locate(slot)
+        segment.live[row] = False
+        start, end = segment.counts.indptr[row:row + 2]
+        self.doc_freq[segment.counts.indices[start:end]] -= 1
+        self.changed_since_idf += 1
+
+    def _refresh_idf(self):
+        n = len(self.rows)
+        self.idf = np.log((1 + n) / (1 + self.doc_freq)) + 1
+        self.idf_squared = self.idf ** 2
+        for segment in self.segments:
+            segment.rescale(self.idf_squared)
+        self.changed_since_idf = 0
+        self.idf_refreshes += 1
+
+    def _compact(self):
+        segments = self.segments
+        while len(segments) > 1 and segments[-2].live.sum() <= 2 * segments[-1].live.sum():
+            segments[-2:] = [self._merge(segments[-2:])]
+        # Rewrite any segment that is mostly replaced products
+        for i, segment in enumerate(segments):
+            if segment.live.sum() * 2 < len(segment):
+                segments[i] = self._merge([segment])
+
+    def _merge(self, parts):
+        keep = [np.flatnonzero(part.live) for part in parts]
+        merged = _Segment(
+            np.concatenate([part.slots[rows] for part, rows in zip(parts, keep)]),
+            sparse.vstack([part.counts[rows] for part, rows in zip(parts, keep)], format='csr'),
+            pd.concat([part.info.iloc[rows] for part, rows in zip(parts, keep)], ignore_index=True),
+        )
+        merged.scale = np.concatenate([part.scale[rows] for part, rows in zip(parts, keep)])
+        self._place(merged)
+        for part in parts:
+            del self._by_serial[part.serial]
+        return merged
+
+    def needs_ann(self, min_products=CONTENT_ANN_MIN_PRODUCTS):
+        """Whether build_ann() is due: no IVF index yet, or the catalog has doubled since"""
+        with self._lock:
+            return len(self.rows) >= min_products and (
+                self.ann is None or len(self.rows) >= 2 * self.ann.trained_on
+            )
+
+    def build_ann(self, lists=CONTENT_ANN_LISTS, saved=None, placements=None):
+        """
+        Train an IVF index over the current products and start using it
+
+        The sketching and k-means run without the lock, so lookups and
+        updates carry on; products updated meanwhile are re-bucketed
+        before the index is swapped in.
+
+        Args:
+            lists: Clusters to train (0: sqrt of the product count)
+            saved: Empty IVFIndex whose centroids to use instead of training
+            placements: (product ids, lists) saved with `saved`, kept for
+                the products that are still in the index
+        """
+        with self._lock:
+            parts = [(part, np.flatnonzero(part.live)) for part in self.segments]
+            rows = dict(self.rows) if placements is not None else None
+            idf = self.idf
+            self._ann_changed = []
+        try:
+            if saved is None:
+                vectors = np.concatenate([sketch(part.counts[rows], idf) for part, rows in parts])
+                ann = IVFIndex.train(vectors, lists or None)
+                ann.assign(np.concatenate([part.slots[rows] for part, rows in parts]), vectors)
+            else:
+                ann = saved
+                if placements is not None:
+                    ids, labels = placements
+                    known = [(rows[product_id], label) for product_id, label in zip(ids, labels)
+                             if product_id in rows]
+                    if known:
+                        ann.place(*map(np.array, zip(*known)))
+                for part, rows in parts:
+                    missing = rows[~ann.has(part.slots[rows])]
+                    if len(missing):
+                        ann.assign(part.slots[missing], sketch(part.counts[missing], idf, ann.dim, ann.seed))
+        except Exception:
+            with self._lock:
+                self._ann_changed = None
+            raise
+        with self._lock:
+            changed, self._ann_changed = self._ann_changed, None
+            if changed:
+                slots = np.unique(np.concatenate(changed))
+                segment_of = self._slot_segment[slots]
+                for serial in np.unique(segment_of):
+                    part = self._by_serial[serial]
+                    chosen = slots[segment_of == serial]
+                    ann.assign(chosen, sketch(part.counts[self._slot_row[chosen]], self.idf, ann.dim, ann.seed))
+            self.ann = ann
+
+    def save_ann(self, path=CONTENT_ANN_PATH, seq=None):
+        with self._lock:
+            if self.ann is not None:
+                self.ann.save(self.slot_ids, path, seq)
+
+    def _nearest(self, product_id, n, candidates, probes):
+        """Slots and scores of the best matches; call under the lock"""
+        slot = self.rows.get(product_id)
+        if slot is None:
+            return np.array([], dtype=np.int64), np.array([])
+        segment, row = self._locate(slot)
+        start, end = segment.counts.indptr[row:row + 2]
+        terms = segment.counts.indices[start:end]
+        weights = segment.counts.data[start:end] * self.idf_squared[terms] * segment.scale[row]
+
+        chosen = None
+        if candidates is not None:
+            rows = self.rows
+            chosen = np.unique(np.fromiter((rows[c] for c in candidates if c in rows), dtype=np.int64))
+            if len(chosen) == len(rows):
+                # The whole catalog; look it up like one
+                chosen = None
+        if chosen is None and self.ann is not None and probes != 0:
+            vector = sketch(segment.counts[row], self.idf, self.ann.dim, self.ann.seed)[0]
+            chosen = self.ann.probe(vector, probes or CONTENT_ANN_PROBES)
+            if len(chosen) <= n:
+                # Too few near neighbours to fill the results
+                chosen = None
+        if chosen is None:
+            return self._scan(slot, terms, weights, n)
+        return self._rank(chosen[chosen != slot], terms, weights, n)
+
+    def _scan(self, slot, terms, weights, n):
+        """Score every product through the query terms' columns"""
+        scores = np.concatenate([(part.columns[:, terms] @ weights) * part.scale for part in self.segments])
+        slots = np.concatenate([part.slots for part in self.segments])
+        pool = np.flatnonzero(np.concatenate([part.live for part in self.segments]) & (slots != slot))
+        best = pool[top_k(scores[pool], n)]
+        return slots[best], scores[best]
+
+    def _rank(self, slots, terms, weights, n):
+        """Score only the given slots"""
+        segment_of = self._slot_segment[slots]
+        rows = self._slot_row[slots]
+        scores = np.zeros(len(slots))
+        position = np.zeros(len(slots), dtype=np.int64)
+        order = {part.serial: i for i, part in enumerate(self.segments)}
+        for serial in np.unique(segment_of):
+            mask = segment_of == serial
+            scores[mask] = _row_scores(self._by_serial[serial], rows[mask], terms, weights)
+            position[mask] = order[serial]
+        # Catalog order, so ties go to the earlier product as in a full scan
+        catalog_order = np.lexsort((rows, position))
+        slots, scores = slots[catalog_order], scores[catalog_order]
+        best = top_k(scores, n)
+        return slots[best], scores[best]
+
+    def similar(self, product_id, n=5, candidates=None, probes=None):
+        """
+        Most similar products to one product
+
+        Args:
+            product_id: Indexed product to compare against
+            n: Number of products to return
+            candidates: Optional ids to choose from; others are ignored
+            probes: IVF lists to search for catalog-wide lookups (default
+                CONTENT_ANN_PROBES; 0 scans every product)
+
+        Returns:
+            (product ids, cosine similarities), best first
+        """
+        with self._lock:
+            slots, scores = self._nearest(product_id, n, candidates, probes)
+            return [self.slot_ids[slot] for slot in slots], scores
+
+    def recommend(self, product_id, n=5, candidates=None, probes=None):
+        """similar() as the DataFrame content_based_recommendations returns"""
+        with self._lock:
+            slots, scores = self._nearest(product_id, n, candidates, probes)
+            rows = [part.info.iloc[row] for part, row in map(self._locate, slots)]
+        recommendations = pd.DataFrame(rows, columns=INFO_COLUMNS)
+        recommendations['similarity_score'] = scores
+        return recommendations[RESULT_COLUMNS].reset_index(drop=True)
+
+    def status(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "products": len(self.rows),
+                "segments": len(self.segments),
+                "hashed_features": len(self.doc_freq),
+                "idf_refreshes": self.idf_refreshes,
+                "updates": self.updates,
+                "update_ms": round(self.update_seconds * 1000, 1),
+                "ann": self.ann.status() if self.ann is not None else None,
+            }
+
+
+class ContentIndexer:
+    """
+    Keeps a LiveContentIndex in step with a Catalog
+
+    The index is built once at startup. After that, the rows each catalog
+    version changed are queued and applied on a daemon thread once `delay`
+    seconds pass without another version, so a burst of saves is applied
+    as one batch; a steady stream is still applied every `max_delay`
+    seconds. A full
+    catalog reload builds a fresh index in the background and swaps it
+    in, with requests using the old one until then.
+
+    The same thread looks after the IVF index for catalog-wide lookups: it
+    loads the one saved at `ann_path` (keeping only its centroids if the
+    catalog has changed since), trains one when the catalog reaches
+    CONTENT_ANN_MIN_PRODUCTS or doubles, and saves it after training and
+    on close.
+
+    Args:
+        catalog: Catalog to follow
+        delay: Seconds to wait for further changes before applying them
+        ann_path: Where the IVF index is saved
+        max_delay: Longest a change waits to be applied (default 5 x delay)
+    """
+
+    def __init__(self, catalog, delay=CONTENT_INDEX_DELAY, ann_path=CONTENT_ANN_PATH, max_delay=None):
+        self.delay = delay
+        self.max_delay = max_delay if max_delay is not None else 5 * delay
+        self.ann_path = ann_path
+        self.builds = 0
+        self.ann_builds = 0
+        self._changes = []
+        self._latest = None
+        self._reload = None
+        self._first_at = self._last_at = 0.0
+        self._cond = threading.Condition()
+        self._closed = False
+        # Listen before the first build so no save falls in between;
+        # re-applying rows the build already has just replaces them
+        catalog.add_listener(self.schedule)
+        snapshot = catalog.snapshot()
+        self._index = self._build(snapshot)
+        self._seq = snapshot.seq
+        self._thread = threading.Thread(target=self._run, name="content-index", daemon=True)
+        self._thread.start()
+
+    def _build(self, snapshot):
+        index = LiveContentIndex(snapshot.df, snapshot.version)
+        self.builds += 1
+        return index
+
+    def schedule(self, snapshot):
+        with self._cond:
+            if snapshot.changes is None:
+                self._reload = snapshot
+                self._changes = []
+            else:
+                self._changes.append(snapshot.changes)
+            now = time.monotonic()
+            if self._latest is None:
+                self._first_at = now
+            self._latest = snapshot
+            self._last_at = now
+            self._cond.notify()
+
+    def _load_ann(self):
+        loaded = IVFIndex.load(self.ann_path)
+        if loaded is None or len(self._index) < CONTENT_ANN_MIN_PRODUCTS:
+            return
+        ann, seq, placements = loaded
+        # Buckets from another catalog state are dropped; the centroids still serve
+        self._index.build_ann(saved=ann, placements=placements if seq == self._seq else None)
+        print(f"Loaded content ANN index: {ann.status()}")
+
+    def _train_ann(self):
+        start = time.perf_counter()
+        self._index.build_ann()
+        self.ann_builds += 1
+        self._index.save_ann(self.ann_path, self._seq)
+        print(f"Trained content ANN index in {time.perf_counter() - start:.1f}s: {self._index.ann.status()}")
+
+    def _run(self):
+        try:
+            self._load_ann()
+            if self._index.needs_ann():
+                self._train_ann()
+        except Exception as e:
+            print(f"Error preparing content ANN index: {str(e)}")
+        while True:
+            with self._cond:
+                while self._latest is None and not self._closed:
+                    self._cond.wait()
+                # Let a burst of saves settle: every change restarts the delay
+                while not self._closed:
+                    deadline = min(self._last_at + self.delay, self._first_at + self.max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                reload, changes, latest = self._reload, self._changes, self._latest
+                self._reload, self._changes, self._latest = None, [], None
+            if latest is None:
+                continue
+            try:
+                if reload is not None:
+                    index = self._build(reload)
+                    if changes:
+                        index.update(pd.concat(changes, ignore_index=True), latest.version)
+                    previous, self._index = self._index, index
+                    self._seq = latest.seq
+                    if previous.ann is not None and len(index) >= CONTENT_ANN_MIN_PRODUCTS:
+                        ann = previous.ann
+                        index.build_ann(saved=IVFIndex(ann.centroids, ann.seed, ann.trained_on))
+                elif changes:
+                    self._index.update(pd.concat(changes, ignore_index=True), latest.version)
+                    self._seq = latest.seq
+                if self._index.needs_ann():
+                    self._train_ann()
+            except Exception as e:
+                print(f"Error updating content index: {str(e)}")
+
+    def current(self):
+        return self._index
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self._index.save_ann(self.ann_path, self._seq)
+
+    def status(self):
+        status = self._index.status()
+        status["builds"] = self.builds
+        status["ann_builds"] = self.ann_builds
+        return status
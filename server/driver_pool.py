@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+# Configuration (overridable from the environment)
+DRIVER_POOL_SIZE = int(os.environ.get("BB_DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_USES = int(os.environ.get("BB_DRIVER_MAX_USES", "50"))
+DRIVER_HEADLESS = os.environ.get("BB_DRIVER_HEADLESS", "0") == "1"
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get("BB_DRIVER_CHECKOUT_TIMEOUT", "60"))
+
+
+def setup_driver(headless=False):
+    options = webdriver.EdgeOptions()
+    options.use_chromium = True
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    if headless:
+        options.add_argument("--headless")
+    return webdriver.Edge(options=options)
+
+
+class DriverPool:
+    """
+    A bounded pool of warm, reusable WebDriver instances
+
+    Drivers are created lazily up to `size`, handed out with checkout() and
+    returned with checkin(). A driver is replaced when it fails a health check,
+    when it is checked in as broken, or once it has served `max_uses` jobs.
+
+    Args:
+        size: Maximum number of live drivers
+        max_uses: Number of checkouts after which a driver is recycled
+        headless: Start browsers headless
+        factory: Callable returning a new driver (defaults to setup_driver)
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES,
+                 headless=DRIVER_HEADLESS, factory=None):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.headless = headless
+        self.factory = factory or (lambda: setup_driver(headless=self.headless))
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used driver warm
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "crashed": 0, "checkouts": 0}
+
+    def _create(self):
+        driver = self.factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+            self.stats["created"] += 1
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error quitting driver: {str(e)}")
+
+    @staticmethod
+    def is_healthy(driver):
+        """Cheap liveness probe - a crashed browser or dead session raises here"""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def checkout(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        """Get a healthy driver, blocking until one is free"""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a free WebDriver")
+
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._create()
+                    break
+                if self.is_healthy(driver):
+                    break
+                print("⚠️ Discarding unhealthy WebDriver")
+                self.stats["crashed"] += 1
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            self.stats["checkouts"] += 1
+        return driver
+
+    def checkin(self, driver, broken=False):
+        """Return a driver to the pool, recycling it if broken or worn out"""
+        try:
+            if broken or self._closed:
+                if broken:
+                    self.stats["crashed"] += 1
+                self._discard(driver)
+            elif self._uses.get(id(driver), 0) >= self.max_uses:
+                self.stats["recycled"] += 1
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def lease(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        """Context manager around checkout/checkin"""
+        driver = self.checkout(timeout=timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = not self.is_healthy(driver)
+            raise
+        finally:
+            self.checkin(driver, broken=broken)
+
+    def prewarm(self, count=None):
+        """Start up to `count` drivers ahead of the first request"""
+        count = self.size if count is None else min(count, self.size)
+        drivers = []
+        try:
+            for _ in range(count):
+                drivers.append(self.checkout())
+        finally:
+            for driver in drivers:
+                self.checkin(driver)
+
+    def status(self):
+        with self._lock:
+            live = len(self._uses)
+        return {
+            "size": self.size,
+            "live": live,
+            "idle": self._idle.qsize(),
+            "max_uses": self.max_uses,
+            **self.stats,
+        }
+
+    def close(self):
+        """Quit all idle drivers; drivers still leased are quit on checkin"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Process-wide driver pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+        return _pool
+
+
+def close_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
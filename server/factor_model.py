@@ -0,0 +1,322 @@
+"""
+Latent-factor model of the ratings, retrained in the background
+
+Each rating is modelled as mean + user bias + item bias + p_u . q_i, with
+rank-`rank` user and item vectors fitted to the observed ratings by
+alternating least squares: holding the item side fixed, every user's
+vector and bias is a small ridge regression on the items they rated, and
+vice versa. The regressions are solved together, a few conjugate-gradient
+steps per sweep warm-started from the previous sweep, so a sweep costs a
+handful of passes over the ratings instead of a rank x rank matrix per
+rating. The vectors start from a truncated SVD of the centred ratings.
+
+Serving a user is then one item-matrix x user-vector product plus top_k.
+FactorTrainer retrains from the RatingsStore once enough new ratings have
+come in and swaps the new model in; requests keep using the old one until
+then. bench_factors.py reports training and serving times and RMSE /
+precision@k on held-out ratings. The app always trains the model but only
+ranks recommendations with it when BB_FACTOR_SERVE=1.
+"""
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from content_index import top_k
+
+FACTOR_RANK = int(os.environ.get("BB_FACTOR_RANK", "16"))
+FACTOR_REGULARIZATION = float(os.environ.get("BB_FACTOR_REGULARIZATION", "0.05"))
+FACTOR_ITERATIONS = int(os.environ.get("BB_FACTOR_ITERATIONS", "10"))
+# Retrain once this many ratings have been written since the last training
+FACTOR_RETRAIN_AFTER = int(os.environ.get("BB_FACTOR_RETRAIN_AFTER", "500"))
+# Seconds to wait for further ratings before retraining
+FACTOR_RETRAIN_DELAY = float(os.environ.get("BB_FACTOR_RETRAIN_DELAY", "30"))
+# Rank collaborative recommendations with the model; off until it beats the
+# neighbourhood and most-rated baselines on precision@k (see bench_factors.py)
+FACTOR_SERVE = os.environ.get("BB_FACTOR_SERVE", "0") == "1"
+
+# Biases are shrunk as if every user and item had this many extra ratings at
+# the mean, so an item with a single 5-star rating doesn't top every list
+BIAS_PRIOR = 5
+CG_STEPS = 3
+CHUNK_RATINGS = 1 << 20
+
+
+def _times_gram(matrix, rows_of, design, vectors):
+    """sum over each row's entries c of design[c] (design[c] . vectors[row])"""
+    dots = np.empty(len(matrix.indices))
+    for start in range(0, len(dots), CHUNK_RATINGS):
+        end = start + CHUNK_RATINGS
+        dots[start:end] = np.einsum(
+            'ij,ij->i', design[matrix.indices[start:end]], vectors[rows_of[start:end]]
+        )
+    return sparse.csr_matrix((dots, matrix.indices, matrix.indptr), shape=matrix.shape) @ design
+
+
+def _solve(matrix, rows_of, design, targets, vectors, regularization, steps=CG_STEPS):
+    """
+    Ridge regression of every row's targets on the designs of its entries
+
+    Solves (Z_r' Z_r + regularization * n_r I + BIAS_PRIOR e e') w_r = Z_r' t_r
+    for each row r of matrix, where e picks the last (bias) coordinate, with
+    conjugate gradient, all rows at once.
+
+    Args:
+        matrix: CSR matrix whose entries say which design rows each row uses
+        rows_of: Row of each stored entry
+        design: One design vector per column
+        targets: Target of each stored entry, aligned with matrix.data
+        vectors: Current solutions, used as the starting point
+        regularization: Ridge strength, scaled by each row's entry count
+        steps: Conjugate-gradient steps
+    """
+    damping = np.repeat(regularization * np.maximum(np.diff(matrix.indptr), 1)[:, None], design.shape[1], axis=1)
+    damping[:, -1] += BIAS_PRIOR
+    solution = vectors.copy()
+    rhs = sparse.csr_matrix((targets, matrix.indices, matrix.indptr), shape=matrix.shape) @ design
+    residual = rhs - _times_gram(matrix, rows_of, design, solution) - damping * solution
+    direction = residual.copy()
+    norm_sq = np.einsum('ij,ij->i', residual, residual)
+    for _ in range(steps):
+        applied = _times_gram(matrix, rows_of, design, direction) + damping * direction
+        curvature = np.einsum('ij,ij->i', direction, applied)
+        alpha = np.divide(norm_sq, curvature, out=np.zeros_like(norm_sq), where=curvature > 0)
+        solution += alpha[:, None] * direction
+        residual -= alpha[:, None] * applied
+        new_norm_sq = np.einsum('ij,ij->i', residual, residual)
+        beta = np.divide(new_norm_sq, norm_sq, out=np.zeros_like(norm_sq), where=norm_sq > 0)
+        direction = residual + beta[:, None] * direction
+        norm_sq = new_norm_sq
+    return solution
+
+
+class FactorModel:
+    """
+    Trained user and item factors with their id maps
+
+    Args:
+        user_ids: User id of each user row
+        item_ids: Product id of each item row
+        user_factors: (users, rank + 1) vectors, last column the user bias
+        item_factors: (items, rank + 1) vectors, last column the item bias
+        mean: Mean training rating
+        rated: CSR users x items matrix of the training ratings
+    """
+
+    def __init__(self, user_ids, item_ids, user_factors, item_factors, mean, rated):
+        self.user_ids = list(user_ids)
+        self.item_ids = list(item_ids)
+        self.users = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self._items = pd.Index(self.item_ids)
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.mean = mean
+        self.rated = rated
+        self.trained_at = time.time()
+        self.training_seconds = None
+
+    @property
+    def rank(self):
+        return self.user_factors.shape[1] - 1
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    @classmethod
+    def train(cls, matrix, user_ids, item_ids, rank=FACTOR_RANK, regularization=FACTOR_REGULARIZATION,
+              iterations=FACTOR_ITERATIONS, seed=0):
+        """
+        Fit factors to a ratings matrix
+
+        Args:
+            matrix: CSR users x items ratings, as RatingsStore.ratings_matrix() returns
+            user_ids: User id of each row
+            item_ids: Product id of each column
+            rank: Length of the user and item vectors
+            regularization: Ridge strength per rating
+            iterations: Alternating sweeps over users and items
+            seed: Seed of the starting vectors
+        """
+        start = time.perf_counter()
+        by_user = sparse.csr_matrix(matrix, dtype=np.float64)
+        by_user.sort_indices()
+        by_item = by_user.T.tocsr()
+        by_item.sort_indices()
+        user_of = np.repeat(np.arange(by_user.shape[0]), np.diff(by_user.indptr))
+        item_of = np.repeat(np.arange(by_item.shape[0]), np.diff(by_item.indptr))
+        mean = by_user.data.mean() if by_user.nnz else 0.0
+
+        rng = np.random.default_rng(seed)
+        users = np.zeros((by_user.shape[0], rank + 1))
+        items = np.zeros((by_item.shape[0], rank + 1))
+        if 0 < rank < min(by_user.shape):
+            # Start from a truncated SVD of the centred ratings; random vectors take
+            # several times the sweeps to get out of the all-zero neighbourhood
+            centred = by_user.copy()
+            centred.data -= mean
+            left, singular, right = svds(centred, k=rank, v0=rng.random(min(by_user.shape)))
+            users[:, :rank] = left * np.sqrt(singular)
+            items[:, :rank] = right.T * np.sqrt(singular)
+        else:
+            users[:, :rank] = rng.normal(scale=0.1, size=(len(users), rank))
+            items[:, :rank] = rng.normal(scale=0.1, size=(len(items), rank))
+        for _ in range(iterations):
+            # Users: fit [p_u, b_u] to r - mean - b_i on [q_i, 1]
+            design = np.hstack([items[:, :rank], np.ones((len(items), 1))])
+            targets = by_user.data - mean - items[by_user.indices, rank]
+            users = _solve(by_user, user_of, design, targets, users, regularization)
+            # Items: fit [q_i, b_i] to r - mean - b_u on [p_u, 1]
+            design = np.hstack([users[:, :rank], np.ones((len(users), 1))])
+            targets = by_item.data - mean - users[by_item.indices, rank]
+            items = _solve(by_item, item_of, design, targets, items, regularization)
+
+        model = cls(user_ids, item_ids, users, items, mean, by_user)
+        model.training_seconds = time.perf_counter() - start
+        return model
+
+    def predict(self, user_ids, product_ids):
+        """Predicted ratings for (user_ids[i], product_ids[i]) pairs; unknown ids get the mean for that side"""
+        rows = np.array([self.users.get(user_id, -1) for user_id in user_ids], dtype=np.int64)
+        cols = self._items.get_indexer(product_ids)
+        known_user, known_item = rows >= 0, cols >= 0
+        users = self.user_factors[np.where(known_user, rows, 0)] * known_user[:, None]
+        items = self.item_factors[np.where(known_item, cols, 0)] * known_item[:, None]
+        rank = self.rank
+        return (
+            self.mean + users[:, rank] + items[:, rank]
+            + np.einsum('ij,ij->i', users[:, :rank], items[:, :rank])
+        )
+
+    def recommend(self, user_id, n=12, candidates=None, exclude=()):
+        """
+        A user's highest predicted ratings among items they have not rated
+
+        Args:
+            user_id: User to recommend for
+            n: Number of items
+            candidates: Product ids to choose from (default all trained items)
+            exclude: Further product ids to leave out, e.g. rated since training
+
+        Returns:
+            [(product_id, predicted rating), ...] best first, or None if the
+            user was not in the training ratings
+        """
+        row = self.users.get(user_id)
+        if row is None:
+            return None
+        rank = self.rank
+        vector = self.user_factors[row]
+        scores = self.item_factors[:, :rank] @ vector[:rank] + self.item_factors[:, rank]
+        scores += self.mean + vector[rank]
+        start, end = self.rated.indptr[row:row + 2]
+        scores[self.rated.indices[start:end]] = -np.inf
+        if len(exclude):
+            excluded = self._items.get_indexer(list(exclude))
+            scores[excluded[excluded >= 0]] = -np.inf
+        if candidates is not None:
+            cols = np.unique(self._items.get_indexer(candidates))
+            cols = cols[cols >= 0]
+            picked = cols[top_k(scores[cols], n)]
+        else:
+            picked = top_k(scores, n)
+        return [(self.item_ids[col], float(scores[col])) for col in picked if np.isfinite(scores[col])]
+
+    def status(self):
+        return {
+            "users": len(self.user_ids),
+            "items": len(self.item_ids),
+            "ratings": self.rated.nnz,
+            "rank": self.rank,
+            "training_seconds": round(self.training_seconds, 2) if self.training_seconds is not None else None,
+            "trained_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.trained_at)),
+        }
+
+
+class FactorTrainer:
+    """
+    Keeps a FactorModel trained on a RatingsStore
+
+    The first model is trained on a daemon thread at startup; current() is
+    None until it is ready. After that the thread retrains once
+    `retrain_after` ratings have been written, waiting `delay` seconds (or
+    as long as the last training took, if longer) for a burst of writes to
+    settle, and swaps the new model in by replacing one reference, so a
+    request sees either the old model or the new one.
+
+    Args:
+        store: RatingsStore to train from
+        retrain_after: New ratings that trigger a retraining
+        delay: Seconds to wait for further ratings before retraining
+    """
+
+    def __init__(self, store, retrain_after=FACTOR_RETRAIN_AFTER, delay=FACTOR_RETRAIN_DELAY):
+        self.store = store
+        self.retrain_after = retrain_after
+        self.delay = delay
+        self.trainings = 0
+        self._model = None
+        self._written = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        store.add_listener(self.schedule)
+        self._thread = threading.Thread(target=self._run, name="factor-trainer", daemon=True)
+        self._thread.start()
+
+    def schedule(self, rows):
+        with self._cond:
+            self._written += len(rows)
+            if self._written >= self.retrain_after:
+                self._cond.notify()
+
+    def _train(self):
+        with self._cond:
+            # Ratings written from here on count towards the next retraining
+            self._written = 0
+        matrix, user_ids, item_ids = self.store.ratings_matrix()
+        if not matrix.nnz:
+            return
+        model = FactorModel.train(matrix, user_ids, item_ids)
+        self._model = model
+        self.trainings += 1
+        print(f"Trained factor model in {model.training_seconds:.1f}s: {model.status()}")
+
+    def _wait(self):
+        """Block until a retraining is due; False once closed"""
+        with self._cond:
+            while self._written < self.retrain_after and not self._closed:
+                self._cond.wait()
+            # Let a burst of ratings settle, and spend at most half the time training
+            model = self._model
+            pause = max(self.delay, model.training_seconds if model is not None else 0)
+            deadline = time.monotonic() + pause
+            while not self._closed and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return not self._closed
+
+    def _run(self):
+        while True:
+            try:
+                self._train()
+            except Exception as e:
+                print(f"Error training factor model: {str(e)}")
+            if not self._wait():
+                return
+
+    def current(self):
+        return self._model
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+
+    def status(self):
+        model = self._model
+        return {
+            "model": model.status() if model is not None else None,
+            "trainings": self.trainings,
+            "ratings_since_training": self._written,
+        }
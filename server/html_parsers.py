@@ -0,0 +1,420 @@
+import os
+from urllib.parse import urljoin
+from product_record import ScrapedProduct
+
+AMAZON_BASE_URL = "https://www.amazon.in"
+FLIPKART_BASE_URL = "https://www.flipkart.com"
+
+# Selectors shared with the Selenium scrapers in optimized_scraper.py
+AMAZON_RESULT = "[data-component-type='s-search-result']"
+AMAZON_NAME = "h2.a-size-base-plus.a-spacing-none.a-color-base.a-text-normal, h2.a-size-medium.a-spacing-none.a-color-base.a-text-normal"
+AMAZON_PRICE = "span.a-price-whole"
+AMAZON_RATING = "i.a-icon.a-icon-star-small span.a-icon-alt"
+AMAZON_THUMBNAIL = "img.s-image"
+AMAZON_BRAND = "span.a-size-base-plus.a-color-base"
+AMAZON_RATINGS_COUNT = "span.a-size-base.s-underline-text"
+AMAZON_LINK = "a.a-link-normal.s-line-clamp-2.s-link-style.a-text-normal"
+AMAZON_DETAIL = "div[id='centerCol']"
+AMAZON_DETAIL_RATING = "i.a-icon.a-icon-star span"
+AMAZON_DETAIL_RATINGS_COUNT = "span[id='acrCustomerReviewText']"
+
+FLIPKART_RESULT = "div[data-id]"
+FLIPKART_NAME = "a.wjcEIp, a.WKTcLC, div.KzDlHZ"
+FLIPKART_PRICE = "div.Nx9bqj._4b5DiR, div.Nx9bqj"
+FLIPKART_RATING = "div.XQDdHH"
+FLIPKART_RATINGS_COUNT = "span.Wphh3N"
+FLIPKART_BRAND = "div.syl9yP"
+FLIPKART_LINK = "a.WKTcLC.BwBZTg, a.WKTcLC"
+FLIPKART_THUMBNAIL = "img.DByuf4, img._53J4C-"
+FLIPKART_DETAIL = "div.C7fEHH"
+FLIPKART_DETAIL_RATINGS_COUNT = "span.Wphh3N span"
+
+
+AMAZON_SELECTORS = {
+    "result": AMAZON_RESULT,
+    "name": AMAZON_NAME,
+    "price": AMAZON_PRICE,
+    "rating": AMAZON_RATING,
+    "thumbnail": AMAZON_THUMBNAIL,
+    "brand": AMAZON_BRAND,
+    "ratings": AMAZON_RATINGS_COUNT,
+    "link": AMAZON_LINK,
+}
+
+FLIPKART_SELECTORS = {
+    "result": FLIPKART_RESULT,
+    "name": FLIPKART_NAME,
+    "price": FLIPKART_PRICE,
+    "rating": FLIPKART_RATING,
+    "ratings": FLIPKART_RATINGS_COUNT,
+    "brand": FLIPKART_BRAND,
+    "link": FLIPKART_LINK,
+    "thumbnail": FLIPKART_THUMBNAIL,
+}
+
+
+class Bs4Backend:
+    """BeautifulSoup tree (lxml tree builder when installed)"""
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        try:
+            import lxml  # noqa: F401
+            self.features = "lxml"
+        except ImportError:
+            self.features = "html.parser"
+        self._soup = BeautifulSoup
+
+    def parse(self, html):
+        return self._soup(html, self.features)
+
+    def select(self, node, css):
+        return node.select(css)
+
+    def select_one(self, node, css):
+        return node.select_one(css)
+
+    def text(self, node):
+        return node.get_text(" ", strip=True)
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def tag(self, node):
+        return node.name
+
+
+class LxmlBackend:
+    """lxml.html with selectors compiled once through cssselect"""
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        from lxml.cssselect import CSSSelector
+        self._fromstring = lxml.html.fromstring
+        # Without this lxml guesses latin-1 for bytes lacking a <meta charset>
+        self._utf8_parser = lxml.html.HTMLParser(encoding="utf-8")
+        self._compile = CSSSelector
+        self._compiled = {}
+
+    def _selector(self, css):
+        selector = self._compiled.get(css)
+        if selector is None:
+            selector = self._compiled[css] = self._compile(css)
+        return selector
+
+    def parse(self, html):
+        if isinstance(html, bytes):
+            return self._fromstring(html, parser=self._utf8_parser)
+        return self._fromstring(html)
+
+    def select(self, node, css):
+        return self._selector(css)(node)
+
+    def select_one(self, node, css):
+        found = self._selector(css)(node)
+        return found[0] if found else None
+
+    def text(self, node):
+        return node.text_content()
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def tag(self, node):
+        return node.tag
+
+
+class SelectolaxBackend:
+    """selectolax (Lexbor) - fastest, optional dependency"""
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self._parser(html)
+
+    def select(self, node, css):
+        return node.css(css)
+
+    def select_one(self, node, css):
+        return node.css_first(css)
+
+    def text(self, node):
+        return node.text(separator=" ", strip=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+    def tag(self, node):
+        return node.tag
+
+
+BACKENDS = {
+    "bs4": Bs4Backend,
+    "lxml": LxmlBackend,
+    "selectolax": SelectolaxBackend,
+}
+
+HTML_BACKEND = os.environ.get("BB_HTML_BACKEND", "bs4")
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """Shared parser backend instance; raises ImportError if its library is missing"""
+    name = name or HTML_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown HTML backend: {name}")
+        backend = _backends[name] = BACKENDS[name]()
+    return backend
+
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+class _Page:
+    """Selector helpers bound to one backend, counting hits for benchmarks"""
+
+    def __init__(self, backend, stats):
+        self.backend = backend
+        self.stats = stats
+
+    def one(self, node, css, key):
+        found = self.backend.select_one(node, css)
+        if self.stats is not None:
+            self.stats[f"{key}.lookups"] += 1
+            if found is not None:
+                self.stats[f"{key}.hits"] += 1
+        return found
+
+    def text(self, node, css, key):
+        found = self.one(node, css, key)
+        return self.backend.text(found) if found is not None else None
+
+    def attr(self, node, css, key, name, base_url=None):
+        found = self.one(node, css, key)
+        value = self.backend.attr(found, name) if found is not None else None
+        if not value:
+            return None
+        return urljoin(base_url, value) if base_url else value
+
+
+def selector_hit_rates(stats):
+    """{selector key: hits / lookups} from a stats Counter filled by the parsers"""
+    rates = {}
+    for name, lookups in stats.items():
+        if name.endswith(".lookups") and lookups:
+            key = name[:-len(".lookups")]
+            rates[key] = stats.get(f"{key}.hits", 0) / lookups
+    return rates
+
+
+def _clean(value):
+    """Collapse whitespace; empty strings count as missing"""
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def amazon_product_from_fields(fields):
+    """
+    Build an Amazon ScrapedProduct from raw extracted fields
+
+    Shared by the HTTP parser and the in-browser extraction script so both
+    paths apply the same defaults. `fields` maps the AMAZON_SELECTORS keys
+    to raw strings (or None when the element is missing); link and thumbnail
+    must already be absolute URLs.
+
+    Returns:
+        ScrapedProduct, or None if the item has no name
+    """
+    name = _clean(fields.get("name"))
+    if not name:
+        return None
+
+    price = _clean(fields.get("price"))
+    rating = _clean(fields.get("rating"))
+    ratings = _clean(fields.get("ratings"))
+
+    return ScrapedProduct(
+        name=name,
+        price=f"₹{price.rstrip('. ')}" if price else "",
+        rating=rating.split()[0] if rating else "Not Rated",
+        website='Amazon',
+        brand=_clean(fields.get("brand")) or "Unknown Brand",
+        ratings=ratings.split()[0] if ratings else "0",
+        link=fields.get("link") or "Not Available",
+        thumbnail=fields.get("thumbnail") or None
+    )
+
+
+def flipkart_product_from_fields(fields):
+    """
+    Build a Flipkart ScrapedProduct from raw extracted fields
+
+    Returns:
+        ScrapedProduct, or None if the item has no name
+    """
+    name = _clean(fields.get("name"))
+    if not name:
+        return None
+
+    ratings_text = _clean(fields.get("ratings"))
+
+    return ScrapedProduct(
+        name=name,
+        price=_clean(fields.get("price")) or "Not Available",
+        rating=_clean(fields.get("rating")) or "Not Rated",
+        # Extract just the number before "Ratings"
+        ratings=ratings_text.split('Ratings')[0].strip().replace(',', '') if ratings_text else "0",
+        brand=_clean(fields.get("brand")) or name.split()[0],
+        website="Flipkart",
+        link=fields.get("link") or "no link found",
+        thumbnail=fields.get("thumbnail") or ""
+    )
+
+
+def parse_amazon_search(html, backend=None, stats=None):
+    """
+    Parse an Amazon search results page
+
+    Args:
+        html: Page HTML (bytes or str)
+        backend: Backend name (defaults to BB_HTML_BACKEND)
+        stats: Optional Counter that collects selector lookups/hits
+
+    Returns:
+        List of ScrapedProducts, as returned by scrape_amazon_selenium
+        (brand is the raw brand label - query-based brand rules are applied
+        by the caller), or None if the page has no result containers
+        (captcha, block page or JS-only render).
+    """
+    backend = get_backend(backend)
+    page = _Page(backend, stats)
+    items = backend.select(backend.parse(html), AMAZON_RESULT)
+    if not items:
+        return None
+
+    products = []
+    for item in items:
+        product = amazon_product_from_fields({
+            "name": page.text(item, AMAZON_NAME, "amazon.name"),
+            "price": page.text(item, AMAZON_PRICE, "amazon.price"),
+            "rating": page.text(item, AMAZON_RATING, "amazon.rating"),
+            "thumbnail": page.attr(item, AMAZON_THUMBNAIL, "amazon.thumbnail", "src"),
+            "brand": page.text(item, AMAZON_BRAND, "amazon.brand"),
+            "ratings": page.text(item, AMAZON_RATINGS_COUNT, "amazon.ratings"),
+            "link": page.attr(item, AMAZON_LINK, "amazon.link", "href", AMAZON_BASE_URL),
+        })
+        if product is not None:
+            products.append(product)
+    return products
+
+
+def parse_flipkart_search(html, backend=None, stats=None):
+    """
+    Parse a Flipkart search results page
+
+    Returns:
+        List of ScrapedProducts, as returned by flipkart_scraper, or None
+        if the page has no result containers.
+    """
+    backend = get_backend(backend)
+    page = _Page(backend, stats)
+    elements = backend.select(backend.parse(html), FLIPKART_RESULT)
+    if not elements:
+        return None
+
+    products = []
+    for element in elements:
+        name_node = page.one(element, FLIPKART_NAME, "flipkart.name")
+        if name_node is None:
+            continue
+        if backend.tag(name_node) == "a":
+            name = backend.attr(name_node, "title")
+        else:
+            name = backend.text(name_node)
+
+        product = flipkart_product_from_fields({
+            "name": name,
+            "price": page.text(element, FLIPKART_PRICE, "flipkart.price"),
+            "rating": page.text(element, FLIPKART_RATING, "flipkart.rating"),
+            "ratings": page.text(element, FLIPKART_RATINGS_COUNT, "flipkart.ratings"),
+            "brand": page.text(element, FLIPKART_BRAND, "flipkart.brand"),
+            "link": page.attr(element, FLIPKART_LINK, "flipkart.link", "href", FLIPKART_BASE_URL),
+            "thumbnail": page.attr(element, FLIPKART_THUMBNAIL, "flipkart.thumbnail", "src"),
+        })
+        if product is not None:
+            products.append(product)
+    return products
+
+
+def parse_amazon_product(html, backend=None, stats=None):
+    """
+    Parse rating and ratings count from an Amazon product page
+
+    Returns:
+        Dict shaped like amazon_ratings() output, or None if the product
+        column is missing from the static HTML.
+    """
+    backend = get_backend(backend)
+    page = _Page(backend, stats)
+    root = backend.parse(html)
+    if page.one(root, AMAZON_DETAIL, "amazon_detail.container") is None:
+        return None
+
+    rating_text = _clean(page.text(root, AMAZON_DETAIL_RATING, "amazon_detail.rating"))
+    count_text = _clean(page.text(root, AMAZON_DETAIL_RATINGS_COUNT, "amazon_detail.ratings"))
+    return {
+        "rating": rating_text.split()[0] if rating_text else "Not Rated",
+        "ratings_count": count_text.split()[0] if count_text else "No ratings",
+        "status": "success"
+    }
+
+
+def parse_flipkart_product(html, backend=None, stats=None):
+    """
+    Parse rating and ratings count from a Flipkart product page
+
+    Returns:
+        Dict shaped like flipkart_rating() output, or None if the rating
+        block is missing from the static HTML.
+    """
+    backend = get_backend(backend)
+    page = _Page(backend, stats)
+    items = backend.select(backend.parse(html), FLIPKART_DETAIL)
+    if not items:
+        return None
+
+    # Same as the Selenium loop: the last rating block wins
+    item = items[-1]
+    count_text = _clean(page.text(item, FLIPKART_DETAIL_RATINGS_COUNT, "flipkart_detail.ratings"))
+    return {
+        "rating": _clean(page.text(item, FLIPKART_RATING, "flipkart_detail.rating")) or "Not Rated",
+        "ratings_count": count_text.split()[0] if count_text else "No ratings",
+        "status": "success"
+    }
+
+
+# Page kinds in a saved corpus, keyed by file-name prefix
+PARSERS = {
+    "amazon_search": parse_amazon_search,
+    "flipkart_search": parse_flipkart_search,
+    "amazon_product": parse_amazon_product,
+    "flipkart_product": parse_flipkart_product,
+}
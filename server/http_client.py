@@ -0,0 +1,79 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from site_scheduler import get_scheduler, site_for_url
+
+HTTP_TIMEOUT = float(os.environ.get("BB_HTTP_TIMEOUT", "8"))
+HTTP_POOL_SIZE = int(os.environ.get("BB_HTTP_POOL_SIZE", "10"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-IN,en;q=0.9",
+}
+
+BLOCK_STATUS_CODES = (403, 429, 503)
+BLOCK_MARKERS = (
+    b"validatecaptcha",
+    b"type the characters you see in this image",
+    b"are you a human",
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests.Session with keep-alive connection pooling and retries"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            retry = Retry(total=2, backoff_factor=0.3,
+                          status_forcelist=(500, 502, 504),
+                          allowed_methods=("GET",))
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                  pool_maxsize=HTTP_POOL_SIZE,
+                                  max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def looks_blocked(status_code, html):
+    """Rate-limit statuses and captcha/robot-check interstitials"""
+    if status_code in BLOCK_STATUS_CODES:
+        return True
+    head = html[:20000].lower()
+    return any(marker in head for marker in BLOCK_MARKERS)
+
+
+def fetch_html(url, timeout=HTTP_TIMEOUT):
+    """
+    GET a page and return its HTML, or None on any network/HTTP error
+
+    Requests go through the per-site scheduler, which is told about
+    timeouts and block pages so it can back off. Callers treat None the
+    same as a page without result containers and fall back to the browser.
+    """
+    try:
+        with get_scheduler().request(site_for_url(url)) as slot:
+            response = get_session().get(url, timeout=timeout)
+            if looks_blocked(response.status_code, response.content):
+                slot.blocked()
+                print(f"Blocked (HTTP {response.status_code}) for {url}")
+                return None
+            if response.status_code != 200:
+                slot.failed()
+                print(f"HTTP {response.status_code} for {url}")
+                return None
+            return response.content
+    except (requests.RequestException, TimeoutError) as e:
+        # TimeoutError: no request slot or rate-limit token came free in time
+        print(f"HTTP fetch failed for {url}: {str(e)}")
+        return None
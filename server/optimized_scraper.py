@@ -1,273 +1,256 @@
-import csv
-import random
-import time
-import re
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
+import os
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from datetime import datetime
-# Setup WebDriver
-def setup_driver(headless=False):
-    options = webdriver.EdgeOptions()
-    options.use_chromium = True
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    if headless:
-        options.add_argument("--headless")
-    return webdriver.Edge(options=options)
-
-# Scrape Amazon using Selenium
-def scrape_amazon_selenium(query, max_pages=1):
-    driver = setup_driver()
-    products = []
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
+from driver_pool import get_driver_pool
+from http_client import fetch_html
+from site_scheduler import get_scheduler
+from product_store import ProductStore
+from product_record import ScrapedProduct, product_id, display_id
+from product_matcher import match_products
+from html_parsers import (
+    parse_amazon_search, parse_flipkart_search, parse_amazon_product, parse_flipkart_product,
+    amazon_product_from_fields, flipkart_product_from_fields, AMAZON_SELECTORS, FLIPKART_SELECTORS
+)
 
-    # List of electronic-related keywords to identify electronic items
-    electronic_keywords = ['laptop', 'mobile', 'phone', 'tablet', 'smartphone', 'headphone', 
-                         'earphone', 'speaker', 'camera', 'watch', 'smartwatch', 'tv', 
-                         'television', 'monitor', 'printer', 'router', 'mouse', 'keyboard']
+# Fetch mode: "http" pulls pages with requests + BeautifulSoup and only falls
+# back to Selenium when the static HTML lacks the result containers;
+# "browser" always uses Selenium.
+SCRAPE_MODE = os.environ.get("BB_SCRAPE_MODE", "http")
 
-    try:
-        search_url = f"https://www.amazon.in/s?k={query.replace(' ', '+')}"
-        driver.get(search_url)
+# Merge near-identical titles from different sites into one display product
+PRODUCT_MATCHING = os.environ.get("BB_PRODUCT_MATCHING", "1") != "0"
+
+# Result pages fetched concurrently per search
+PAGE_CONCURRENCY = max(1, int(os.environ.get("BB_PAGE_CONCURRENCY", "3")))
+_page_executor = ThreadPoolExecutor(max_workers=PAGE_CONCURRENCY * 2, thread_name_prefix="page")
+
+# List of electronic-related keywords to identify electronic items
+ELECTRONIC_KEYWORDS = ['laptop', 'mobile', 'phone', 'tablet', 'smartphone', 'headphone', 
+                       'earphone', 'speaker', 'camera', 'watch', 'smartwatch', 'tv', 
+                       'television', 'monitor', 'printer', 'router', 'mouse', 'keyboard']
+
+# Runs in the page: collects every field of every result item and returns
+# them as one JSON array, so a page costs a single WebDriver round trip.
+# arguments[0] is a selector map from html_parsers; missing elements come
+# back as null and defaults are applied in Python.
+EXTRACT_ITEMS_JS = """
+const sel = arguments[0];
+const text = (el, s) => { const n = s && el.querySelector(s); return n ? n.textContent : null; };
+const prop = (el, s, p) => { const n = s && el.querySelector(s); return n ? n[p] || null : null; };
+return Array.from(document.querySelectorAll(sel.result)).map(item => {
+    const nameNode = item.querySelector(sel.name);
+    return {
+        name: nameNode ? (nameNode.tagName === 'A' ? nameNode.getAttribute('title') : nameNode.textContent) : null,
+        price: text(item, sel.price),
+        rating: text(item, sel.rating),
+        ratings: text(item, sel.ratings),
+        brand: text(item, sel.brand),
+        link: prop(item, sel.link, 'href'),
+        thumbnail: prop(item, sel.thumbnail, 'src')
+    };
+});
+"""
+
+def is_electronic_query(query):
+    return any(keyword in query.lower() for keyword in ELECTRONIC_KEYWORDS)
+
+def apply_amazon_brand_rules(products, query):
+    """For electronics Amazon's brand label is unreliable; use the first word of the name"""
+    if is_electronic_query(query):
+        for product in products:
+            product.set_brand(product.name.split()[0])
+    return products
+
+def load_page(driver, url, css, site, timeout=10):
+    """
+    Navigate and wait for `css` to appear, paced by the site scheduler
+
+    A page load that times out counts against the site; `css` not showing
+    up (usually an empty or last results page) is only a failed request.
+    """
+    with get_scheduler().request(site) as slot:
+        try:
+            driver.get(url)
+        except TimeoutException:
+            slot.timed_out()
+            raise
+        try:
+            WebDriverWait(driver, timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, css))
+            )
+        except TimeoutException:
+            slot.failed()
+            raise
 
-        for page in range(1, max_pages + 1):
+def amazon_search_url(query, page=1):
+    url = f"https://www.amazon.in/s?k={quote_plus(query)}"
+    return url if page == 1 else f"{url}&page={page}"
+
+def flipkart_search_url(query, page=1):
+    return f"https://www.flipkart.com/search?q={quote_plus(query)}&page={page}"
+
+# Fetch result pages [page, page + PAGE_CONCURRENCY) at a time across pooled
+# drivers / HTTP connections
+def scrape_pages(fetch_page, max_pages=1, label=""):
+    """
+    Scrape up to max_pages result pages concurrently
+
+    Args:
+        fetch_page: Callable taking a 1-based page number and returning a
+            list of ScrapedProducts (empty or None when the page has nothing)
+        max_pages: Number of pages to walk
+        label: Site name for log messages
+
+    Returns:
+        Products deduplicated in page order. Stops at the first page that
+        adds no new items; later pages of that batch are discarded.
+    """
+    products = []
+    seen = set()
+    page = 1
+
+    while page <= max_pages:
+        batch = list(range(page, min(page + PAGE_CONCURRENCY, max_pages + 1)))
+        if len(batch) == 1:
+            futures = [None]
+        else:
+            futures = [_page_executor.submit(fetch_page, p) for p in batch]
+
+        done = False
+        for p, future in zip(batch, futures):
+            if done:
+                future.cancel()
+                continue
             try:
-                # Wait for products to load with a more reliable selector
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "[data-component-type='s-search-result']"))
-                )
-                items = driver.find_elements(By.CSS_SELECTOR, "[data-component-type='s-search-result']")
-
-                for item in items:
-                    try:
-                        # Extract product details with better error handling
-                        try:
-                            name = item.find_element(By.CSS_SELECTOR, "h2.a-size-base-plus.a-spacing-none.a-color-base.a-text-normal, h2.a-size-medium.a-spacing-none.a-color-base.a-text-normal").text
-                            #print(name)
-                        except:
-                            print("Name not found")
-                            
-                        try:
-                            price = item.find_element(By.CSS_SELECTOR, "span.a-price-whole").text
-                            price = f"₹{price}"
-                            #print(price)
-                        except:
-                            price = ""
-                            
-                        if price == "":
-                            print("Price not found")
-                            
-                        try:
-                            rating = item.find_element(By.CSS_SELECTOR, "i.a-icon.a-icon-star-small span.a-icon-alt").get_attribute("innerHTML").split()[0]
-                            #print(rating)
-                        except Exception as e:
-                            rating = "Not Rated"
-                            print("Rating not found ", e)
-                            
-                        try:
-                            thumbnail = item.find_element(By.CSS_SELECTOR, "img.s-image").get_attribute("src")
-                            #print(thumbnail)
-                        except:
-                            thumbnail = None
-                            print("Thumbnail not found")
-
-                        try:
-                            brand = item.find_element(By.CSS_SELECTOR, "span.a-size-base-plus.a-color-base").text
-                            #print(brand)
-                        except:
-                            brand = "Unknown Brand"
-                            print("Brand not found")
-                            
-                        # Check if the product is an electronic item
-                        is_electronic = any(keyword in query.lower() for keyword in electronic_keywords)
-                        
-                        # Get brand based on product type
-                        if is_electronic:
-                            brand = name.split()[0]
-                        
-                        try:
-                            ratings = item.find_element(By.CSS_SELECTOR, "span.a-size-base.s-underline-text").text.split()[0]
-                        except:
-                            ratings = "0"
-                            print("Ratings not found")
-                        try:
-                            link = item.find_element(By.CSS_SELECTOR, "a.a-link-normal.s-line-clamp-2.s-link-style.a-text-normal").get_attribute('href')
-                            #print(link)
-                        except:
-                            link = "Not Available"
-                            print('Link not found')
-
-                        products.append({
-                            "name": name, 
-                            "price": price, 
-                            "rating": rating, 
-                            "website": 'Amazon', 
-                            "brand": brand, 
-                            "ratings": ratings,
-                            "link": link,
-                            "thumbnail": thumbnail
-                        })
-                        #print(products)
-                    except Exception as e:
-                        print(f"Error processing product: {str(e)}")
-                        continue
-
-                print(f"✅ Scraped Amazon page {page}...")
-
-                # Click "Next" button
-                try:
-                    next_button = driver.find_element(By.CSS_SELECTOR, "a.s-pagination-next")
-                    if next_button.is_enabled():
-                        next_button.click()
-                        time.sleep(2)
-                    else:
-                        print("No more pages available.")
-                        break
-                except:
-                    print("No more pages available.")
-                    break
+                page_products = fetch_page(p) if future is None else future.result()
             except Exception as e:
-                print(f"Error on Amazon page {page}: {e}")
-                break
+                print(f"Error scraping {label} page {p}: {str(e)}")
+                page_products = None
+
+            new_products = []
+            for product in page_products or []:
+                key = (product.name, product.price, product.website)
+                if key not in seen:
+                    seen.add(key)
+                    new_products.append(product)
+
+            if not new_products:
+                print(f"No new {label} items on page {p}, stopping.")
+                done = True
+                continue
 
-    finally:
-        driver.quit()
+            products.extend(new_products)
+            print(f"✅ Scraped {label} page {p}...")
+
+        if done:
+            break
+        page += len(batch)
 
     return products
 
-# Scrape Flipkart using Selenium
+# Scrape Amazon, HTTP first with Selenium fallback
+def scrape_amazon_selenium(query, max_pages=1):
+    return scrape_pages(lambda page: scrape_amazon_page(query, page), max_pages, "Amazon")
+
+def scrape_amazon_page(query, page=1):
+    products = None
+    if SCRAPE_MODE == "http":
+        products = scrape_amazon_page_http(query, page)
+        if products is None:
+            print(f"Amazon page {page} static HTML had no results, falling back to browser")
+    if products is None:
+        products = scrape_amazon_page_browser(query, page)
+    return apply_amazon_brand_rules(products, query)
+
+# Scrape one Amazon page with plain HTTP; None means the browser is needed
+def scrape_amazon_page_http(query, page=1):
+    html = fetch_html(amazon_search_url(query, page))
+    return parse_amazon_search(html) if html else None
+
+# Scrape one Amazon page using Selenium
+def scrape_amazon_page_browser(query, page=1):
+    products = []
+    with get_driver_pool().lease() as driver:
+        try:
+            # Wait for products to load with a more reliable selector
+            load_page(driver, amazon_search_url(query, page), AMAZON_SELECTORS["result"], "amazon")
+        except TimeoutException:
+            print(f"No Amazon results on page {page}.")
+            return products
+
+        # One round trip for every field of every item on the page
+        items = driver.execute_script(EXTRACT_ITEMS_JS, AMAZON_SELECTORS) or []
+
+    for fields in items:
+        product = amazon_product_from_fields(fields)
+        if product is None:
+            print("Name not found")
+            continue
+        products.append(product)
+    return products
+
+# Scrape Flipkart, HTTP first with Selenium fallback
 def flipkart_scraper(query, max_pages=1):
-    try:
-        
-        driver = setup_driver()
-        products = []
-        
-        for page in range(1, max_pages + 1):
-            try:
-                url = f"https://www.flipkart.com/search?q={query}&page={page}"
-                print(f"\n🔍 Scraping Flipkart page {page}...")
-                driver.get(url)
-                
-                # Wait for products to load with a more reliable selector
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-id]"))
-                )
-                
-                # Get product elements using a more reliable selector
-                product_elements = driver.find_elements(By.CSS_SELECTOR, "div[data-id]")
-                
-                if not product_elements:
-                    print("No products found on this page.")
-                    break
-                
-                for element in product_elements:
-                    try:
-                        # Extract product details with better error handling
-                        try:
-                            name_element = element.find_element(By.CSS_SELECTOR, "a.wjcEIp, a.WKTcLC, div.KzDlHZ")
-                            if name_element.tag_name == "a":
-                                name = name_element.get_attribute("title")
-                            else:
-                                name = name_element.text
-                        except:
-                            continue
-                            
-                        try:
-                            price = element.find_element(By.CSS_SELECTOR, "div.Nx9bqj._4b5DiR, div.Nx9bqj").text
-                        except:
-                            price = "Not Available"
-                            
-                        # Handle rating with better error handling
-                        try:
-                            rating = element.find_element(By.CSS_SELECTOR, "div.XQDdHH").text
-                        except:
-                            rating = "Not Rated"
-                            
-                        # Handle ratings count with better error handling
-                        try:
-                            ratings_text = element.find_element(By.CSS_SELECTOR, "span.Wphh3N").text
-                            # Extract just the number before "Ratings"
-                            ratings_count = ratings_text.split('Ratings')[0].strip().replace(',', '')
-                        except:
-                            ratings_count = "0"
-                        
-                        try:
-                            brand = element.find_element(By.CSS_SELECTOR, "div.syl9yP").text
-                        except:
-                            brand = name.split()[0] if name else "Unknown Brand"
-                            print("Brand not found, using first word of name:", brand)
-                        
-                        try:
-                            link = element.find_element(By.CSS_SELECTOR, "a.WKTcLC.BwBZTg, a.WKTcLC").get_attribute("href")
-                            #print(link)
-                        except:
-                            link = "no link found"
-                            #print(link)
-                        
-                        # Get thumbnail if available
-                        try:
-                            thumbnail = element.find_element(By.CSS_SELECTOR, "img.DByuf4, img._53J4C-").get_attribute("src")
-                        except:
-                            thumbnail = ""
-                        
-                        products.append({
-                            "name": name,
-                            "price": price,
-                            "rating": rating,
-                            "ratings": ratings_count,
-                            "brand": brand,
-                            "website": "Flipkart",
-                            "link": link,
-                            "thumbnail": thumbnail
-                        })
-                    except Exception as e:
-                        print(f"Error extracting product details: {str(e)}")
-                        continue
-                
-                print(f"✅ Scraped Flipkart page {page}...")
-                
-            except Exception as e:
-                print(f"Error scraping Flipkart page {page}: {str(e)}")
-                break
-        
-        driver.quit()
-        return products
-        
-    except Exception as e:
-        print(f"Error in flipkart_scraper: {str(e)}")
-        return []
+    return scrape_pages(lambda page: flipkart_page(query, page), max_pages, "Flipkart")
+
+def flipkart_page(query, page=1):
+    products = None
+    if SCRAPE_MODE == "http":
+        products = flipkart_page_http(query, page)
+        if products is None:
+            print(f"Flipkart page {page} static HTML had no results, falling back to browser")
+    if products is None:
+        products = flipkart_page_browser(query, page)
+    return products
+
+# Scrape one Flipkart page with plain HTTP; None means the browser is needed
+def flipkart_page_http(query, page=1):
+    html = fetch_html(flipkart_search_url(query, page))
+    return parse_flipkart_search(html) if html else None
 
-# Extract Flipkart ratings using requests
+# Scrape one Flipkart page using Selenium
+def flipkart_page_browser(query, page=1):
+    products = []
+    with get_driver_pool().lease() as driver:
+        try:
+            print(f"\n🔍 Scraping Flipkart page {page}...")
+            # Wait for products to load with a more reliable selector
+            load_page(driver, flipkart_search_url(query, page), FLIPKART_SELECTORS["result"], "flipkart")
+        except TimeoutException:
+            print(f"No Flipkart results on page {page}.")
+            return products
+
+        # One round trip for every field of every item on the page
+        items = driver.execute_script(EXTRACT_ITEMS_JS, FLIPKART_SELECTORS) or []
+
+    for fields in items:
+        product = flipkart_product_from_fields(fields)
+        if product is not None:
+            products.append(product)
+    return products
+
+# Extract Flipkart ratings using requests, Selenium as fallback
 def flipkart_rating(url):
-    driver = setup_driver()
+    if SCRAPE_MODE == "http":
+        html = fetch_html(url)
+        result = parse_flipkart_product(html) if html else None
+        if result is not None:
+            return result
+    return flipkart_rating_browser(url)
+
+# Extract Flipkart ratings using Selenium
+def flipkart_rating_browser(url):
     try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div.C7fEHH"))
-                )
-        items = driver.find_elements(By.CSS_SELECTOR, "div.C7fEHH")
-        
-        rating = 'No Rated'
-        ratings = 0
-        
-        for item in items:
-            try:
-                rating = item.find_element(By.CSS_SELECTOR, "div.XQDdHH").text
-                print('Rating: ',rating)
-            except Exception as e:
-                rating = "Not Rated"
-                print("Rating not found ", e)
-            try:
-                ratings = item.find_element(By.CSS_SELECTOR, "span.Wphh3N span").get_attribute("innerHTML").split()[0]
-                print('Ratings: ',ratings)
-            except Exception as e:
-                ratings = "No ratings"
-                print("Ratings not found ", e)
-        return {
-            "rating": rating, "ratings_count": ratings, "status": "success"
+        with get_driver_pool().lease() as driver:
+            load_page(driver, url, "div.C7fEHH", "flipkart")
+            # One round trip; extraction happens in the HTML parser
+            html = driver.page_source
+        return parse_flipkart_product(html) or {
+            "rating": "Not Rated", "ratings_count": "No ratings", "status": "success"
         }
     except Exception as e:
         print('An error occured cause u suck: ',e)
@@ -277,326 +260,115 @@ def flipkart_rating(url):
             "status": "error",
             "message": str(e)
         }
-    finally:
-        driver.quit()
 
-# Remove duplicate products based on name and price
-def merge_products(products):
+def merge_products_for_display(products, match=None):
     """
-    Merge duplicate products from different sources while preserving all variants
-    
-    Args:
-        products: List of product dictionaries with fields:
-            - id
-            - name
-            - brand
-            - price_display
-            - best_price
-            - avg_rating
-            - thumbnail
-            - available_on
-            - variants
-    
-    Returns:
-        List of merged product dictionaries
-    """
-    merged = {}
-    
-    for product in products:
-        # Create a unique key based on name and brand
-        key = (product['name'].lower().strip(), 
-               product['brand'].lower().strip())
-        
-        if key in merged:
-            # Existing product found - merge the variants
-            existing = merged[key]
-            
-            # Update price_display to show the best price
-            if product['price_display'] != "Not Available" and existing['price_display'] != "Not Available":
-                try:
-                    current_price = float(product['price_display'].replace('₹', '').replace(',', ''))
-                    existing_price = float(existing['price_display'].replace('₹', '').replace(',', ''))
-                    
-                    if current_price < existing_price:
-                        existing['price_display'] = product['price_display']
-                        existing['best_price'] = min(existing.get('best_price', float('inf')), current_price)
-                except ValueError:
-                    pass
-            
-            # Update best_price if current product has a better price
-            if 'best_price' in product and isinstance(product['best_price'], (int, float)):
-                existing_best = existing.get('best_price', float('inf'))
-                if product['best_price'] < existing_best:
-                    existing['best_price'] = product['best_price']
-            
-            # Keep the higher rating if available
-            if product['avg_rating'] != "Not Rated":
-                if existing['avg_rating'] == "Not Rated" or float(product['avg_rating']) > float(existing['avg_rating']):
-                    existing['avg_rating'] = product['avg_rating']
-            
-            # Keep the thumbnail if current doesn't have one
-            if not existing['thumbnail'] and product['thumbnail']:
-                existing['thumbnail'] = product['thumbnail']
-            
-            # Merge available_on lists
-            if isinstance(product.get('available_on'), list):
-                existing['available_on'] = list(set(existing.get('available_on', []) + product['available_on']))
-            
-            # Merge variants while avoiding duplicates
-            if isinstance(product.get('variants'), list):
-                existing_variants = existing.get('variants', [])
-                new_variants = []
-                
-                # Create a set of existing variant keys (website+price)
-                existing_keys = {(v.get('website'), v.get('price_display')) for v in existing_variants}
-                
-                for variant in product['variants']:
-                    variant_key = (variant.get('website'), variant.get('price_display'))
-                    if variant_key not in existing_keys:
-                        new_variants.append(variant)
-                
-                existing['variants'].extend(new_variants)
-        else:
-            # New product, add to dictionary
-            merged[key] = product.copy()
-            
-            # Ensure variants is a list
-            if not isinstance(merged[key].get('variants'), list):
-                merged[key]['variants'] = []
-            
-            # Ensure available_on is a list
-            if not isinstance(merged[key].get('available_on'), list):
-                if 'website' in merged[key]:
-                    merged[key]['available_on'] = [merged[key]['website']]
-                else:
-                    merged[key]['available_on'] = []
-    
-    # Convert the merged dictionary back to a list
-    final_products = list(merged.values())
-    
-    # Post-processing to ensure consistent fields
-    for product in final_products:
-        # Set default best_price if not set
-        if 'best_price' not in product or not isinstance(product['best_price'], (int, float)):
-            try:
-                if product['price_display'] != "Not Available":
-                    product['best_price'] = float(product['price_display'].replace('₹', '').replace(',', ''))
-                else:
-                    product['best_price'] = float('inf')
-            except:
-                product['best_price'] = float('inf')
-        
-        # Ensure variants have all required fields
-        for variant in product.get('variants', []):
-            if 'website' not in variant:
-                variant['website'] = product.get('website', 'Unknown')
-            if 'price_display' not in variant:
-                variant['price_display'] = product.get('price_display', 'Not Available')
-    
-    return final_products
-
-# Save products to CSV
-def save_to_csv(products, filename="amazon_flipkart_products.csv"):
-    # Prepare the fieldnames for the CSV
-    fieldnames = [
-        'id', 'name', 'brand', 'price_display', 'best_price', 
-        'avg_rating', 'thumbnail', 'available_on', 'variants',
-        'last_updated'
-    ]
-
-    products = merge_products(products)
-    
-    # Convert the products to a CSV-friendly format
-    rows = []
-    for product in products:
-        row = {
-            'id': product.get('id', ''),
-            'name': product.get('name', ''),
-            'brand': product.get('brand', ''),
-            'price_display': product.get('price_display', ''),
-            'best_price': product.get('best_price', ''),
-            'avg_rating': product.get('avg_rating', ''),
-            'thumbnail': product.get('thumbnail', ''),
-            'available_on': '|'.join(product.get('available_on', []) if isinstance(product.get('available_on', []), list) else product.get('available_on', '')),
-            'variants': str(product.get('variants', [])),
-            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        rows.append(row)
-    
-    # Remove duplicates before writing
-    rows = remove_duplicates(rows, filename)
-    
-    # Write to CSV
-    with open(filename, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        if file.tell() == 0:  # Write header only if file is empty
-            writer.writeheader()
-        writer.writerows(rows)
+    Group ScrapedProducts from all sites into one display product per name/brand
 
-    print(f"\n✅ Data saved to '{filename}' with {len(rows)} products (after deduplication).")
-
-def remove_duplicates(new_rows, filename):
-    """Remove exact duplicates from new rows and existing CSV data"""
-    try:
-        # Load existing data if file exists
-        existing_rows = []
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                existing_rows = list(reader)
-        
-        # Combine existing and new rows
-        all_rows = existing_rows + new_rows
-        
-        # Create a set of unique row tuples (excluding last_updated)
-        seen = set()
-        deduplicated = []
-        
-        for row in all_rows:
-            # Create a tuple of all values except last_updated for comparison
-            row_key = tuple(str(row[field]) for field in row.keys() 
-                          if field != 'last_updated')
-            
-            if row_key not in seen:
-                seen.add(row_key)
-                # Keep the most recent version (with updated timestamp)
-                deduplicated.append(row)
-        
-        # Return only the new rows that weren't duplicates
-        return [row for row in new_rows 
-               if tuple(str(row[field]) for field in row.keys() 
-                       if field != 'last_updated') in seen]
-    
-    except Exception as e:
-        print(f"Error during deduplication: {str(e)}")
-        return new_rows  # Return original if error occurs
-
-def merge_products_for_display(products):
-    # First group products by normalized name and brand
+    Plain product dicts are accepted too and converted first. Unless
+    `match` is False (default: BB_PRODUCT_MATCHING), groups whose titles
+    the cross-site matcher pairs up are merged as well, so the same item
+    listed differently on Amazon and Flipkart shows up once.
+    """
+    # Group by the normalized name/brand key computed at scrape time. Each
+    # group is [first item, variants, websites, min price, max price,
+    # rating sum, rating count, thumbnail]
     product_groups = {}
     
     for product in products:
-        # Create a normalized key (adjust as needed for your matching requirements)
-        normalized_name = product['name'].lower().strip()
-        normalized_brand = product['brand'].lower().strip()
-        group_key = f"{normalized_name}-{normalized_brand}"
-        
-        if group_key not in product_groups:
-            product_groups[group_key] = {
-                'name': product['name'],
-                'brand': product['brand'],
-                'variants': [],  # Will store all price variants
-                'best_price': None,
-                'all_prices': [],
-                'websites': set(),
-                'ratings': [],
-                'thumbnails': [],
-            }
+        if not isinstance(product, ScrapedProduct):
+            product = ScrapedProduct.from_dict(product)
+        group = product_groups.get(product.key)
+        if group is None:
+            group = product_groups[product.key] = [product, [], set(), None, None, 0.0, 0, None]
         
         # Add this product as a variant
-        variant = {
-            'price': product['price'],
-            'website': product['website'],
-            'rating': product['rating'],
-            'ratings_count': product['ratings'],
-            'link': product['link'],
-            'thumbnail': product['thumbnail']
-        }
-        
-        product_groups[group_key]['variants'].append(variant)
-        
-        # Track all prices for this product
-        if product['price'] != "Not Available":
-            try:
-                price_num = float(product['price'].replace('₹', '').replace(',', ''))
-                product_groups[group_key]['all_prices'].append(price_num)
-                
-                # Update best price if this is lower
-                if (product_groups[group_key]['best_price'] is None or 
-                    price_num < product_groups[group_key]['best_price']):
-                    product_groups[group_key]['best_price'] = price_num
-            except ValueError:
-                pass
+        group[1].append(product.variant())
+        group[2].add(product.website)
         
-        # Track all websites
-        product_groups[group_key]['websites'].add(product['website'])
+        # Track the price range; best_price is the lowest
+        price = product.price_value
+        if price is not None:
+            if group[3] is None or price < group[3]:
+                group[3] = price
+            if group[4] is None or price > group[4]:
+                group[4] = price
         
         # Track ratings if available
-        if product['rating'] != "Not Rated":
-            try:
-                rating = float(product['rating'])
-                product_groups[group_key]['ratings'].append(rating)
-            except ValueError:
-                pass
+        if product.rating_value is not None:
+            group[5] += product.rating_value
+            group[6] += 1
         
-        # Track thumbnails
-        if product['thumbnail']:
-            product_groups[group_key]['thumbnails'].append(product['thumbnail'])
+        # Keep the first available thumbnail
+        if group[7] is None and product.thumbnail:
+            group[7] = product.thumbnail
+    
+    groups = list(product_groups.values())
+    if (PRODUCT_MATCHING if match is None else match) and len(groups) > 1:
+        groups = combine_matched_groups(groups)
     
     # Prepare final products array with grouped data
     final_products = []
     
-    for group in product_groups.values():
-        # Calculate average rating if available
-        avg_rating = "Not Rated"
-        if group['ratings']:
-            avg_rating = round(sum(group['ratings']) / len(group['ratings']), 1)
-        
-        # Select best thumbnail (first available)
-        best_thumbnail = group['thumbnails'][0] if group['thumbnails'] else None
-        
-        # Format price range if multiple prices
-        price_display = f"₹{group['best_price']:,.0f}" if group['best_price'] else "Not Available"
-        if len(group['all_prices']) > 1:
-            min_price = min(group['all_prices'])
-            max_price = max(group['all_prices'])
-            if min_price != max_price:
-                price_display = f"₹{min_price:,.0f} - ₹{max_price:,.0f}"
+    for first, variants, websites, min_price, max_price, rating_sum, rating_count, thumbnail in groups:
+        # Format price range if the sites disagree
+        if min_price is not None and min_price != max_price:
+            price_display = f"₹{min_price:,.0f} - ₹{max_price:,.0f}"
+        else:
+            price_display = f"₹{min_price:,.0f}" if min_price else "Not Available"
         
         # Create the product entry
-        final_product = {
-            'id': f"{group['name'][:10]}-{group['brand']}".lower().replace(' ', '-'),
-            'name': group['name'],
-            'brand': group['brand'],
+        final_products.append({
+            'id': product_id(first.name, first.brand),
+            'display_id': display_id(first.name, first.brand),
+            'name': first.name,
+            'brand': first.brand,
             'price_display': price_display,
-            'best_price': group['best_price'],
-            'avg_rating': avg_rating,
-            'thumbnail': best_thumbnail,
-            'available_on': list(group['websites']),
-            'variants': group['variants']  # All price variants for this product
-        }
-        
-        final_products.append(final_product)
+            'best_price': min_price,
+            'avg_rating': round(rating_sum / rating_count, 1) if rating_count else "Not Rated",
+            'thumbnail': thumbnail,
+            'available_on': list(websites),
+            'variants': variants  # All price variants for this product
+        })
     
     return final_products
 
+def combine_matched_groups(groups):
+    """Fold display groups the cross-site matcher pairs up into the first group of each cluster"""
+    clusters = match_products([(group[0].name, group[0].brand, group[2]) for group in groups])
+    combined = []
+    for members in clusters:
+        group = groups[members[0]]
+        for other in (groups[i] for i in members[1:]):
+            group[1].extend(other[1])
+            group[2] |= other[2]
+            if other[3] is not None and (group[3] is None or other[3] < group[3]):
+                group[3] = other[3]
+            if other[4] is not None and (group[4] is None or other[4] > group[4]):
+                group[4] = other[4]
+            group[5] += other[5]
+            group[6] += other[6]
+            if group[7] is None:
+                group[7] = other[7]
+        combined.append(group)
+    return combined
+
 def amazon_ratings(link):
-    driver = setup_driver()
+    if SCRAPE_MODE == "http":
+        html = fetch_html(link)
+        result = parse_amazon_product(html) if html else None
+        if result is not None:
+            return result
+    return amazon_ratings_browser(link)
+
+def amazon_ratings_browser(link):
     try:
-        driver.get(link)
-        WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[id='centerCol']"))
-                )
-        
-        rating = "Not Rated"
-        ratings_count = "0"
-        
-        try:
-            rating = driver.find_element(By.CSS_SELECTOR, "i.a-icon.a-icon-star span").get_attribute("innerHTML").split()[0]
-            #print('Rating: ',rating)
-        except Exception as e:
-            rating = "Not Rated"
-            print("Rating not found ", e)
-        try:
-            ratings_count = driver.find_element(By.CSS_SELECTOR, "span[id='acrCustomerReviewText']").get_attribute("innerHTML").split()[0]
-            #print('Ratings: ',ratings)
-        except Exception as e:
-            ratings_count = "No ratings"
-            print("Ratings not found ", e)
-        return {
-            "rating": rating,
-            "ratings_count": ratings_count,
-            "status": "success"
+        with get_driver_pool().lease() as driver:
+            load_page(driver, link, "div[id='centerCol']", "amazon")
+            # One round trip; extraction happens in the HTML parser
+            html = driver.page_source
+        return parse_amazon_product(html) or {
+            "rating": "Not Rated", "ratings_count": "No ratings", "status": "success"
         }
     except Exception as e:
         print('An error occured cause u suck: ',e)
@@ -606,8 +378,6 @@ def amazon_ratings(link):
             "status": "error",
             "message": str(e)
         }
-    finally:
-        driver.quit()
 
 
 # Main Execution
@@ -628,8 +398,8 @@ if __name__ == "__main__":
         # For display purposes
         display_products = merge_products_for_display(results)
         
-        # For CSV export (use raw data)
-        save_to_csv(display_products, filename=query)  # Pass the raw results instead of display_products
+        # Save to the product catalog
+        ProductStore().save_products(display_products)
         
         print(f"\nFound {len(results)} raw products")
         print(f"After grouping: {len(display_products)} product groups")
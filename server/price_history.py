@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from product_store import ROW_COLUMNS, _to_float
+
+PRICE_HISTORY_DB_PATH = os.environ.get("BB_PRICE_HISTORY_DB", "price_history.db")
+
+# Clustered on (product_id, website, observed_at): one product's history is
+# a contiguous range of the primary key, so a lookup never touches other
+# products. The observed_at index bounds "this week" queries to recent rows.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_history (
+    product_id    TEXT    NOT NULL,
+    website       TEXT    NOT NULL,
+    observed_at   INTEGER NOT NULL,
+    price         REAL,
+    rating        REAL,
+    ratings_count INTEGER,
+    PRIMARY KEY (product_id, website, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_price_history_observed_at ON price_history(observed_at);
+"""
+
+INSERT_SQL = """
+INSERT OR REPLACE INTO price_history (product_id, website, observed_at, price, rating, ratings_count)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Latest observation per series (SQLite returns the bare columns of the MAX row)
+LATEST_SQL = """
+SELECT product_id, website, price, rating, ratings_count, MAX(observed_at)
+FROM price_history GROUP BY product_id, website
+"""
+
+# Full series of every product with a change since :since; the subquery
+# uses the observed_at index and the outer read is a primary-key range per
+# product, so older, untouched products are never read
+WINDOW_SERIES_SQL = """
+SELECT product_id, website, observed_at, price FROM price_history
+WHERE product_id IN (SELECT product_id FROM price_history WHERE observed_at >= :since)
+ORDER BY product_id, website, observed_at
+"""
+
+
+def _to_int(value):
+    digits = re.sub(r"[^\d]", "", str(value or ""))
+    return int(digits) if digits else None
+
+
+def _epoch(last_updated):
+    try:
+        return int(datetime.strptime(last_updated, '%Y-%m-%d %H:%M:%S').timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def site_observations(variants):
+    """
+    Variant dicts -> {website: (price, rating, ratings_count)}
+
+    A product can list several offers on one site; the cheapest priced
+    offer stands for the site.
+    """
+    best = {}
+    for variant in variants:
+        if not isinstance(variant, dict):
+            continue
+        website = variant.get('website') or 'Unknown'
+        price = _to_float(variant.get('price', variant.get('price_display')))
+        current = best.get(website)
+        if current is None or (price is not None and (current[0] is None or price < current[0])):
+            best[website] = (price, _to_float(variant.get('rating')), _to_int(variant.get('ratings_count')))
+    return best
+
+
+class PriceHistory:
+    """
+    Per-site price/rating time series for every product
+
+    Fed by ProductStore saves (see record_rows). Only observations that
+    differ from the previous one for the same product and site are stored,
+    so each series is step-wise: the price at time t is the last
+    observation at or before t. The latest value of every series is kept
+    in memory to make that check without reading the log.
+
+    Args:
+        path: Database file (created on first use)
+    """
+
+    def __init__(self, path=PRICE_HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._latest = None
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _latest_index(self):
+        """(product_id, website) -> last stored (price, rating, ratings_count)"""
+        if self._latest is None:
+            self._latest = {
+                (row[0], row[1]): tuple(row[2:5])
+                for row in self._connection().execute(LATEST_SQL)
+            }
+        return self._latest
+
+    def record(self, product_id, variants, observed_at=None):
+        """Append one product's current per-site values; returns rows written"""
+        observed_at = int(observed_at if observed_at is not None else time.time())
+        return self._append([(product_id, variants, observed_at)])
+
+    def record_rows(self, rows):
+        """ProductStore listener: log the variants of freshly committed product rows"""
+        column = {name: i for i, name in enumerate(ROW_COLUMNS)}
+        entries = []
+        for row in rows:
+            text = row[column['variants']]
+            variants = json.loads(text) if text else []
+            entries.append((row[column['id']], variants, _epoch(row[column['last_updated']])))
+        return self._append(entries)
+
+    def _append(self, entries):
+        with self._write_lock:
+            latest = self._latest_index()
+            changed = []
+            for product_id, variants, observed_at in entries:
+                for website, values in site_observations(variants).items():
+                    if latest.get((product_id, website)) != values:
+                        changed.append((product_id, website, observed_at) + values)
+            if not changed:
+                return 0
+            conn = self._connection()
+            with conn:
+                conn.executemany(INSERT_SQL, changed)
+            for row in changed:
+                latest[(row[0], row[1])] = row[3:]
+        return len(changed)
+
+    def rename_products(self, renames):
+        """
+        Move series onto new product ids (ProductStore.id_renames())
+
+        Observations already stored under a new id win over moved ones at
+        the same time. The lookup is a primary-key range per old id, so a
+        log that was already moved is cheap to check again.
+        """
+        if not renames:
+            return 0
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS renames (old_id TEXT PRIMARY KEY, new_id TEXT)")
+                conn.execute("DELETE FROM temp.renames")
+                conn.executemany("INSERT INTO temp.renames VALUES (?, ?)", renames.items())
+                moved = conn.execute(
+                    "UPDATE OR IGNORE price_history SET product_id = "
+                    "(SELECT new_id FROM temp.renames WHERE old_id = product_id) "
+                    "WHERE product_id IN (SELECT old_id FROM temp.renames)"
+                ).rowcount
+                conn.execute("DELETE FROM price_history WHERE product_id IN (SELECT old_id FROM temp.renames)")
+            if moved:
+                self._latest = None
+                print(f"✅ Moved {moved} price observations onto new product ids in '{self.path}'.")
+        return moved
+
+    def history(self, product_id, since=None):
+        """Observations of one product, oldest first, optionally from `since` (epoch seconds)"""
+        rows = self._connection().execute(
+            "SELECT website, observed_at, price, rating, ratings_count FROM price_history "
+            "WHERE product_id = ? AND observed_at >= ? ORDER BY observed_at, website",
+            (product_id, int(since or 0))
+        ).fetchall()
+        return [
+            {
+                'website': website,
+                'observed_at': datetime.fromtimestamp(observed_at).strftime('%Y-%m-%d %H:%M:%S'),
+                'price': price,
+                'rating': rating,
+                'ratings_count': ratings_count,
+            }
+            for website, observed_at, price, rating, ratings_count in rows
+        ]
+
+    def price_drops(self, days=7, min_drop=0.1, limit=50):
+        """
+        Products whose best price fell by at least `min_drop` over the last `days`
+
+        A product's price at any moment is the lowest of its sites' prices,
+        each carried forward from that site's last change. An observation
+        without a price (out of stock, unavailable) takes the site out of
+        the minimum until it is priced again.
+        """
+        since = int(time.time() - days * 86400)
+        rows = self._connection().execute(WINDOW_SERIES_SQL, {"since": since})
+
+        # product_id -> {website: [start_price, current_price, last_at]};
+        # prices are None while the site has no price
+        windows = {}
+        for product_id, website, observed_at, price in rows:
+            series = windows.setdefault(product_id, {}).get(website)
+            if series is None:
+                windows[product_id][website] = [price, price, observed_at]
+            else:
+                if observed_at <= since:
+                    series[0] = price
+                series[1], series[2] = price, observed_at
+
+        drops = []
+        for product_id, sites in windows.items():
+            start_prices = [series[0] for series in sites.values() if series[0] is not None]
+            current_prices = [series[1] for series in sites.values() if series[1] is not None]
+            if not start_prices or not current_prices:
+                continue
+            start_price, current_price = min(start_prices), min(current_prices)
+            if start_price <= 0:
+                continue
+            drop = (start_price - current_price) / start_price
+            if drop >= min_drop:
+                last_at = max(series[2] for series in sites.values())
+                drops.append({
+                    'product_id': product_id,
+                    'start_price': start_price,
+                    'current_price': current_price,
+                    'drop_percent': round(drop * 100, 1),
+                    'last_seen': datetime.fromtimestamp(last_at).strftime('%Y-%m-%d %H:%M:%S'),
+                })
+        drops.sort(key=lambda drop: drop['drop_percent'], reverse=True)
+        return drops[:limit]
+
+    def status(self):
+        return {"series": len(self._latest) if self._latest is not None else None}
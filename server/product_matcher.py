@@ -0,0 +1,207 @@
+"""
+Cross-site product matching
+
+Amazon and Flipkart rarely title the same product identically, so grouping
+on the exact name/brand key leaves most products single-site. The matcher
+links titles that are close enough without comparing every pair:
+
+- blocking: only products with the same normalized brand are compared
+- candidates: an all-pairs token index with prefix filtering. Tokens are
+  ordered rarest first and each title indexes only the prefix that any
+  title with Jaccard >= threshold must share, so common words ("black",
+  "for", "with") never generate candidates. Titles that share a model
+  number ("sm-g991b", "wh1000xm4") are also candidates via a second index.
+- verification: Jaccard similarity of the token sets, with a lower bar
+  for shared model numbers; differing model numbers, differing bare
+  numbers ("iphone 14" vs "iphone 15", "rockerz 450" vs "rockerz 550")
+  or differing capacities in the same unit ("128gb" vs "256gb") veto a
+  match.
+- grouping: each product joins its best verified match whose cluster has
+  no listing from its site yet (union-find), so a cluster holds at most
+  one listing per site and one loose match cannot chain whole brands
+  together.
+"""
+import os
+import re
+from collections import Counter
+from math import ceil
+
+MATCH_THRESHOLD = float(os.environ.get("BB_MATCH_THRESHOLD", "0.6"))
+MODEL_MATCH_THRESHOLD = float(os.environ.get("BB_MODEL_MATCH_THRESHOLD", "0.2"))
+# Posting lists longer than this are skipped rather than scanned (near-duplicate
+# floods of one token); keeps the worst case linear
+MAX_POSTINGS = int(os.environ.get("BB_MATCH_MAX_POSTINGS", "200"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+UNITS = r"gb|tb|mb|mah|w|hz|inch|cm|mm|kg|g|l|ml|mp|v"
+# "128 GB" and "128GB" should be the same token
+SPLIT_SPEC_RE = re.compile(rf"\b(\d+(?:\.\d+)?)\s+({UNITS})\b")
+SPEC_RE = re.compile(rf"^(\d+(?:\.\d+)?)({UNITS})$")
+NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+UNKNOWN_BRANDS = {"", "unknown brand", "unknown", "generic"}
+STOPWORDS = {"and", "the", "for", "with", "of", "in", "on", "a", "an", "to", "by", "new", "latest", "pack"}
+
+
+def _title_words(name):
+    for token in TOKEN_RE.findall(SPLIT_SPEC_RE.sub(r"\1\2", name.lower())):
+        token = token.replace('-', '').replace('/', '')
+        if token not in STOPWORDS:
+            yield token
+
+
+def title_tokens(name):
+    """Lower-cased word tokens; hyphen/slash-joined parts are fused ("sm-g991b" -> "smg991b")"""
+    return set(_title_words(name))
+
+
+def series_numbers(name):
+    """Word -> the bare number right after it ("apple iphone 15" -> {"iphone": "15"})"""
+    words = list(_title_words(name))
+    return {word: number for word, number in zip(words, words[1:])
+            if NUMBER_RE.match(number) and word.isalpha()}
+
+
+def is_model_number(token):
+    return (len(token) >= 3 and not SPEC_RE.match(token)
+            and any(c.isdigit() for c in token) and any(c.isalpha() for c in token))
+
+
+class _Item:
+    __slots__ = ('block', 'tokens', 'models', 'numbers', 'series', 'specs', 'sites', 'order')
+
+    def __init__(self, name, brand, sites):
+        self.tokens = title_tokens(name)
+        brand = (brand or "").lower().strip()
+        if brand in UNKNOWN_BRANDS:
+            words = name.lower().split()
+            brand = words[0] if words else ""
+        self.block = brand
+        self.models = {token for token in self.tokens if is_model_number(token)}
+        # Bare numbers are model numbers too (iPhone 15, Rockerz 450); specs
+        # like "128gb" never match NUMBER_RE
+        self.numbers = {token for token in self.tokens if NUMBER_RE.match(token)}
+        self.series = series_numbers(name) if self.numbers else {}
+        self.specs = {}
+        for token in self.tokens:
+            spec = SPEC_RE.match(token)
+            if spec:
+                self.specs.setdefault(spec.group(2), set()).add(spec.group(1))
+        self.sites = frozenset(sites)
+        self.order = None
+
+
+def _vetoed(a, b):
+    if a.models and b.models and not (a.models & b.models):
+        return True
+    # The same series word followed by different numbers: iPhone 14 / 15
+    for word, number in a.series.items():
+        if b.series.get(word, number) != number:
+            return True
+    # Each side has a bare number the other lacks; one side only omitting
+    # one is fine, as with capacities below
+    if a.numbers - b.numbers and b.numbers - a.numbers:
+        return True
+    # Each side lists a capacity the other lacks: 8GB/128GB vs 8GB/256GB.
+    # One side only omitting a value (no RAM in the title) is fine.
+    for unit, values in a.specs.items():
+        other = b.specs.get(unit)
+        if other and values - other and other - values:
+            return True
+    return False
+
+
+def _similarity(a, b, threshold, model_threshold):
+    """Jaccard similarity if the pair matches, else 0"""
+    if _vetoed(a, b):
+        return 0.0
+    shared = len(a.tokens & b.tokens)
+    score = shared / (len(a.tokens) + len(b.tokens) - shared) if shared else 0.0
+    needed = model_threshold if a.models & b.models else threshold
+    return score if score >= needed else 0.0
+
+
+def match_products(products, threshold=MATCH_THRESHOLD, model_threshold=MODEL_MATCH_THRESHOLD,
+                   max_postings=MAX_POSTINGS, stats=None):
+    """
+    Cluster products that are the same item on different sites
+
+    Args:
+        products: Sequence of (name, brand, websites) tuples
+        threshold: Minimum token Jaccard similarity for a match
+        model_threshold: Lower minimum when both titles share a model number
+        max_postings: Longest posting list scanned for candidates
+        stats: Optional dict; receives candidate/verified/skipped counts
+
+    Returns:
+        List of clusters, each a list of indexes into `products`, in order
+        of each cluster's first member
+    """
+    items = [_Item(name, brand, sites) for name, brand, sites in products]
+
+    # Rarest tokens first: the prefix of each title is its most selective part
+    frequency = Counter(token for item in items for token in item.tokens)
+    for item in items:
+        item.order = sorted(item.tokens, key=lambda token: (frequency[token], token))
+
+    parent = list(range(len(items)))
+    # Sites of each cluster, kept at its root
+    cluster_sites = [item.sites for item in items]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    token_index = {}
+    model_index = {}
+    counts = {"candidates": 0, "verified": 0, "matched": 0, "skipped_postings": 0}
+
+    for i, item in enumerate(items):
+        if not item.tokens:
+            continue
+        prefix = len(item.order) - ceil(threshold * len(item.order)) + 1
+        keys = [(token_index, (item.block, token)) for token in item.order[:prefix]]
+        keys += [(model_index, (item.block, model)) for model in item.models]
+
+        candidates = set()
+        for index, key in keys:
+            posting = index.get(key)
+            if posting is None:
+                index[key] = [i]
+                continue
+            if len(posting) > max_postings:
+                counts["skipped_postings"] += 1
+                continue
+            candidates.update(posting)
+            posting.append(i)
+        counts["candidates"] += len(candidates)
+
+        best, best_score = None, 0.0
+        for j in candidates:
+            other = items[j]
+            # Only cross-site links, and at most one listing per site in a
+            # cluster; same-site near-duplicates stay apart
+            if item.sites & cluster_sites[find(j)]:
+                continue
+            # Length filter: Jaccard >= t needs the sizes within a factor of t
+            small, large = sorted((len(item.tokens), len(other.tokens)))
+            if small < model_threshold * large:
+                continue
+            counts["verified"] += 1
+            score = _similarity(item, other, threshold, model_threshold)
+            if score > best_score:
+                best, best_score = j, score
+
+        if best is not None:
+            counts["matched"] += 1
+            root = find(best)
+            cluster_sites[root] = cluster_sites[root] | cluster_sites[find(i)]
+            parent[find(i)] = root
+
+    clusters = {}
+    for i in range(len(items)):
+        clusters.setdefault(find(i), []).append(i)
+    if stats is not None:
+        stats.update(counts)
+    return sorted(clusters.values(), key=lambda members: members[0])
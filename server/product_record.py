@@ -0,0 +1,116 @@
+import hashlib
+
+
+def parse_price(text):
+    """"₹1,299" -> 1299.0; None for "Not Available", "" and other non-numbers"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not text or text == "Not Available":
+        return None
+    try:
+        return float(text.replace('₹', '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def parse_rating(text):
+    """"4.3" -> 4.3; None for "Not Rated" and other non-numbers"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not text or text == "Not Rated":
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def group_key(name, brand):
+    """Normalized name/brand key that merge_products_for_display groups on"""
+    return f"{name.lower().strip()}-{brand.lower().strip()}"
+
+
+def product_id(name, brand):
+    """Catalog id: a hash of group_key, so one grouped product is one row"""
+    return key_id(group_key(name, brand))
+
+
+def key_id(key):
+    """product_id of an already-built group_key"""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def display_id(name, brand):
+    """Short readable id shown next to a product; not unique"""
+    return f"{name[:10]}-{brand}".lower().replace(' ', '-')
+
+
+class ScrapedProduct:
+    """
+    One search result from one site
+
+    Built once by the field builders in html_parsers. The display strings
+    are kept as scraped (they are what the API returns) next to their
+    parsed values and the grouping key, so the merge functions never
+    re-parse them. __slots__ keeps each result to a fixed-size object
+    instead of a per-item dict.
+    """
+
+    __slots__ = ('name', 'price', 'rating', 'ratings', 'brand', 'website', 'link', 'thumbnail',
+                 'price_value', 'rating_value', 'key')
+
+    FIELDS = ('name', 'price', 'rating', 'ratings', 'brand', 'website', 'link', 'thumbnail')
+
+    def __init__(self, name, price, rating, ratings, brand, website, link, thumbnail):
+        self.name = name
+        self.price = price
+        self.rating = rating
+        self.ratings = ratings
+        self.brand = brand
+        self.website = website
+        self.link = link
+        self.thumbnail = thumbnail
+        # Inlined parse_price / parse_rating: this runs once per scraped item
+        try:
+            self.price_value = (float(price.replace('₹', '').replace(',', ''))
+                                if price and price != "Not Available" else None)
+        except ValueError:
+            self.price_value = None
+        try:
+            self.rating_value = float(rating) if rating and rating != "Not Rated" else None
+        except ValueError:
+            self.rating_value = None
+        self.key = f"{name.lower().strip()}-{brand.lower().strip()}"
+
+    def set_brand(self, brand):
+        self.brand = brand
+        self.key = group_key(self.name, brand)
+
+    def variant(self):
+        """The per-site entry shown under a merged product"""
+        return {
+            'price': self.price,
+            'website': self.website,
+            'rating': self.rating,
+            'ratings_count': self.ratings,
+            'link': self.link,
+            'thumbnail': self.thumbnail,
+        }
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, product):
+        return cls(*(product.get(field) for field in cls.FIELDS))
+
+    def __repr__(self):
+        return f"ScrapedProduct({self.website}: {self.name!r}, {self.price!r})"
+
+    # Picklable for process-mode scrape workers despite having no __dict__
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
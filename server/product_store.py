@@ -0,0 +1,378 @@
+import os
+import ast
+import csv
+import sys
+import json
+import math
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+from product_record import product_id, display_id
+
+CATALOG_DB_PATH = os.environ.get("BB_CATALOG_DB", "catalog.db")
+
+PRODUCT_COLUMNS = [
+    'id', 'display_id', 'name', 'brand', 'price_display', 'best_price',
+    'avg_rating', 'thumbnail', 'available_on', 'variants'
+]
+
+# id is product_record.product_id (a hash of the grouping key); display_id
+# is the short name/brand id, which different products can share
+PRODUCTS_TABLE = """
+CREATE TABLE IF NOT EXISTS products (
+    id            TEXT PRIMARY KEY,
+    display_id    TEXT,
+    name          TEXT NOT NULL,
+    brand         TEXT,
+    price_display TEXT,
+    best_price    REAL,
+    avg_rating    REAL,
+    thumbnail     TEXT,
+    available_on  TEXT,
+    variants      TEXT,
+    last_updated  TEXT,
+    content_hash  TEXT
+);
+"""
+
+SCHEMA = PRODUCTS_TABLE + """
+CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand);
+CREATE INDEX IF NOT EXISTS idx_products_best_price ON products(best_price);
+CREATE INDEX IF NOT EXISTS idx_products_avg_rating ON products(avg_rating);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS id_renames (
+    old_id TEXT PRIMARY KEY,
+    new_id TEXT NOT NULL
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO products (id, display_id, name, brand, price_display, best_price, avg_rating,
+                      thumbnail, available_on, variants, last_updated, content_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    display_id = excluded.display_id,
+    name = excluded.name,
+    brand = excluded.brand,
+    price_display = excluded.price_display,
+    best_price = excluded.best_price,
+    avg_rating = excluded.avg_rating,
+    thumbnail = excluded.thumbnail,
+    available_on = excluded.available_on,
+    variants = excluded.variants,
+    last_updated = excluded.last_updated,
+    content_hash = excluded.content_hash
+"""
+
+BUMP_WRITE_SEQ_SQL = """
+INSERT INTO meta (key, value) VALUES ('write_seq', '1')
+ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+"""
+
+# Catalogs written before display_id were keyed on the display id; re-key
+# them on product_id(). content_hash is cleared so the next save of each
+# product rewrites it. id_renames keeps old -> new so ratings and price
+# history recorded under the old ids can follow (see id_renames()).
+RENAME_SQL = """
+INSERT OR REPLACE INTO id_renames (old_id, new_id)
+SELECT id, product_id(name, COALESCE(brand, '')) FROM products_legacy ORDER BY last_updated
+"""
+
+REKEY_SQL = """
+INSERT OR REPLACE INTO products (id, display_id, name, brand, price_display, best_price, avg_rating,
+                                 thumbnail, available_on, variants, last_updated)
+SELECT product_id(name, COALESCE(brand, '')), id, name, brand, price_display, best_price, avg_rating,
+       thumbnail, available_on, variants, last_updated
+FROM products_legacy ORDER BY last_updated
+"""
+
+
+def _to_float(value):
+    """Numeric value or None for "Not Rated", "", inf, nan and friends"""
+    try:
+        number = float(str(value).replace('₹', '').replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+# Column order of product_row() tuples
+ROW_COLUMNS = PRODUCT_COLUMNS + ['last_updated']
+
+
+def decode_frame(df):
+    """Turn raw products-table columns into the shape the recommenders expect"""
+    if df.empty:
+        return pd.DataFrame(columns=ROW_COLUMNS)
+    df['variants'] = df['variants'].map(lambda text: json.loads(text) if text else [])
+    df['available_on'] = df['available_on'].map(lambda text: text.split('|') if text else [])
+    df['avg_rating'] = df['avg_rating'].astype(object).where(df['avg_rating'].notna(), "Not Rated")
+    df['best_price'] = df['best_price'].astype(object).where(df['best_price'].notna(), None)
+    return df
+
+
+def rows_to_frame(rows):
+    """product_row() tuples -> decoded DataFrame"""
+    return decode_frame(pd.DataFrame.from_records(rows, columns=ROW_COLUMNS))
+
+
+def row_hash(row):
+    """Content hash of a product_row() tuple, ignoring last_updated"""
+    payload = json.dumps(row[:-1], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def product_row(product, last_updated):
+    """Product dict -> products table row"""
+    available_on = product.get('available_on', [])
+    if not isinstance(available_on, list):
+        available_on = [site for site in str(available_on or '').split('|') if site]
+    variants = product.get('variants', [])
+    if not isinstance(variants, list):
+        variants = []
+
+    name = product.get('name') or ''
+    brand = product.get('brand') or ''
+    return (
+        product.get('id') or product_id(name, brand),
+        product.get('display_id') or display_id(name, brand),
+        name,
+        brand,
+        product.get('price_display', ''),
+        _to_float(product.get('best_price')),
+        _to_float(product.get('avg_rating')),
+        product.get('thumbnail') or '',
+        '|'.join(available_on),
+        json.dumps(variants, ensure_ascii=False),
+        last_updated,
+    )
+
+
+class ProductStore:
+    """
+    SQLite-backed product catalog keyed by product id (product_record.product_id)
+
+    Saves are upserts, so re-scraping a product updates its row instead of
+    appending a new one. WAL mode lets request threads read while a save
+    is in progress; each thread gets its own connection.
+
+    Every row carries a content hash. The id -> hash index is read once
+    and then kept current in memory, so a save only hashes its own rows
+    and skips products whose content has not changed.
+
+    Args:
+        path: Database file (created on first use)
+    """
+
+    def __init__(self, path=CATALOG_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._hashes = None
+        self._listeners = []
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+            if 'display_id' not in columns:
+                self._rekey(conn)
+                conn.executescript(SCHEMA)
+
+    def _rekey(self, conn):
+        """Move a catalog keyed on the old display ids onto product_id()"""
+        conn.create_function("product_id", 2, product_id)
+        with conn:
+            conn.execute("ALTER TABLE products RENAME TO products_legacy")
+            conn.execute(PRODUCTS_TABLE)
+            conn.execute(REKEY_SQL)
+            conn.execute(RENAME_SQL)
+            # Also drops the old indexes; SCHEMA recreates them on products
+            conn.execute("DROP TABLE products_legacy")
+            conn.execute(BUMP_WRITE_SEQ_SQL)
+        print(f"✅ Re-keyed '{self.path}' on product ids ({self.count()} products).")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _hash_index(self):
+        """id -> content hash for every stored row, loaded on first use"""
+        if self._hashes is None:
+            with self._write_lock:
+                if self._hashes is None:
+                    self._hashes = dict(self._connection().execute(
+                        "SELECT id, content_hash FROM products"
+                    ))
+        return self._hashes
+
+    def save_products(self, products):
+        """Upsert merged products whose content changed; returns the number of rows written"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Last occurrence of an id in the batch wins, as with the upsert itself
+        rows = {}
+        for product in products:
+            if product.get('id') or product.get('name'):
+                row = product_row(product, now)
+                rows[row[0]] = row
+        if not rows:
+            return 0
+
+        index = self._hash_index()
+        changed = [row for row in rows.values() if index.get(row[0]) != row_hash(row)]
+        written = self.upsert_rows(changed)
+        print(f"\n✅ Saved {written} products to '{self.path}' ({len(rows) - written} unchanged).")
+        return written
+
+    def upsert_rows(self, rows):
+        """Upsert prepared product_row() tuples in one transaction"""
+        if not rows:
+            return 0
+        hashed = [row + (row_hash(row),) for row in rows]
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(UPSERT_SQL, hashed)
+                conn.execute(BUMP_WRITE_SEQ_SQL)
+            if self._hashes is not None:
+                self._hashes.update((row[0], row[-1]) for row in hashed)
+            # Still under the write lock, so listeners see saves in commit order
+            for listener in self._listeners:
+                try:
+                    listener(rows)
+                except Exception as e:
+                    print(f"Error in product store listener: {str(e)}")
+        return len(rows)
+
+    def add_id_renames(self, pairs):
+        """Record (old id, new id) pairs; a later pair for the same old id wins"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO id_renames (old_id, new_id) VALUES (?, ?)", pairs)
+
+    def id_renames(self):
+        """
+        Old display id -> product id, for ids from before the re-keying
+
+        Covers catalogs re-keyed on open and the legacy CSV's ids. Where
+        several products shared an old id, it maps to the one saved last,
+        which is the product that id showed before.
+        """
+        return dict(self._connection().execute("SELECT old_id, new_id FROM id_renames"))
+
+    def add_listener(self, callback):
+        """Call callback(rows) with the product_row() tuples of every committed upsert"""
+        self._listeners.append(callback)
+
+    def load_dataframe(self):
+        """
+        The whole catalog in the shape the recommenders expect
+
+        variants come back as lists of dicts, available_on as lists, and
+        missing ratings as "Not Rated".
+        """
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(ROW_COLUMNS)} FROM products",
+            self._connection()
+        )
+        return decode_frame(df)
+
+    def top_rated(self, n=10):
+        """Best-rated products, using the avg_rating index"""
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products "
+            "WHERE avg_rating IS NOT NULL ORDER BY avg_rating DESC LIMIT ?",
+            self._connection(), params=(n,)
+        )
+        df['variants'] = df['variants'].map(lambda text: json.loads(text) if text else [])
+        df['available_on'] = df['available_on'].map(lambda text: text.split('|') if text else [])
+        return df
+
+    def write_seq(self):
+        """Counter bumped by every committed upsert; identifies a catalog state"""
+        return int(self.get_meta('write_seq') or 0)
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def get_meta(self, key):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _parse_legacy_list(text):
+    """variants column of the old CSV: str(list_of_dicts)"""
+    if not text:
+        return []
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+    return value if isinstance(value, list) else []
+
+
+def import_csv(store, csv_path, chunk_size=5000):
+    """
+    One-time import of the legacy append-only CSV
+
+    Rows repeat the header mid-file and the same product appears once per
+    search; upserting in file order leaves the latest version of each
+    product. The CSV's id column is the old display id; rows are keyed
+    on product_id() of their name and brand.
+    The import is recorded in the meta table so it only runs once per file.
+
+    Returns:
+        Number of rows imported (0 if already imported or missing)
+    """
+    marker = f"imported:{os.path.abspath(csv_path)}"
+    if not os.path.exists(csv_path) or store.get_meta(marker):
+        return 0
+
+    imported = 0
+    batch = []
+    renames = []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            # Header rows duplicated mid-file and blank rows
+            if row.get('id') in (None, '', 'id'):
+                continue
+            product = dict(row)
+            product['display_id'] = product.pop('id')
+            product['variants'] = _parse_legacy_list(row.get('variants'))
+            batch.append(product_row(product, row.get('last_updated') or ''))
+            renames.append((product['display_id'], batch[-1][0]))
+            if len(batch) >= chunk_size:
+                imported += store.upsert_rows(batch)
+                batch = []
+    if batch:
+        imported += store.upsert_rows(batch)
+    store.add_id_renames(renames)
+
+    store.set_meta(marker, datetime.now().isoformat())
+    print(f"✅ Imported {imported} rows from '{csv_path}' into '{store.path}'.")
+    return imported
+
+
+if __name__ == "__main__":
+    # python product_store.py <legacy.csv> [catalog.db]
+    if len(sys.argv) < 2:
+        print("Usage: python product_store.py <legacy.csv> [catalog.db]")
+        sys.exit(1)
+    target = ProductStore(sys.argv[2] if len(sys.argv) > 2 else CATALOG_DB_PATH)
+    import_csv(target, sys.argv[1])
+    print(f"Catalog now holds {target.count()} products.")
@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+RATING_CACHE_TTL = float(os.environ.get("BB_RATING_CACHE_TTL", "1800"))
+RATING_CACHE_MAX_ENTRIES = int(os.environ.get("BB_RATING_CACHE_MAX_ENTRIES", "4096"))
+
+# Query params that only track how the user reached the page
+TRACKING_PARAMS = {
+    'ref', 'ref_', 'qid', 'sr', 'srno', 'crid', 'dib', 'dib_tag', 'keywords',
+    'sprefix', 'th', 'psc', 'spla', 'otracker', 'otracker1', 'fm', 'iid',
+    'ppt', 'ppn', 'ssid', 'qh', 'q', 'store', 'marketplace',
+}
+
+AMAZON_ASIN_PATTERN = re.compile(r"/(?:dp|gp/product)/([A-Z0-9]{10})", re.IGNORECASE)
+
+
+def canonicalize_product_url(url):
+    """
+    Reduce a product URL to a stable cache key
+
+    Amazon links collapse to /dp/<ASIN>; for everything else the fragment,
+    any /ref=... path suffix and tracking params (ref, qid, srno, ...) are
+    dropped and the remaining params are sorted.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+
+    if 'amazon' in host:
+        match = AMAZON_ASIN_PATTERN.search(parts.path)
+        if match:
+            return urlunsplit(("https", host, f"/dp/{match.group(1).upper()}", "", ""))
+
+    path = re.sub(r"/ref=[^/]*$", "", parts.path)
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith('utm_')
+    )
+    return urlunsplit((parts.scheme.lower() or "https", host, path, urlencode(params), ""))
+
+
+class RatingCache:
+    """
+    TTL cache of per-link rating scrapes with single-flight coalescing
+
+    Concurrent requests for the same canonical product URL share one
+    in-flight scrape; completed successful results are kept for `ttl`
+    seconds.
+
+    Args:
+        ttl: Seconds a scraped rating stays fresh
+        max_entries: LRU bound on cached links
+    """
+
+    def __init__(self, ttl=RATING_CACHE_TTL, max_entries=RATING_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def fetch(self, link, submit):
+        """
+        Get a Future for a link's rating result
+
+        Args:
+            link: Product URL as sent by the client
+            submit: Callable taking the link and returning a Future; only
+                called when there is neither a fresh entry nor an in-flight
+                scrape for the canonical URL
+
+        Returns:
+            concurrent.futures.Future resolving to the scrape result dict
+        """
+        key = canonicalize_product_url(link)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                future = Future()
+                future.set_result(entry[1])
+                return future
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+
+            self.stats["misses"] += 1
+            future = submit(link)
+            self._inflight[key] = future
+
+        # Registered outside the lock: it runs inline if the job already finished
+        future.add_done_callback(lambda done: self._complete(key, done))
+        return future
+
+    def _complete(self, key, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            result = future.result()
+            # Only successful scrapes are worth reusing
+            if isinstance(result, dict) and result.get("status") == "success":
+                self._entries[key] = (time.time(), result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def status(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "ttl": self.ttl,
+                **self.stats,
+            }
@@ -0,0 +1,267 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+
+RATINGS_DB_PATH = os.environ.get("BB_RATINGS_DB", "ratings.db")
+
+RATING_COLUMNS = ['user_id', 'product_id', 'rating']
+
+# One row per (user, product, source): a new rating for the same pair
+# replaces the old one in place, so the table never needs compacting
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    user_id    TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    source     TEXT NOT NULL,
+    rating     REAL NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, product_id, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    user_id    TEXT PRIMARY KEY,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO ratings (user_id, product_id, source, rating, updated_at)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(user_id, product_id, source) DO UPDATE SET
+    rating = excluded.rating,
+    updated_at = excluded.updated_at
+"""
+
+
+class RatingsStore:
+    """
+    SQLite-backed user ratings and known users
+
+    Replaces rewriting user_ratings.json / fake_ratings.json on every
+    change: each write is a keyed upsert in its own transaction, so its
+    cost depends on the ratings written, not on how many are stored, and
+    concurrent requests cannot overwrite each other's changes.
+
+    Ratings carry a source ("user" for real ones, "fake" for the generated
+    seed data). Readers get a DataFrame or a sparse user x item matrix;
+    the DataFrame is cached until this process writes again. Listeners
+    (see add_listener) are told about every committed write.
+
+    Args:
+        path: Database file (created on first use)
+    """
+
+    def __init__(self, path=RATINGS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writes = 0
+        self._frame = None
+        self._listeners = []
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_ratings(self, records, source="user"):
+        """Upsert (user_id, product_id, rating) records in one transaction; returns the count"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [
+            (str(user_id), str(product_id), source, float(rating), now)
+            for user_id, product_id, rating in records
+        ]
+        if not rows:
+            return 0
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(UPSERT_SQL, rows)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)",
+                    {(row[0], now) for row in rows}
+                )
+            self._writes += 1
+            # Still under the write lock, so listeners see writes in commit order
+            for listener in self._listeners:
+                try:
+                    listener(rows)
+                except Exception as e:
+                    print(f"Error in ratings store listener: {str(e)}")
+        return len(rows)
+
+    def add_listener(self, callback):
+        """Call callback(rows) with the (user_id, product_id, source, rating, updated_at) rows of every write"""
+        self._listeners.append(callback)
+
+    def add_rating(self, user_id, product_id, rating, source="user"):
+        return self.add_ratings([(user_id, product_id, rating)], source)
+
+    def ensure_user(self, user_id):
+        """Register a user; True if they were not known before"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)",
+                    (user_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+        return cursor.rowcount == 1
+
+    def user_ratings(self, user_id):
+        """product_id -> rating for one user (primary-key range read)"""
+        return dict(self._connection().execute(
+            "SELECT product_id, rating FROM ratings WHERE user_id = ?", (user_id,)
+        ))
+
+    def count(self, source=None):
+        if source is None:
+            return self._connection().execute("SELECT COUNT(*) FROM ratings").fetchone()[0]
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM ratings WHERE source = ?", (source,)
+        ).fetchone()[0]
+
+    def ratings_frame(self):
+        """
+        All ratings as a user_id / product_id / rating DataFrame
+
+        A user's own rating wins over a generated one for the same product.
+        The frame is shared between callers and must be treated as read-only.
+        """
+        cached = self._frame
+        if cached is not None and cached[0] == self._writes:
+            return cached[1]
+        writes = self._writes
+        df = pd.read_sql_query(
+            "SELECT user_id, product_id, rating FROM ratings "
+            "ORDER BY user_id, product_id, source = 'user'",
+            self._connection()
+        ).drop_duplicates(subset=['user_id', 'product_id'], keep='last').reset_index(drop=True)
+        self._frame = (writes, df)
+        return df
+
+    def user_pairs(self):
+        """(user_id, product_id) pairs that have a user's own rating"""
+        return set(self._connection().execute(
+            "SELECT user_id, product_id FROM ratings WHERE source = 'user'"
+        ).fetchall())
+
+    def ratings_matrix(self):
+        """
+        Sparse user x item matrix of ratings_frame()
+
+        Returns:
+            (csr_matrix, user_ids, product_ids) where row i is user_ids[i]
+            and column j is product_ids[j]
+        """
+        from scipy.sparse import csr_matrix
+
+        df = self.ratings_frame()
+        users, user_ids = pd.factorize(df['user_id'])
+        items, product_ids = pd.factorize(df['product_id'])
+        matrix = csr_matrix(
+            (df['rating'].to_numpy(dtype='float64'), (users, items)),
+            shape=(len(user_ids), len(product_ids))
+        )
+        return matrix, list(user_ids), list(product_ids)
+
+    def rename_products(self, renames):
+        """
+        Move ratings onto new product ids (ProductStore.id_renames())
+
+        Where a user already rated the new id from the same source, that
+        rating is kept. Applied once per set of renames, as recorded in
+        the meta table; run it at startup, before anything loads the
+        ratings, as listeners are not told.
+        """
+        marker = f"renamed:{len(renames)}"
+        if not renames or self.get_meta("product_renames") == marker:
+            return 0
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS renames (old_id TEXT PRIMARY KEY, new_id TEXT)")
+                conn.execute("DELETE FROM temp.renames")
+                conn.executemany("INSERT INTO temp.renames VALUES (?, ?)", renames.items())
+                moved = conn.execute(
+                    "UPDATE OR IGNORE ratings SET product_id = "
+                    "(SELECT new_id FROM temp.renames WHERE old_id = product_id) "
+                    "WHERE product_id IN (SELECT old_id FROM temp.renames)"
+                ).rowcount
+                # Left behind only where the new id was already rated
+                conn.execute("DELETE FROM ratings WHERE product_id IN (SELECT old_id FROM temp.renames)")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('product_renames', ?)", (marker,))
+            self._writes += 1
+        if moved:
+            print(f"✅ Moved {moved} ratings onto new product ids in '{self.path}'.")
+        return moved
+
+    def get_meta(self, key):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Skipping unreadable ratings file '{path}': {str(e)}")
+        return None
+
+
+def import_json_ratings(store, user_ratings_path, fake_ratings_path):
+    """
+    One-time import of the legacy JSON rating files
+
+    user_ratings.json maps user -> {product_id: rating}; fake_ratings.json is
+    a list of {user_id, product_id, rating} records. Each file is recorded
+    in the meta table once imported, like import_csv does for the catalog.
+
+    Returns:
+        Number of ratings imported
+    """
+    imported = 0
+    for path, source in ((user_ratings_path, "user"), (fake_ratings_path, "fake")):
+        marker = f"imported:{os.path.abspath(path)}"
+        if not os.path.exists(path) or store.get_meta(marker):
+            continue
+        data = _read_json(path)
+        if data is None:
+            continue
+
+        if source == "user" and isinstance(data, dict):
+            for user_id, ratings in data.items():
+                store.ensure_user(user_id)
+                if isinstance(ratings, dict):
+                    imported += store.add_ratings(
+                        [(user_id, product_id, rating) for product_id, rating in ratings.items()], source
+                    )
+        elif isinstance(data, list):
+            imported += store.add_ratings(
+                [(r['user_id'], r['product_id'], r['rating']) for r in data
+                 if isinstance(r, dict) and all(key in r for key in RATING_COLUMNS)],
+                source
+            )
+
+        store.set_meta(marker, datetime.now().isoformat())
+        print(f"✅ Imported ratings from '{path}' into '{store.path}'.")
+    return imported
@@ -0,0 +1,127 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+SAVE_QUEUE_MAX_BATCH = int(os.environ.get("BB_SAVE_QUEUE_MAX_BATCH", "16"))
+SAVE_QUEUE_MAX_DELAY = float(os.environ.get("BB_SAVE_QUEUE_MAX_DELAY", "0.5"))
+
+_STOP = object()
+
+
+class SaveQueue:
+    """
+    Write-behind persistence for search results
+
+    Requests hand their merged products to submit() and return at once; a
+    single writer thread collects whatever searches arrive within
+    `max_delay` seconds (up to `max_batch` of them) and saves them all with
+    one store.save_products() call, i.e. one transaction per group.
+
+    Args:
+        store: ProductStore to save into
+        max_batch: Most searches committed together
+        max_delay: Seconds to wait for more searches once one has arrived
+    """
+
+    def __init__(self, store, max_batch=SAVE_QUEUE_MAX_BATCH, max_delay=SAVE_QUEUE_MAX_DELAY):
+        self.store = store
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._unsaved = 0
+        self._latencies = deque(maxlen=200)
+        self._closed = False
+        self.stats = {"submitted": 0, "commits": 0, "products": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="save-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, products):
+        """Queue one search's products for saving; returns False once closed"""
+        # Checked and queued under the lock so nothing lands behind close()'s _STOP
+        with self._lock:
+            if self._closed:
+                return False
+            self._unsaved += 1
+            self.stats["submitted"] += 1
+            self._queue.put((time.monotonic(), products))
+        return True
+
+    def _collect(self):
+        """Block for one batch, then gather more until max_batch or max_delay"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, batch):
+        start = time.monotonic()
+        try:
+            products = [product for _, submitted in batch for product in submitted]
+            written = self.store.save_products(products)
+            failed = False
+        except Exception as e:
+            print(f"Error saving products: {str(e)}")
+            written, failed = 0, True
+        done = time.monotonic()
+        with self._lock:
+            self.stats["commits"] += 1
+            self.stats["products"] += written
+            self.stats["failed"] += failed
+            self._latencies.append((done - start, done - batch[0][0]))
+            self._unsaved -= len(batch)
+            self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is saved; False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unsaved == 0, timeout)
+
+    def close(self, timeout=30):
+        """Stop accepting work, save what is queued and stop the writer"""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            commits = sorted(commit for commit, _ in self._latencies)
+            waits = sorted(wait for _, wait in self._latencies)
+            stats = dict(self.stats)
+            depth = self._unsaved
+
+        def ms(values, q):
+            return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1) if values else None
+
+        return {
+            "queue_depth": depth,
+            "commit_ms_p50": ms(commits, 0.5),
+            "commit_ms_p95": ms(commits, 0.95),
+            "queued_to_saved_ms_p50": ms(waits, 0.5),
+            "queued_to_saved_ms_p95": ms(waits, 0.95),
+            **stats,
+        }
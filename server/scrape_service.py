@@ -0,0 +1,125 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from optimized_scraper import scrape_amazon_selenium, flipkart_scraper, amazon_ratings, flipkart_rating
+
+# "thread" shares this process's driver pool and HTTP session; "process"
+# runs jobs in long-lived worker processes, each with its own driver pool.
+SCRAPE_EXECUTOR = os.environ.get("BB_SCRAPE_EXECUTOR", "thread")
+SCRAPE_WORKERS = int(os.environ.get("BB_SCRAPE_WORKERS", "4"))
+
+SEARCH_SCRAPERS = {
+    "amazon": scrape_amazon_selenium,
+    "flipkart": flipkart_scraper,
+}
+
+
+# Job functions (module level so they can be pickled for process workers)
+def run_scraper(scraper_func_name, query, max_pages=1):
+    try:
+        scraper = SEARCH_SCRAPERS.get(scraper_func_name)
+        if scraper is None:
+            return []
+        return scraper(query, max_pages=max_pages)
+    except Exception as e:
+        print(f"Scraper {scraper_func_name} failed: {str(e)}")
+        return []
+
+def scrape_single_link(link):
+    try:
+        if 'amazon' in link:
+            return amazon_ratings(link)
+        elif 'flipkart' in link:
+            return flipkart_rating(link)
+        return {'error': 'Unsupported website', 'url': link}
+    except Exception as e:
+        return {'error': str(e), 'url': link}
+
+
+class ScrapeService:
+    """
+    Long-lived executor for scraping jobs
+
+    Started once with the app and shared by every endpoint, so worker
+    startup (and, in process mode, importing pandas/sklearn/selenium) is
+    paid once per deployment instead of once per request.
+
+    Args:
+        max_workers: Upper bound on concurrently running jobs
+        kind: "thread" or "process"
+    """
+
+    def __init__(self, max_workers=SCRAPE_WORKERS, kind=SCRAPE_EXECUTOR):
+        self.max_workers = max(1, max_workers)
+        self.kind = kind
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="scraper"
+            )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0}
+
+    def _submit(self, fn, *args):
+        future = self._executor.submit(fn, *args)
+        with self._lock:
+            self._pending += 1
+            self.stats["submitted"] += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.stats["failed"] += 1
+            else:
+                self.stats["completed"] += 1
+
+    def submit_search(self, site, query, max_pages=1):
+        """Queue a search scrape for "amazon" or "flipkart"; returns a Future of a product list"""
+        return self._submit(run_scraper, site, query, max_pages)
+
+    def submit_details(self, link):
+        """Queue a rating scrape for one product link; returns a Future of a result dict"""
+        return self._submit(scrape_single_link, link)
+
+    def status(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "pending": self._pending,
+                **self.stats,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_scrape_service():
+    """Process-wide scrape service, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ScrapeService()
+        return _service
+
+
+def shutdown_scrape_service(wait=True):
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.shutdown(wait=wait)
+            _service = None
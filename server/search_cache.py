@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+SEARCH_CACHE_TTL = float(os.environ.get("BB_SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_STALE_TTL = float(os.environ.get("BB_SEARCH_CACHE_STALE_TTL", "86400"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("BB_SEARCH_CACHE_MAX_ENTRIES", "256"))
+SEARCH_CACHE_DIR = os.environ.get("BB_SEARCH_CACHE_DIR") or None
+SEARCH_CACHE_SWR = os.environ.get("BB_SEARCH_CACHE_SWR", "1") == "1"
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive cache key"""
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+    """
+    Query-level cache of merged search results
+
+    An in-memory LRU tier, optionally backed by one JSON file per query in
+    `directory` so results survive restarts. Entries younger than `ttl` are
+    fresh; entries up to `stale_ttl` old can still be served while a refresh
+    runs in the background (stale-while-revalidate).
+
+    Args:
+        ttl: Seconds an entry is fresh
+        stale_ttl: Seconds an entry may be served stale
+        max_entries: Size of the in-memory LRU tier
+        directory: Optional directory for on-disk persistence
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, stale_ttl=SEARCH_CACHE_STALE_TTL,
+                 max_entries=SEARCH_CACHE_MAX_ENTRIES, directory=SEARCH_CACHE_DIR):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_entries = max(1, max_entries)
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _load_from_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            return entry["stored_at"], entry["products"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_to_disk(self, key, stored_at, products):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"query": key, "stored_at": stored_at, "products": products}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error persisting search cache entry: {str(e)}")
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, query):
+        """
+        Look up a query
+
+        Returns:
+            (products, meta) where meta has "status" ("hit", "stale" or
+            "miss") and "age" in seconds; products is None on a miss.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load_from_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, entry)
+
+        now = time.time()
+        if entry is not None:
+            stored_at, products = entry
+            age = now - stored_at
+            if age <= self.ttl:
+                self.stats["hits"] += 1
+                return products, {"status": "hit", "age": round(age, 1)}
+            if age <= self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                return products, {"status": "stale", "age": round(age, 1)}
+
+        self.stats["misses"] += 1
+        return None, {"status": "miss", "age": None}
+
+    def set(self, query, products):
+        key = normalize_query(query)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, (stored_at, products))
+        self._save_to_disk(key, stored_at, products)
+
+    def begin_refresh(self, query):
+        """Claim the background refresh for a query; False if one is already running"""
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, query):
+        with self._lock:
+            self._refreshing.discard(normalize_query(query))
+
+    def status(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "refreshing": len(self._refreshing),
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                **self.stats,
+            }
@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from urllib3.exceptions import ConnectTimeoutError, ReadTimeoutError
+
+SCHEDULER_TIMEOUT = float(os.environ.get("BB_SCHEDULER_TIMEOUT", "60"))
+# What counts as the site being slow; socket.timeout is TimeoutError
+NETWORK_TIMEOUTS = (requests.Timeout, TimeoutError)
+
+# Defaults per site; each can be overridden with BB_<SITE>_<KEY>,
+# e.g. BB_AMAZON_RPS=1.5 or BB_FLIPKART_MAX_CONCURRENCY=6
+SITE_DEFAULTS = {
+    "amazon": {"rps": 2.0, "burst": 4, "max_concurrency": 4, "target_latency": 4.0},
+    "flipkart": {"rps": 3.0, "burst": 6, "max_concurrency": 6, "target_latency": 4.0},
+    "default": {"rps": 2.0, "burst": 4, "max_concurrency": 4, "target_latency": 5.0},
+}
+
+
+def is_network_timeout(e):
+    """
+    Whether an exception means the site was too slow
+
+    Once the session's retries run out, requests reports a read or connect
+    timeout as a ConnectionError wrapping MaxRetryError; its reason says
+    what actually happened.
+    """
+    if isinstance(e, NETWORK_TIMEOUTS):
+        return True
+    if isinstance(e, requests.ConnectionError) and e.args:
+        reason = getattr(e.args[0], "reason", None)
+        return isinstance(reason, (ReadTimeoutError, ConnectTimeoutError))
+    return False
+
+
+def site_for_url(url):
+    host = urlsplit(url).netloc.lower()
+    for site in ("amazon", "flipkart"):
+        if site in host:
+            return site
+    return "default"
+
+
+def _site_config(site):
+    config = dict(SITE_DEFAULTS.get(site, SITE_DEFAULTS["default"]))
+    for key, value in config.items():
+        override = os.environ.get(f"BB_{site.upper()}_{key.upper()}")
+        if override:
+            config[key] = type(value)(override)
+    return config
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` banked"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self):
+        """Take a token if one is available; otherwise return seconds until the next one"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class SiteLimiter:
+    """
+    Pacing and adaptive concurrency for one site
+
+    A token bucket caps the request rate and an AIMD limit caps requests in
+    flight. Timeouts and block pages halve both; requests that finish under
+    `target_latency` grow the concurrency limit by about one per limit's
+    worth of successes and nudge the rate back toward its configured max.
+    """
+
+    def __init__(self, site, rps, burst, max_concurrency, target_latency,
+                 min_rps=0.2, decrease=0.5):
+        self.site = site
+        self.max_rps = rps
+        self.min_rps = min(min_rps, rps)
+        self.max_concurrency = max(1, max_concurrency)
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.bucket = TokenBucket(rps, burst)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        self.stats = {"ok": 0, "slow": 0, "timeouts": 0, "blocked": 0, "errors": 0}
+
+    def acquire(self, timeout=SCHEDULER_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.queued += 1
+            try:
+                # Concurrency slot first, then a token for pacing
+                while self.in_flight >= max(1, int(self.limit)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Timed out waiting for a {self.site} request slot")
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.queued -= 1
+
+        while True:
+            with self._cond:
+                wait = self.bucket.try_take()
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                self.release(0.0, "error")
+                raise TimeoutError(f"Timed out waiting for a {self.site} rate-limit token")
+            time.sleep(wait)
+
+    def release(self, latency, outcome):
+        """Report how a request went: "ok", "timeout", "blocked" or "error" """
+        with self._cond:
+            self.in_flight -= 1
+            if outcome in ("timeout", "blocked"):
+                self.stats["timeouts" if outcome == "timeout" else "blocked"] += 1
+                self.limit = max(1.0, self.limit * self.decrease)
+                self.bucket.rate = max(self.min_rps, self.bucket.rate * self.decrease)
+            elif outcome == "ok":
+                if latency <= self.target_latency:
+                    self.stats["ok"] += 1
+                    self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                    self.bucket.rate = min(self.max_rps, self.bucket.rate + 0.1 * self.max_rps / self.limit)
+                else:
+                    self.stats["slow"] += 1
+            else:
+                self.stats["errors"] += 1
+            self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            return {
+                "rps": round(self.bucket.rate, 2),
+                "max_rps": self.max_rps,
+                "concurrency_limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                **self.stats,
+            }
+
+
+class _Slot:
+    """Handle yielded by SiteScheduler.request() for reporting the outcome"""
+
+    def __init__(self):
+        self.outcome = "ok"
+
+    def timed_out(self):
+        self.outcome = "timeout"
+
+    def blocked(self):
+        self.outcome = "blocked"
+
+    def failed(self):
+        self.outcome = "error"
+
+
+class SiteScheduler:
+    """Per-site limiters, created on first use"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, site):
+        with self._lock:
+            limiter = self._limiters.get(site)
+            if limiter is None:
+                limiter = self._limiters[site] = SiteLimiter(site, **_site_config(site))
+            return limiter
+
+    @contextmanager
+    def request(self, site, timeout=SCHEDULER_TIMEOUT):
+        """
+        Wrap one network request to `site`
+
+        Blocks until the site's limits allow another request. Network
+        timeouts (see is_network_timeout) raised inside count as
+        timeouts and other exceptions as errors, unless the caller already
+        reported an outcome; callers flag block pages with slot.blocked().
+        """
+        limiter = self.limiter(site)
+        limiter.acquire(timeout=timeout)
+        slot = _Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            if slot.outcome == "ok":
+                slot.outcome = "timeout" if is_network_timeout(e) else "error"
+            raise
+        finally:
+            limiter.release(time.monotonic() - start, slot.outcome)
+
+    def status(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.site: limiter.status() for limiter in limiters}
+
+
+_scheduler = SiteScheduler()
+
+
+def get_scheduler():
+    return _scheduler
@@ -1,6 +1,6 @@
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from content_index import ContentIndex
+from user_item_matrix import UserItemMatrix
 import ast
 import random
 
@@ -54,56 +54,44 @@ def generate_fake_ratings(product_ids, num_users=None):
 # product_ids = df['id'].dropna().unique().tolist()
 # ratings_df = generate_fake_ratings(product_ids)
 
-def collaborative_filtering_recommendations(ratings_df, product_df, target_user_id, top_n=12):
+def collaborative_filtering_recommendations(ratings_df, product_df, target_user_id, top_n=12, user_items=None, factor_model=None):
     """
     Generate recommendations based on user similarity
     
     Args:
-        ratings_df: DataFrame with user ratings
+        ratings_df: DataFrame with user ratings (unused when user_items is given)
         product_df: DataFrame with product details
         target_user_id: User to recommend for
         top_n: Number of recommendations to return
+        user_items: UserItemMatrix to score from instead of ratings_df (optional)
+        factor_model: FactorModel to rank with when it knows the user (optional)
         
     Returns:
-        DataFrame with recommended products
+        DataFrame with recommended products, best first
     """
-    # Create user-item matrix
-    user_item_matrix = ratings_df.pivot_table(
-        index='user_id',
-        columns='product_id',
-        values='rating'
-    ).fillna(0)
+    # Sparse user-item matrix; only the target's similarities are computed
+    if user_items is None:
+        user_items = UserItemMatrix(ratings_df=ratings_df)
+
+    # Predicted ratings from the latent-factor model, skipping items rated since it was trained
+    scores = None
+    if factor_model is not None:
+        scores = factor_model.recommend(
+            target_user_id, top_n, candidates=product_df['id'], exclude=user_items.rated_items(target_user_id)
+        )
 
-    # Check if user exists
-    if target_user_id not in user_item_matrix.index:
+    # Otherwise weighted ratings of the 10 most similar users, for items the target hasn't rated
+    if not scores:
+        scores = user_items.recommend(target_user_id)
+    scores = dict(scores)
+    if not scores:
         return pd.DataFrame()  # Return empty for new users
 
-    # Calculate user similarities
-    similarity_matrix = cosine_similarity(user_item_matrix)
-    sim_df = pd.DataFrame(
-        similarity_matrix,
-        index=user_item_matrix.index,
-        columns=user_item_matrix.index
-    )
-
-    # Get similar users (excluding self)
-    similar_users = sim_df[target_user_id].sort_values(ascending=False)[1:11]  # Top 10 similar users
-
-    # Calculate weighted scores
-    target_ratings = user_item_matrix.loc[target_user_id]
-    recommendations = pd.Series(0, index=user_item_matrix.columns)
-    
-    for other_user, similarity in similar_users.items():
-        other_ratings = user_item_matrix.loc[other_user]
-        # Only consider items the target user hasn't rated
-        new_items = (target_ratings == 0) & (other_ratings > 0)
-        recommendations[new_items] += other_ratings[new_items] * similarity
-
-    # Get top recommendations
-    top_recommendations = recommendations.sort_values(ascending=False).head(top_n).index.tolist()
-    
     # Return product details with website information
-    recommended_products = product_df[product_df['id'].isin(top_recommendations)].copy()
+    recommended_products = product_df[product_df['id'].isin(scores.keys())].copy()
+    recommended_products['score'] = recommended_products['id'].map(scores)
+    recommended_products = recommended_products.sort_values('score', ascending=False, kind='stable')
+    recommended_products = recommended_products.drop_duplicates(subset=['id']).head(top_n)
     
     # Extract website from variants
     recommended_products['website'] = recommended_products['variants'].apply(
@@ -112,7 +100,7 @@ def collaborative_filtering_recommendations(ratings_df, product_df, target_user_
     
     return recommended_products[[
         'id', 'name', 'brand', 'price_display', 'avg_rating', 'thumbnail', 'website'
-    ]].drop_duplicates()
+    ]]
     
    
 
@@ -120,6 +108,9 @@ def content_based_recommendations(product_df, product_id, n=5):
     """
     Get similar products based on content features
     
+    Fits TF-IDF on product_df for this one call; use a prebuilt
+    content_index.ContentIndex to query the same products repeatedly.
+    
     Args:
         product_df: DataFrame with product details
         product_id: Product to find similar items for
@@ -133,38 +124,9 @@ def content_based_recommendations(product_df, product_id, n=5):
         print(f"Product {product_id} not found")
         return pd.DataFrame()
 
-    # Create feature vector
-    product_df['features'] = (
-        product_df['name'] + " " + 
-        product_df['brand'] + " " + 
-        product_df['price_display'].astype(str) + " " +
-        product_df['avg_rating'].astype(str) + " " +
-        product_df['variants'].apply(lambda x: " ".join([v['color'] for v in x if 'color' in v]) if x else "")
-    )
-
-    # Vectorize features
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(product_df['features'])
+    return ContentIndex(product_df).recommend(product_id, n)
 
-    # Calculate similarities
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-    idx = product_df[product_df['id'] == product_id].index[0]
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    
-    # Sort and get top matches
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:n+1]
-    product_indices = [i[0] for i in sim_scores]
-    
-    # Return results
-    recommendations = product_df.iloc[product_indices].copy()
-    recommendations['similarity_score'] = [i[1] for i in sim_scores]
-    recommendations['website'] = recommendations['variants'].apply(
-        lambda x: x[0]['website'] if x and len(x) > 0 else None
-    )
-    
-    return recommendations[['id', 'name', 'brand', 'price_display', 'avg_rating', 'similarity_score', 'thumbnail', 'website']]
-
-def hybrid_recommendations(product_df, ratings_df, product_id=None, user_id=None, top_n=12):
+def hybrid_recommendations(product_df, ratings_df, product_id=None, user_id=None, top_n=12, content_index=None, user_items=None, factor_model=None):
     """
     Combine content-based and collaborative filtering
     
@@ -174,6 +136,9 @@ def hybrid_recommendations(product_df, ratings_df, product_id=None, user_id=None
         product_id: Current product (optional)
         user_id: Current user (optional)
         top_n: Number of recommendations
+        content_index: ContentIndex or LiveContentIndex to use when it covers product_df (optional)
+        user_items: UserItemMatrix to use instead of ratings_df (optional)
+        factor_model: FactorModel for collaborative results (optional)
         
     Returns:
         DataFrame with hybrid recommendations
@@ -183,11 +148,16 @@ def hybrid_recommendations(product_df, ratings_df, product_id=None, user_id=None
     
     # Get content-based recommendations if product specified
     if product_id:
-        content_rec = content_based_recommendations(product_df, product_id, top_n)
+        if content_index is not None and product_id in content_index and content_index.covers(product_df['id']):
+            content_rec = content_index.recommend(product_id, top_n, candidates=product_df['id'])
+        else:
+            content_rec = content_based_recommendations(product_df, product_id, top_n)
     
     # Get collaborative recommendations if user specified
     if user_id:
-        collab_rec = collaborative_filtering_recommendations(ratings_df, product_df, user_id, top_n)
+        collab_rec = collaborative_filtering_recommendations(
+            ratings_df, product_df, user_id, top_n, user_items=user_items, factor_model=factor_model
+        )
     
     # Combine results
     hybrid_rec = pd.concat([content_rec, collab_rec]).drop_duplicates(subset=['id'])
@@ -0,0 +1,30 @@
+from catalog import Catalog
+from product_store import ProductStore
+
+
+def product(i, price=100):
+    return {'name': f"Product {i}", 'brand': "Brand", 'best_price': price, 'price_display': f"₹{price}",
+            'variants': [{'price': f"₹{price}", 'website': "Amazon"}]}
+
+
+def test_saves_replace_and_add_rows_without_touching_older_snapshots(tmp_path):
+    store = ProductStore(str(tmp_path / "catalog.db"))
+    catalog = Catalog(store)
+    store.save_products([product(i) for i in range(50)])
+    first = catalog.snapshot()
+    assert len(first.df) == 50
+
+    for i in range(3):
+        store.save_products([product(0, price=200 + i), product(100 + i)])
+    latest = catalog.snapshot()
+
+    assert latest.version == first.version + 3
+    assert len(latest.df) == 53
+    assert latest.df['id'].is_unique
+    assert latest.df.set_index('name').loc["Product 0", 'best_price'] == 202
+    assert len(latest.changes) == 2
+    # Earlier versions stay as they were
+    assert len(first.df) == 50
+    assert first.df.set_index('name').loc["Product 0", 'best_price'] == 100
+    assert latest.df.sort_values('id').reset_index(drop=True).equals(
+        store.load_dataframe().sort_values('id').reset_index(drop=True))
@@ -0,0 +1,40 @@
+import time
+import pytest
+from catalog import Catalog
+from catalog_snapshot import SnapshotWriter, available, products_frame, read_snapshot
+from product_store import ProductStore
+
+pytestmark = pytest.mark.skipif(not available(), reason="pyarrow is not installed")
+
+
+def product(i):
+    return {'name': f"Product {i}", 'brand': "Brand",
+            'variants': [{'price': f"₹{100 + i}", 'website': "Amazon", 'color': "Red"}]}
+
+
+def test_burst_of_saves_is_one_write(tmp_path):
+    store = ProductStore(str(tmp_path / "catalog.db"))
+    writer = SnapshotWriter(Catalog(store), str(tmp_path / "snapshot"), delay=0.5)
+    time.sleep(1.0)
+    before = writer.writes
+
+    for i in range(5):
+        store.save_products([product(i)])
+        time.sleep(0.2)
+    time.sleep(1.0)
+
+    assert writer.writes == before + 1
+    writer.close()
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = ProductStore(str(tmp_path / "catalog.db"))
+    catalog = Catalog(store)
+    store.save_products([product(i) for i in range(3)])
+    writer = SnapshotWriter(catalog, str(tmp_path / "snapshot"), delay=0.1)
+    writer.close()
+
+    typed = read_snapshot(str(tmp_path / "snapshot"))
+    assert typed.seq == store.write_seq()
+    df = products_frame(typed.products)
+    assert df['variants'].tolist() == catalog.snapshot().df['variants'].tolist()
@@ -0,0 +1,27 @@
+import time
+from catalog import Catalog
+from content_index import ContentIndexer
+from product_store import ProductStore
+
+
+def product(i):
+    return {'name': f"Boat Rockerz {i} Headphones", 'brand': "boAt", 'price_display': f"₹{999 + i}",
+            'avg_rating': 4.1, 'variants': [{'price': f"₹{999 + i}", 'website': "Amazon", 'color': "Black"}]}
+
+
+def test_burst_of_saves_is_one_update(tmp_path):
+    store = ProductStore(str(tmp_path / "catalog.db"))
+    catalog = Catalog(store)
+    store.save_products([product(0)])
+    indexer = ContentIndexer(catalog, delay=0.5, ann_path=str(tmp_path / "content_ann.npz"))
+    before = indexer.current().status()["updates"]
+
+    for i in range(1, 6):
+        store.save_products([product(i)])
+        time.sleep(0.2)
+    time.sleep(1.0)
+
+    status = indexer.current().status()
+    assert status["updates"] == before + 1
+    assert status["products"] == 6
+    indexer.close()
@@ -0,0 +1,96 @@
+import os
+import pytest
+from html_parsers import PARSERS, available_backends
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def parse(kind, backend):
+    with open(os.path.join(FIXTURES, f"{kind}.html"), "rb") as f:
+        return PARSERS[kind](f.read(), backend=backend)
+
+
+def fields(product):
+    return {field: getattr(product, field) for field in product.FIELDS}
+
+
+@pytest.fixture(params=available_backends())
+def backend(request):
+    return request.param
+
+
+def test_amazon_search(backend):
+    # The widget slot has no name and is skipped
+    products = parse("amazon_search", backend)
+    assert [fields(product) for product in products] == [
+        {
+            'name': "boAt Airdopes 141 Bluetooth TWS Earbuds with 42H Playtime (Bold Black)",
+            'price': "₹1,099",
+            'rating': "4.0",
+            'ratings': "4,12,583",
+            'brand': "boAt",
+            'website': "Amazon",
+            'link': "https://www.amazon.in/boAt-Airdopes-141-Bluetooth-Wireless/dp/B0CTESTA01/ref=sr_1_1",
+            'thumbnail': "https://m.media-amazon.com/images/I/61TESTA01._AC_UY218_.jpg",
+        },
+        {
+            # Sponsored: no brand label, rating or ratings count
+            'name': "Noise Buds VS104 Truly Wireless Earbuds (Charcoal Black)",
+            'price': "₹899",
+            'rating': "Not Rated",
+            'ratings': "0",
+            'brand': "Unknown Brand",
+            'website': "Amazon",
+            'link': "https://www.amazon.in/sspa/click?ie=UTF8&spc=MToxMjM&url=%2FNoise-Buds-VS104%2Fdp%2FB0CTESTA02",
+            'thumbnail': "https://m.media-amazon.com/images/I/71TESTA02._AC_UY218_.jpg",
+        },
+    ]
+    assert products[0].price_value == 1099
+    assert products[0].rating_value == 4.0
+
+
+def test_flipkart_search(backend):
+    # The ad tile has no name and is skipped
+    products = parse("flipkart_search", backend)
+    assert [fields(product) for product in products] == [
+        {
+            'name': "boAt Airdopes 141 with 42 Hours Playback Bluetooth (Bold Black, True Wireless)",
+            'price': "₹1,099",
+            'rating': "4.1",
+            'ratings': "234117",
+            'brand': "boAt",
+            'website': "Flipkart",
+            'link': "https://www.flipkart.com/boat-airdopes-141/p/itmtest0000001?pid=ACCGTEST0000001&lid=LSTACC",
+            'thumbnail': "https://rukminim2.flixcart.com/image/416/416/test/earbud-1.jpeg?q=70",
+        },
+        {
+            # No brand label: the first word of the name stands in
+            'name': "realme Buds T110 with AI ENC for Calls (Country Green, True Wireless)",
+            'price': "₹1,299",
+            'rating': "Not Rated",
+            'ratings': "0",
+            'brand': "realme",
+            'website': "Flipkart",
+            'link': "https://www.flipkart.com/realme-buds-t110/p/itmtest0000002?pid=ACCGTEST0000002",
+            'thumbnail': "https://rukminim2.flixcart.com/image/416/416/test/earbud-2.jpeg?q=70",
+        },
+    ]
+
+
+def test_amazon_product(backend):
+    assert parse("amazon_product", backend) == {
+        "rating": "4.0", "ratings_count": "4,12,583", "status": "success"
+    }
+
+
+def test_flipkart_product(backend):
+    # The reviews section repeats the rating block; the last one wins
+    assert parse("flipkart_product", backend) == {
+        "rating": "4.1", "ratings_count": "2,34,117", "status": "success"
+    }
+
+
+def test_pages_without_results(backend):
+    html = b'<html><body><form action="/errors/validateCaptcha"></form></body></html>'
+    for parser in PARSERS.values():
+        assert parser(html, backend=backend) is None
@@ -0,0 +1,37 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from http_client import fetch_html
+from site_scheduler import get_scheduler
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(1.0)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"<html></html>")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_timeout_after_retries_counts_as_timeout(slow_server):
+    limiter = get_scheduler().limiter("default")
+    before = dict(limiter.stats)
+
+    assert fetch_html(slow_server, timeout=0.2) is None
+
+    assert limiter.stats["timeouts"] == before["timeouts"] + 1
+    assert limiter.stats["errors"] == before["errors"]
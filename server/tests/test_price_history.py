@@ -0,0 +1,29 @@
+import time
+from price_history import PriceHistory
+
+DAY = 86400
+
+
+def offer(website, price):
+    return {'website': website, 'price': price, 'rating': "4.2", 'ratings_count': "120"}
+
+
+def test_unavailable_site_leaves_the_current_minimum(tmp_path):
+    history = PriceHistory(str(tmp_path / "price_history.db"))
+    now = time.time()
+    history.record("phone", [offer("Amazon", "₹1,000"), offer("Flipkart", "₹1,100")], observed_at=now - 10 * DAY)
+    history.record("phone", [offer("Amazon", "₹700"), offer("Flipkart", "₹1,100")], observed_at=now - 3 * DAY)
+    # Amazon goes out of stock; Flipkart is the only price left
+    history.record("phone", [offer("Amazon", "Not Available"), offer("Flipkart", "₹1,100")], observed_at=now - DAY)
+
+    assert history.price_drops(days=7, min_drop=0.1) == []
+
+
+def test_price_drop_is_reported(tmp_path):
+    history = PriceHistory(str(tmp_path / "price_history.db"))
+    now = time.time()
+    history.record("phone", [offer("Amazon", "₹1,000")], observed_at=now - 10 * DAY)
+    history.record("phone", [offer("Amazon", "₹800")], observed_at=now - DAY)
+
+    drops = history.price_drops(days=7, min_drop=0.1)
+    assert [(drop['product_id'], drop['start_price'], drop['current_price']) for drop in drops] == [("phone", 1000, 800)]
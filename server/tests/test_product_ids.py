@@ -0,0 +1,61 @@
+import json
+import sqlite3
+from catalog import Catalog
+from price_history import PriceHistory
+from product_store import ProductStore
+from ratings_store import RatingsStore
+from user_item_matrix import UserItemMatrix
+
+OLD_PRODUCTS = [
+    ("apple-ipho-apple", "Apple iPhone 15", "Apple"),
+    ("boat-rocke-boat", "boAt Rockerz 450", "boAt"),
+    ("noise-colo-noise", "Noise ColorFit Pro 4", "Noise"),
+    ("mi-power-b-mi", "Mi Power Bank 3i", "Mi"),
+]
+
+
+def old_catalog(path):
+    """A catalog as written before products were keyed on product_id()"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE products (id TEXT PRIMARY KEY, name TEXT NOT NULL, brand TEXT, price_display TEXT,
+                               best_price REAL, avg_rating REAL, thumbnail TEXT, available_on TEXT,
+                               variants TEXT, last_updated TEXT, content_hash TEXT);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    for old_id, name, brand in OLD_PRODUCTS:
+        variants = json.dumps([{'price': "₹999", 'website': "Amazon", 'rating': "4.1"}])
+        conn.execute("INSERT INTO products VALUES (?, ?, ?, '₹999', 999, 4.1, '', 'Amazon', ?, "
+                     "'2024-01-01 00:00:00', NULL)", (old_id, name, brand, variants))
+    conn.commit()
+    conn.close()
+
+
+def test_upgraded_catalog_keeps_ratings_and_price_history(tmp_path):
+    old_catalog(str(tmp_path / "catalog.db"))
+    ratings = RatingsStore(str(tmp_path / "ratings.db"))
+    ratings.add_ratings([
+        ("user_1", "apple-ipho-apple", 5), ("user_1", "boat-rocke-boat", 4),
+        ("user_2", "apple-ipho-apple", 5), ("user_2", "boat-rocke-boat", 4), ("user_2", "noise-colo-noise", 5),
+        ("user_3", "mi-power-b-mi", 3),
+    ], "fake")
+    history = PriceHistory(str(tmp_path / "price_history.db"))
+    history.record("apple-ipho-apple", [{'price': "₹999", 'website': "Amazon"}], observed_at=1000)
+
+    store = ProductStore(str(tmp_path / "catalog.db"))
+    renames = store.id_renames()
+    ratings.rename_products(renames)
+    history.rename_products(renames)
+
+    catalog_ids = set(Catalog(store).snapshot().df['id'])
+    assert len(catalog_ids) == len(OLD_PRODUCTS)
+    assert set(ratings.ratings_frame()['product_id']) <= catalog_ids
+
+    recommended = [product_id for product_id, _ in UserItemMatrix(ratings).recommend("user_1")]
+    assert recommended == [renames["noise-colo-noise"]]
+    assert history.history(renames["apple-ipho-apple"])
+    assert not history.history("apple-ipho-apple")
+
+    # A second startup finds nothing left to move
+    assert ratings.rename_products(store.id_renames()) == 0
+    assert history.rename_products(store.id_renames()) == 0
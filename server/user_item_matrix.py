@@ -0,0 +1,229 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from content_index import top_k
+
+# Pending new ratings folded into the CSR arrays once there are this many
+USER_ITEM_COMPACT_AT = int(os.environ.get("BB_USER_ITEM_COMPACT_AT", "5000"))
+# Most similar users whose ratings are summed into a recommendation
+CF_NEIGHBOURS = 10
+
+
+class UserItemMatrix:
+    """
+    Sparse user x item ratings kept in step with a RatingsStore
+
+    Ratings are held as CSR (rows for a user's ratings) with a CSC copy
+    (columns for who rated an item), plus id <-> index maps. A changed
+    rating is written into both arrays in place; a rating for a new pair
+    goes to a small pending matrix that is folded in once it holds
+    `compact_at` entries. A generated ("fake") rating never replaces a
+    user's own one for the same pair, as in RatingsStore.ratings_frame().
+
+    recommend() never builds the users x users similarity matrix: it
+    scores every user against the target through the columns of the
+    target's own items, takes the CF_NEIGHBOURS best, and sums their
+    ratings weighted by similarity in one sparse product.
+
+    Args:
+        store: RatingsStore to load and follow (optional)
+        ratings_df: user_id / product_id / rating frame to load instead
+        compact_at: Pending new ratings that trigger a fold into CSR
+    """
+
+    def __init__(self, store=None, ratings_df=None, compact_at=USER_ITEM_COMPACT_AT):
+        self.compact_at = compact_at
+        self.compactions = 0
+        self._lock = threading.RLock()
+        # (user row, item column) pairs holding a user's own rating
+        self._own = set()
+        with self._lock:
+            if store is not None:
+                # Listen first; a write that lands meanwhile waits for the lock
+                # and is then re-applied on top of a frame that already has it
+                store.add_listener(self.apply_rows)
+                own = store.user_pairs()
+                ratings_df = store.ratings_frame()
+            self._load(ratings_df if ratings_df is not None else pd.DataFrame(columns=['user_id', 'product_id', 'rating']))
+            if store is not None:
+                self._own = {(self.users[user_id], self.items[product_id]) for user_id, product_id in own}
+
+    def _load(self, df):
+        df = df.drop_duplicates(subset=['user_id', 'product_id'], keep='last')
+        users, user_ids = pd.factorize(df['user_id'])
+        items, item_ids = pd.factorize(df['product_id'])
+        self.user_ids = list(user_ids)
+        self.item_ids = list(item_ids)
+        self.users = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.items = {item_id: col for col, item_id in enumerate(self.item_ids)}
+        self._rows = sparse.csr_matrix(
+            (df['rating'].to_numpy(dtype='float64'), (users, items)),
+            shape=(len(self.user_ids), len(self.item_ids))
+        )
+        self._rows.sort_indices()
+        self._columns = self._rows.tocsc()
+        self._columns.sort_indices()
+        self._norm_sq = np.asarray(self._rows.multiply(self._rows).sum(axis=1)).ravel()
+        self._pending = {}
+        self._pending_matrix = None
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.item_ids)
+
+    def __len__(self):
+        return self._rows.nnz + len(self._pending)
+
+    def _index(self, key, index, ids):
+        position = index.get(key)
+        if position is None:
+            position = index[key] = len(ids)
+            ids.append(key)
+        return position
+
+    def _stored(self, matrix, major, minor):
+        """Position of (major, minor) in a compressed matrix's data, or None"""
+        if major >= len(matrix.indptr) - 1:
+            return None
+        start, end = matrix.indptr[major:major + 2]
+        at = start + np.searchsorted(matrix.indices[start:end], minor)
+        return at if at < end and matrix.indices[at] == minor else None
+
+    def apply_rows(self, rows):
+        """RatingsStore listener: (user_id, product_id, source, rating, updated_at) rows"""
+        with self._lock:
+            for user_id, product_id, source, rating, _ in rows:
+                row = self._index(user_id, self.users, self.user_ids)
+                col = self._index(product_id, self.items, self.item_ids)
+                if len(self._norm_sq) <= row:
+                    self._norm_sq = np.concatenate([self._norm_sq, np.zeros(max(row + 1, 2 * len(self._norm_sq)) - len(self._norm_sq))])
+                if source == "user":
+                    self._own.add((row, col))
+                elif (row, col) in self._own:
+                    continue
+                stored = self._stored(self._rows, row, col)
+                if stored is not None:
+                    old = self._rows.data[stored]
+                    self._rows.data[stored] = rating
+                    self._columns.data[self._stored(self._columns, col, row)] = rating
+                else:
+                    old = self._pending.get((row, col))
+                    self._pending[(row, col)] = rating
+                    self._pending_matrix = None
+                self._norm_sq[row] += rating * rating - (old or 0.0) ** 2
+            if len(self._pending) >= self.compact_at:
+                self._compact()
+
+    def _pending_csr(self):
+        if self._pending_matrix is None:
+            keys = list(self._pending)
+            self._pending_matrix = sparse.csr_matrix(
+                (list(self._pending.values()), ([row for row, _ in keys], [col for _, col in keys])),
+                shape=self.shape
+            )
+        return self._pending_matrix
+
+    def _grown(self, matrix):
+        """matrix padded out to the current shape (new users and items have no stored ratings)"""
+        if matrix.shape != self.shape:
+            matrix.resize(self.shape)
+        return matrix
+
+    def _compact(self):
+        self._rows = (self._grown(self._rows) + self._pending_csr()).tocsr()
+        self._rows.sort_indices()
+        self._columns = self._rows.tocsc()
+        self._columns.sort_indices()
+        self._pending = {}
+        self._pending_matrix = None
+        self.compactions += 1
+
+    def user_row(self, user_id):
+        """(item columns, ratings) of one user, or None for an unknown user"""
+        with self._lock:
+            row = self.users.get(user_id)
+            if row is None:
+                return None
+            return self._user_row(row)
+
+    def rated_items(self, user_id):
+        """Product ids a user has rated"""
+        with self._lock:
+            row = self.users.get(user_id)
+            if row is None:
+                return []
+            return [self.item_ids[col] for col in self._user_row(row)[0]]
+
+    def _user_row(self, row):
+        rows = self._grown(self._rows)
+        start, end = rows.indptr[row:row + 2]
+        cols, values = rows.indices[start:end], rows.data[start:end]
+        if self._pending:
+            pending = self._pending_csr()
+            start, end = pending.indptr[row:row + 2]
+            cols = np.concatenate([cols, pending.indices[start:end]])
+            values = np.concatenate([values, pending.data[start:end]])
+        return cols, values
+
+    def similar_users(self, user_id, n=CF_NEIGHBOURS):
+        """(user rows, cosine similarities) of the n users most like user_id, best first"""
+        with self._lock:
+            row = self.users.get(user_id)
+            if row is None:
+                return np.array([], dtype=np.int64), np.array([])
+            return self._similar_users(row, n)
+
+    def _similar_users(self, row, n):
+        cols, values = self._user_row(row)
+        dots = self._grown(self._columns)[:, cols] @ values
+        if self._pending:
+            dots += self._pending_csr()[:, cols] @ values
+        norms = np.sqrt(self._norm_sq[:len(dots)] * self._norm_sq[row])
+        similarity = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+        pool = np.flatnonzero(similarity > 0)
+        pool = pool[pool != row]
+        best = pool[top_k(similarity[pool], n)]
+        return best, similarity[best]
+
+    def recommend(self, user_id, neighbours=CF_NEIGHBOURS):
+        """
+        Items a user has not rated, scored by similar users' ratings
+
+        Args:
+            user_id: User to recommend for
+            neighbours: Similar users to draw on
+
+        Returns:
+            [(product_id, score), ...] best first, only items with a score
+        """
+        with self._lock:
+            row = self.users.get(user_id)
+            if row is None:
+                return []
+            best, similarity = self._similar_users(row, neighbours)
+            if not len(best):
+                return []
+            weights = sparse.csr_matrix(
+                (similarity, (np.zeros(len(best), dtype=np.int64), best)), shape=(1, self.shape[0])
+            )
+            scores = weights @ self._grown(self._rows)
+            if self._pending:
+                scores = scores + weights @ self._pending_csr()
+            scores = scores.toarray().ravel()
+            scores[self._user_row(row)[0]] = 0
+            ranked = np.flatnonzero(scores > 0)
+            ranked = ranked[top_k(scores[ranked], len(ranked))]
+            return [(self.item_ids[col], float(scores[col])) for col in ranked]
+
+    def status(self):
+        with self._lock:
+            users, items = self.shape
+            return {
+                "users": users,
+                "items": items,
+                "ratings": len(self),
+                "pending": len(self._pending),
+                "compactions": self.compactions,
+            }